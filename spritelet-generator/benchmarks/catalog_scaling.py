@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from spritelet.catalog_backend import CATALOG_BACKENDS, create_empty_catalog, open_catalog
+from spritelet.store_utils import store_lock
+
+
+def make_entry(index: int) -> dict:
+    return {
+        "simple_name": f"state-{index:06d}",
+        "spritelet_path": f"states/state-{index:06d}.png",
+        "created_at": "2026-02-06T09:30:04Z",
+        "description": f"Benchmark state number {index}.",
+    }
+
+
+def bench_backend(backend: str, size: int, operations: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "states").mkdir()
+        create_empty_catalog(root, backend)
+        with open_catalog(root, backend=backend) as catalog:
+            catalog.upsert([make_entry(i) for i in range(size)])
+
+        # Each publish opens the catalog, looks up one state and upserts it under the store lock.
+        lookup_seconds = []
+        upsert_seconds = []
+        for op in range(operations):
+            key = f"state-{(op * 7919) % size:06d}"
+            started = time.perf_counter()
+            with open_catalog(root, backend=backend) as catalog:
+                entry = catalog.get(key)
+                looked_up = time.perf_counter()
+                with store_lock(root):
+                    catalog.upsert([{**entry, "description": f"updated {op}"}])
+            done = time.perf_counter()
+            lookup_seconds.append(looked_up - started)
+            upsert_seconds.append(done - looked_up)
+
+    lookup_seconds.sort()
+    upsert_seconds.sort()
+    return {
+        "backend": backend,
+        "states": size,
+        "operations": operations,
+        "lookup_median_ms": round(lookup_seconds[len(lookup_seconds) // 2] * 1000, 3),
+        "upsert_median_ms": round(upsert_seconds[len(upsert_seconds) // 2] * 1000, 3),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure per-publish catalog lookup/upsert cost as the catalog grows")
+    parser.add_argument("--sizes", default="10,1000,10000,100000", help="Comma-separated catalog sizes")
+    parser.add_argument("--backends", default=",".join(CATALOG_BACKENDS), help="Comma-separated backends to measure")
+    parser.add_argument("--operations", type=int, default=20, help="Publishes measured per size (default: 20)")
+    parser.add_argument("--output", default="-", help="Write JSON results to file path or '-' for stdout")
+    args = parser.parse_args()
+
+    results = [
+        bench_backend(backend, int(size), args.operations)
+        for backend in args.backends.split(",")
+        for size in args.sizes.split(",")
+    ]
+    payload = json.dumps({"benchmark": "catalog_scaling", "results": results}, indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
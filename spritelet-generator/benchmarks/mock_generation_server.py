@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import argparse
+import base64
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE_CHUNK_BYTES = 1024 * 1024
+
+
+def synthetic_png(size_bytes: int, seed: int = 0) -> bytes:
+    # RGB PNG of roughly size_bytes with random pixels stored uncompressed, so its size is predictable
+    # and nothing downstream can shrink it.
+    width = max(int((size_bytes / 3) ** 0.5), 1)
+    height = max(size_bytes // (width * 3 + 1), 1)
+    rng = random.Random(seed)
+    raw = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 0))
+        + chunk(b"IEND", b"")
+    )
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "SpriteletMockGeneration/1"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        mock = self.server.mock
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if mock.latency:
+            time.sleep(mock.latency)
+        with mock.lock:
+            mock.requests += 1
+            failed = mock.rng.random() < mock.error_rate
+            if failed:
+                mock.errors += 1
+            body_parts = mock.body_parts
+        if failed:
+            body = b'{"error": {"code": 503, "message": "mock overload"}}'
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(sum(len(part) for part in body_parts)))
+        self.end_headers()
+        for part in body_parts:
+            view = memoryview(part)
+            for start in range(0, len(view), RESPONSE_CHUNK_BYTES):
+                self.wfile.write(view[start : start + RESPONSE_CHUNK_BYTES])
+
+
+class MockGenerationServer:
+    # Local stand-in for the generateContent endpoint: answers every POST after `latency` seconds with
+    # one inline PNG of about `image_bytes`, or with a retryable 503 at `error_rate`.
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        image_bytes: int = 256 * 1024,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.set_image_bytes(image_bytes)
+        self.httpd = ThreadingHTTPServer((host, port), MockRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.thread = None
+
+    def set_image_bytes(self, image_bytes: int) -> None:
+        image = synthetic_png(image_bytes)
+        body_parts = [
+            b'{"candidates": [{"content": {"parts": [{"inlineData": {"mimeType": "image/png", "data": "',
+            base64.b64encode(image),
+            b'"}}]}}]}',
+        ]
+        with self.lock:
+            self.image_bytes = len(image)
+            self.body_parts = body_parts
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1beta/{{model}}:generateContent"
+
+    def __enter__(self) -> "MockGenerationServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve a local mock of the image generateContent endpoint")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port (default: 8765)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before each response (default: 0.5)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503 (default: 0)")
+    parser.add_argument("--image-bytes", type=int, default=256 * 1024, help="Approximate PNG size (default: 262144)")
+    args = parser.parse_args()
+
+    with MockGenerationServer(args.latency, args.error_rate, args.image_bytes, args.host, args.port) as mock:
+        print(json.dumps({"serving": True, "endpoint": mock.endpoint, "image_bytes": mock.image_bytes}), flush=True)
+        try:
+            mock.thread.join()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
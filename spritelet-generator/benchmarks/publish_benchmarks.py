@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SCRIPTS_DIR = BENCHMARKS_DIR.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+from catalog_scaling import bench_backend
+from mock_generation_server import MockGenerationServer, synthetic_png
+from spritelet.catalog_backend import CATALOG_BACKENDS
+from spritelet.publish_spritelet_state import publish_state
+from spritelet.store_utils import JsonCache, utc_now
+
+SECTIONS = ("reuse", "cold", "catalog", "store_lock", "rss", "startup")
+API_KEY = "benchmark"
+# Lookup commands must start within this many ms of imports beyond a bare interpreter.
+DEFAULT_STARTUP_TARGET_MS = 50.0
+LOOKUP_COMMANDS = ("find", "set-signal")
+
+
+def bench_env() -> dict:
+    env = {key: value for key, value in os.environ.items() if not key.startswith("SPRITELET_")}
+    env.update(SPRITELET_GOOGLE_API_KEY=API_KEY, SPRITELET_NO_DAEMON="1")
+    return env
+
+
+def make_store(parent: Path, name: str) -> Path:
+    root = parent / name
+    base_image = parent / f"{name}-base.png"
+    base_image.write_bytes(synthetic_png(64 * 1024, seed=1))
+    subprocess.run(
+        [sys.executable, str(SCRIPTS_DIR / "init_spritelet_store.py"), "--root", str(root), "--base-image", str(base_image)],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        env=bench_env(),
+    )
+    return root
+
+
+def summarize(seconds: list[float]) -> dict:
+    ordered = sorted(seconds)
+    return {
+        "count": len(ordered),
+        "median_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def publish_cli(root: Path, endpoint: str, simple_name: str, *extra: str) -> list[str]:
+    return [
+        sys.executable,
+        str(SCRIPTS_DIR / "publish_spritelet_state.py"),
+        "--root",
+        str(root),
+        "--simple-name",
+        simple_name,
+        "--description",
+        f"Benchmark state {simple_name}.",
+        "--endpoint",
+        endpoint,
+        "--no-daemon",
+        *extra,
+    ]
+
+
+def bench_reuse(tmp: Path, mock: MockGenerationServer, publishes: int) -> dict:
+    root = make_store(tmp, "reuse")
+    cache = JsonCache()
+    publish_state(root, "warm", "Benchmark state warm.", endpoint=mock.endpoint, api_key=API_KEY, cache=cache)
+    in_process = []
+    for _ in range(publishes):
+        started = time.perf_counter()
+        publish_state(root, "warm", "Benchmark state warm.", endpoint=mock.endpoint, api_key=API_KEY, cache=cache)
+        in_process.append(time.perf_counter() - started)
+    # End to end, including interpreter start and imports, as an agent invoking the script sees it.
+    cli = []
+    for _ in range(max(publishes // 10, 3)):
+        started = time.perf_counter()
+        subprocess.run(publish_cli(root, mock.endpoint, "warm"), check=True, stdout=subprocess.DEVNULL, env=bench_env())
+        cli.append(time.perf_counter() - started)
+    return {"in_process": summarize(in_process), "cli": summarize(cli)}
+
+
+def bench_cold(tmp: Path, mock: MockGenerationServer, publishes: int) -> dict:
+    root = make_store(tmp, "cold")
+    cache = JsonCache()
+    requests_before = mock.requests
+    seconds = []
+    for index in range(publishes):
+        name = f"cold-{index}"
+        started = time.perf_counter()
+        publish_state(root, name, f"Benchmark state {name}.", endpoint=mock.endpoint, api_key=API_KEY, cache=cache)
+        seconds.append(time.perf_counter() - started)
+    summary = summarize(seconds)
+    return {
+        **summary,
+        "mock_latency_ms": round(mock.latency * 1000, 3),
+        "overhead_median_ms": round(summary["median_ms"] - mock.latency * 1000, 3),
+        "image_bytes": mock.image_bytes,
+        "requests": mock.requests - requests_before,
+        "retries": mock.requests - requests_before - publishes,
+    }
+
+
+def bench_catalog(sizes: list[int], operations: int) -> dict:
+    return {
+        backend: {str(size): bench_backend(backend, size, operations) for size in sizes} for backend in CATALOG_BACKENDS
+    }
+
+
+def lock_worker(root: str, endpoint: str, publishes: int, start, results) -> None:
+    cache = JsonCache()
+    publish_state(Path(root), "shared", "Benchmark state shared.", endpoint=endpoint, api_key=API_KEY, cache=cache)
+    start.wait()
+    seconds = []
+    for _ in range(publishes):
+        started = time.perf_counter()
+        publish_state(Path(root), "shared", "Benchmark state shared.", endpoint=endpoint, api_key=API_KEY, cache=cache)
+        seconds.append(time.perf_counter() - started)
+    results.put(seconds)
+
+
+def bench_store_lock(tmp: Path, mock: MockGenerationServer, process_counts: list[int], publishes: int) -> dict:
+    # Reuse publishes from N processes at once; each one serializes on store_lock for its catalog,
+    # current.json and event-log commit, so throughput shows how far that lock scales.
+    root = make_store(tmp, "store-lock")
+    publish_state(root, "shared", "Benchmark state shared.", endpoint=mock.endpoint, api_key=API_KEY)
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for processes in process_counts:
+        start = context.Event()
+        queue = context.Queue()
+        workers = [
+            context.Process(target=lock_worker, args=(str(root), mock.endpoint, publishes, start, queue))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        # Let every worker finish importing and its first publish before the clock starts.
+        time.sleep(0.5 + 0.1 * processes)
+        started = time.perf_counter()
+        start.set()
+        seconds = [value for _ in workers for value in queue.get()]
+        elapsed = time.perf_counter() - started
+        for worker in workers:
+            worker.join()
+        results[str(processes)] = {
+            **summarize(seconds),
+            "publishes_per_second": round(len(seconds) / elapsed, 1),
+        }
+    return results
+
+
+# Runs a script and reports its VmHWM at exit. ru_maxrss from wait4 would also count the forked copy of
+# this (much larger) benchmark process from before exec; VmHWM belongs to the exec'd image only.
+RSS_PROBE = """
+import atexit, os, runpy, sys
+report_path = sys.argv[1]
+sys.argv = sys.argv[2:]
+sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+
+def report():
+    with open("/proc/self/status", encoding="utf-8") as status:
+        kib = next(line.split()[1] for line in status if line.startswith("VmHWM:"))
+    with open(report_path, "w", encoding="utf-8") as out:
+        out.write(kib)
+
+atexit.register(report)
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def peak_rss_kib(tmp: Path, command: list[str]) -> int:
+    report_path = tmp / "rss-report.txt"
+    process = subprocess.run(
+        [sys.executable, "-c", RSS_PROBE, str(report_path), *command[1:]], stdout=subprocess.DEVNULL, env=bench_env()
+    )
+    if process.returncode != 0:
+        raise SystemExit(f"Benchmark publish failed with exit code {process.returncode}: {' '.join(command)}")
+    return int(report_path.read_text(encoding="utf-8"))
+
+
+def bench_rss(tmp: Path, mock: MockGenerationServer, image_sizes: list[int]) -> dict:
+    root = make_store(tmp, "rss")
+    subprocess.run(publish_cli(root, mock.endpoint, "baseline"), check=True, stdout=subprocess.DEVNULL, env=bench_env())
+    results = {"baseline_reuse_mib": round(peak_rss_kib(tmp, publish_cli(root, mock.endpoint, "baseline")) / 1024, 1)}
+    for size in image_sizes:
+        mock.set_image_bytes(size)
+        rss = peak_rss_kib(tmp, publish_cli(root, mock.endpoint, "large", "--force-generate"))
+        results[str(size)] = {"image_bytes": mock.image_bytes, "peak_rss_mib": round(rss / 1024, 1)}
+    return results
+
+
+def spritelet_cli(command: str, *args: str) -> list[str]:
+    return [sys.executable, str(SCRIPTS_DIR / "spritelet"), command, *args]
+
+
+def import_ms(command: list[str]) -> float:
+    # Sum of the top-level cumulative times reported by -X importtime (nested imports are indented).
+    process = subprocess.run(
+        [command[0], "-X", "importtime", *command[1:]], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=bench_env()
+    )
+    if process.returncode != 0:
+        raise SystemExit(f"Benchmark command failed with exit code {process.returncode}: {' '.join(command)}")
+    total_us = 0
+    for line in process.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[0].strip().isdigit() and not fields[2].startswith("  "):
+            total_us += int(fields[1])
+    return total_us / 1000
+
+
+def bench_startup(tmp: Path, mock: MockGenerationServer, runs: int, target_ms: float) -> dict:
+    root = make_store(tmp, "startup")
+    subprocess.run(publish_cli(root, mock.endpoint, "warm"), check=True, stdout=subprocess.DEVNULL, env=bench_env())
+    commands = {
+        "find": spritelet_cli("find", "--root", str(root), "--simple-name", "warm", "--no-daemon"),
+        "set-signal": spritelet_cli("set-signal", "--root", str(root), "--spritelet-path", "states/warm.png", "--no-daemon"),
+        "publish_reuse": spritelet_cli("publish", *publish_cli(root, mock.endpoint, "warm")[2:]),
+    }
+    bare = [sys.executable, "-c", "pass"]
+    bare_import_ms = sorted(import_ms(bare) for _ in range(runs))[runs // 2]
+    results = {"bare_interpreter": {"import_ms": round(bare_import_ms, 3)}, "target_ms": target_ms}
+    for name, command in commands.items():
+        wall = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, env=bench_env())
+            wall.append(time.perf_counter() - started)
+        overhead_ms = sorted(import_ms(command) for _ in range(runs))[runs // 2] - bare_import_ms
+        results[name] = {"wall": summarize(wall), "import_overhead_ms": round(overhead_ms, 3)}
+        if name in LOOKUP_COMMANDS:
+            results[name]["within_target"] = overhead_ms <= target_ms
+    return results
+
+
+def flatten(value, prefix: str = "") -> dict:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(baseline: dict, current: dict) -> list[dict]:
+    before = flatten(baseline.get("results", {}))
+    after = flatten(current["results"])
+    rows = []
+    for metric in sorted(before.keys() & after.keys()):
+        row = {"metric": metric, "baseline": before[metric], "current": after[metric]}
+        if before[metric]:
+            row["change_pct"] = round((after[metric] - before[metric]) / before[metric] * 100, 1)
+        rows.append(row)
+    return rows
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark publish latency, catalog scaling, store_lock throughput and peak RSS against a local mock generation server")
+    parser.add_argument("--sections", default=",".join(SECTIONS), help=f"Comma-separated sections to run (default: {','.join(SECTIONS)})")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock generation latency in seconds (default: 0.2)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock requests answered with a retryable 503 (default: 0)")
+    parser.add_argument("--image-bytes", type=int, default=1024 * 1024, help="Mock image size for reuse/cold runs (default: 1048576)")
+    parser.add_argument("--publishes", type=int, default=50, help="Publishes measured per latency section (default: 50)")
+    parser.add_argument("--cold-publishes", type=int, default=10, help="Generations measured in the cold section (default: 10)")
+    parser.add_argument("--catalog-sizes", type=int_list, default=[10, 1000, 100000], help="Catalog sizes (default: 10,1000,100000)")
+    parser.add_argument("--catalog-operations", type=int, default=20, help="Publishes measured per catalog size (default: 20)")
+    parser.add_argument("--lock-processes", type=int_list, default=[1, 2, 4, 8], help="Concurrent publisher process counts (default: 1,2,4,8)")
+    parser.add_argument(
+        "--rss-image-sizes",
+        type=int_list,
+        default=[1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024],
+        help="Image sizes for the peak RSS section (default: 1MiB,16MiB,64MiB)",
+    )
+    parser.add_argument("--startup-runs", type=int, default=15, help="Runs per command in the startup section (default: 15)")
+    parser.add_argument(
+        "--startup-target-ms",
+        type=float,
+        default=DEFAULT_STARTUP_TARGET_MS,
+        help=f"Import budget for lookup commands beyond a bare interpreter; exit 1 when exceeded (default: {DEFAULT_STARTUP_TARGET_MS:g})",
+    )
+    parser.add_argument("--output", help="JSON results path (default: benchmarks/results/publish-<UTC timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to diff the new numbers against")
+    args = parser.parse_args()
+
+    sections = args.sections.split(",")
+    unknown = sorted(set(sections) - set(SECTIONS))
+    if unknown:
+        raise SystemExit(f"Unknown sections: {', '.join(unknown)} (expected: {', '.join(SECTIONS)})")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, MockGenerationServer(args.latency, args.error_rate, args.image_bytes) as mock:
+        tmp_path = Path(tmp)
+        if "reuse" in sections:
+            results["reuse_hit"] = bench_reuse(tmp_path, mock, args.publishes)
+        if "cold" in sections:
+            results["cold_generation"] = bench_cold(tmp_path, mock, args.cold_publishes)
+        if "catalog" in sections:
+            results["catalog"] = bench_catalog(args.catalog_sizes, args.catalog_operations)
+        if "store_lock" in sections:
+            results["store_lock"] = bench_store_lock(tmp_path, mock, args.lock_processes, args.publishes)
+        if "rss" in sections:
+            results["peak_rss"] = bench_rss(tmp_path, mock, args.rss_image_sizes)
+        if "startup" in sections:
+            results["startup"] = bench_startup(tmp_path, mock, args.startup_runs, args.startup_target_ms)
+
+    report = {
+        "benchmark": "publish_benchmarks",
+        "created_at": utc_now(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = Path(args.output) if args.output else BENCHMARKS_DIR / "results" / f"publish-{report['created_at'].replace(':', '')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    summary = {"output": str(output), "results": results}
+    if args.compare:
+        summary["comparison"] = compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), report)
+    print(json.dumps(summary, indent=2))
+    over_target = [name for name in LOOKUP_COMMANDS if not results.get("startup", {}).get(name, {}).get("within_target", True)]
+    if over_target:
+        print(f"Startup over {args.startup_target_ms:g} ms target: {', '.join(over_target)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
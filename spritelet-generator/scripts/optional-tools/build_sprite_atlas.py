@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+# Entry point; the implementation is spritelet/tools/build_sprite_atlas.py.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from spritelet.tools.build_sprite_atlas import main
+
+if __name__ == "__main__":
+    raise SystemExit(main())
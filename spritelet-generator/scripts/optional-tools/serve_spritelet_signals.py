@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+# Entry point; the implementation is spritelet/tools/serve_spritelet_signals.py.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from spritelet.tools.serve_spritelet_signals import main
+
+if __name__ == "__main__":
+    raise SystemExit(main())
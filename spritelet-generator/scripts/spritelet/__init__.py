@@ -0,0 +1,48 @@
+# The store modules live in this package and in spritelet.tools; the files left in scripts/ and
+# scripts/optional-tools/ are entry-point shims that run their main().
+
+# name -> module; resolved on first attribute access so `import spritelet` stays cheap.
+_EXPORTS = {
+    "AsyncGenerationClient": ".async_generation_client",
+    "CatalogCache": ".catalog_backend",
+    "EventLog": ".event_log",
+    "JsonCache": ".store_utils",
+    "LockTimeout": ".store_utils",
+    "RateLimited": ".rate_limit",
+    "SignalReader": ".signal_sidecar",
+    "SignalWriter": ".signal_writer",
+    "StoreLock": ".store_utils",
+    "StorePool": ".tools.store_pool",
+    "build_derivatives": ".image_derivatives",
+    "find_state": ".tools.find_state_in_catalog",
+    "find_state_async": ".tools.find_state_in_catalog",
+    "image_metadata": ".image_store",
+    "ingest_image": ".image_store",
+    "open_catalog": ".catalog_backend",
+    "publish_state": ".publish_spritelet_state",
+    "publish_state_async": ".publish_spritelet_state",
+    "read_store_snapshot": ".store_snapshot",
+    "register_state": ".tools.register_state_in_catalog",
+    "register_state_async": ".tools.register_state_in_catalog",
+    "set_signal": ".tools.set_spritelet_signal",
+    "set_signal_async": ".tools.set_spritelet_signal",
+    "similar_states": ".similarity_index",
+    "update_atlas": ".tools.build_sprite_atlas",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'spritelet' has no attribute {name!r}")
+    from importlib import import_module
+
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return __all__
@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+if not __package__:
+    # Run as `python scripts/spritelet ...`; `python -m spritelet` already has scripts/ on the path.
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from spritelet.cli import main
+
+raise SystemExit(main())
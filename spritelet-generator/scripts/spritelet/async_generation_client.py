@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+
+from .generation_client import (
+    GenerationClient,
+    RetryableError,
+    build_generation_url,
+    client_settings,
+    default_client,
+    record_generation,
+    stream_image_response,
+)
+from .metrics import count
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+class AsyncGenerationClient:
+    # asyncio front end of GenerationClient. Each attempt runs the blocking client (its connection pool,
+    # proxy handling and streaming image decode) in a worker thread, with at most max_concurrency
+    # attempts in flight; backoff between attempts is awaited on the event loop. The semaphore belongs
+    # to the event loop the client is first used on.
+    def __init__(self, client: GenerationClient | None = None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> None:
+        self.client = client or GenerationClient(**client_settings())
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _post_with_retries(
+        self,
+        url: str,
+        request_payload: dict | list[bytes],
+        handle_body=None,
+        extra_headers: dict | None = None,
+        before_retry=None,
+    ):
+        # before_retry is a coroutine function here.
+        body = request_payload if isinstance(request_payload, list) else json.dumps(request_payload).encode("utf-8")
+        for attempt in range(self.client.max_retries + 1):
+            if attempt and before_retry:
+                await before_retry()
+            try:
+                # The semaphore is released during backoff so waiting retries do not hold a slot.
+                async with self.semaphore:
+                    return await asyncio.to_thread(self.client._post_once, url, body, handle_body, extra_headers)
+            except RetryableError as e:
+                await asyncio.sleep(self.client._retry_delay(attempt, e))
+        raise AssertionError("unreachable")
+
+    async def generate(self, model: str, api_key: str, endpoint: str, request_payload: dict | list[bytes]) -> dict:
+        return await self._post_with_retries(build_generation_url(model, api_key, endpoint), request_payload)
+
+    async def generate_to_file(
+        self,
+        model: str,
+        api_key: str,
+        endpoint: str,
+        request_payload: dict | list[bytes],
+        out_path: Path,
+        before_retry=None,
+    ) -> None:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        # A cancelled task cannot stop its worker thread, so the thread is told to drop the image instead.
+        stop = threading.Event()
+        started = time.perf_counter()
+        try:
+            decode_seconds = await self._post_with_retries(
+                build_generation_url(model, api_key, endpoint),
+                request_payload,
+                lambda resp: stream_image_response(resp, out_path, stop),
+                before_retry=before_retry,
+            )
+        except BaseException:
+            stop.set()
+            count("spritelet_generations_total", "error")
+            raise
+        record_generation(started, decode_seconds)
+
+    async def close(self) -> None:
+        self.client.close()
+
+
+_default_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncGenerationClient]" = weakref.WeakKeyDictionary()
+
+
+def default_async_client() -> AsyncGenerationClient:
+    # One semaphore per event loop over the process-wide connection pool the blocking API uses too;
+    # SPRITELET_HTTP_MAX_CONCURRENCY caps the requests in flight.
+    loop = asyncio.get_running_loop()
+    client = _default_clients.get(loop)
+    if client is None:
+        client = _default_clients[loop] = AsyncGenerationClient(
+            default_client(),
+            max_concurrency=int(os.environ.get("SPRITELET_HTTP_MAX_CONCURRENCY", str(DEFAULT_MAX_CONCURRENCY))),
+        )
+    return client
+
+
+async def generate_image_to_file_async(
+    model: str, api_key: str, endpoint: str, request_payload: dict | list[bytes], out_path: Path, before_retry=None
+) -> None:
+    await default_async_client().generate_to_file(model, api_key, endpoint, request_payload, out_path, before_retry)
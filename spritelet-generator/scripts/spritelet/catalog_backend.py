@@ -0,0 +1,214 @@
+import json
+import threading
+from pathlib import Path
+
+from .similarity_index import append_index_rows, reset_index
+from .store_utils import JsonCache, atomic_write_json, load_json
+
+CATALOG_BACKENDS = ("json", "sqlite")
+
+
+def json_catalog_path(root: Path) -> Path:
+    return root / "states" / "catalog.json"
+
+
+def sqlite_catalog_path(root: Path) -> Path:
+    return root / "states" / "catalog.sqlite"
+
+
+def connect_sqlite_catalog(path: Path) -> "sqlite3.Connection":
+    # sqlite3 loads only for SQLite-backed stores.
+    import sqlite3
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS states (simple_name TEXT PRIMARY KEY, entry TEXT NOT NULL) WITHOUT ROWID")
+    conn.commit()
+    return conn
+
+
+class CatalogCache(JsonCache):
+    # A JsonCache that also keeps SQLite catalog connections open between operations, one per
+    # database file and thread, reopened when the file is replaced (migration or reinit).
+    def __init__(self) -> None:
+        super().__init__()
+        self._connections: dict[tuple[Path, int], tuple[int, "sqlite3.Connection"]] = {}
+        self._connections_lock = threading.Lock()
+
+    def sqlite_connection(self, path: Path) -> "sqlite3.Connection":
+        inode = path.stat().st_ino if path.exists() else -1
+        key = (path, threading.get_ident())
+        with self._connections_lock:
+            cached = self._connections.get(key)
+        if cached and cached[0] == inode:
+            return cached[1]
+        if cached:
+            cached[1].close()
+        conn = connect_sqlite_catalog(path)
+        with self._connections_lock:
+            self._connections[key] = (path.stat().st_ino, conn)
+        return conn
+
+    def open_files(self) -> int:
+        # Database, WAL and shared-memory file per connection.
+        return 3 * len(self._connections)
+
+    def approximate_bytes(self) -> int:
+        # Parsed JSON takes several times its file size in memory.
+        return 6 * sum(stat_key[1] for stat_key, _ in self._entries.values())
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, {}
+        for _, conn in connections.values():
+            conn.close()
+        self._entries.clear()
+
+
+class _Catalog:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+
+class JsonCatalog(_Catalog):
+    # Whole-file states/catalog.json; every upsert rewrites the file.
+    backend = "json"
+
+    def __init__(self, root: Path, cache: JsonCache | None = None) -> None:
+        self.root = root
+        self.path = json_catalog_path(root)
+        self.cache = cache
+
+    def _load(self) -> dict:
+        return load_json(self.path, {"states": {}}, self.cache)
+
+    def get(self, key: str) -> dict | None:
+        return self._load().get("states", {}).get(key)
+
+    def all(self) -> dict[str, dict]:
+        return dict(self._load().get("states", {}))
+
+    def __len__(self) -> int:
+        return len(self._load().get("states", {}))
+
+    def upsert(self, entries: list[dict]) -> None:
+        # Caller must hold store_lock.
+        catalog = self._load()
+        previous = catalog.get("states", {})
+        # Copy before mutating so a cached catalog never drifts from disk on a failed write.
+        catalog = {**catalog, "states": dict(catalog.get("states", {}))}
+        for entry in entries:
+            catalog["states"][entry["simple_name"]] = entry
+        atomic_write_json(self.path, catalog)
+        if self.cache:
+            self.cache.remember(self.path, catalog)
+        append_index_rows(self.root, entries, self, previous)
+
+
+class SqliteCatalog(_Catalog):
+    # states/catalog.sqlite keyed by simple_name; lookups and upserts touch only the affected rows.
+    backend = "sqlite"
+
+    def __init__(self, root: Path, cache: JsonCache | None = None) -> None:
+        self.root = root
+        self.path = sqlite_catalog_path(root)
+        # A CatalogCache owns its connections; otherwise this catalog opens and closes its own.
+        self.owns_conn = not isinstance(cache, CatalogCache)
+        self.conn = connect_sqlite_catalog(self.path) if self.owns_conn else cache.sqlite_connection(self.path)
+
+    def get(self, key: str) -> dict | None:
+        row = self.conn.execute("SELECT entry FROM states WHERE simple_name = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self) -> dict[str, dict]:
+        rows = self.conn.execute("SELECT simple_name, entry FROM states ORDER BY simple_name")
+        return {key: json.loads(entry) for key, entry in rows}
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM states").fetchone()[0]
+
+    def upsert(self, entries: list[dict]) -> None:
+        # Caller must hold store_lock.
+        keys = [entry["simple_name"] for entry in entries]
+        previous = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i : i + 500]
+            rows = self.conn.execute(
+                f"SELECT simple_name, entry FROM states WHERE simple_name IN ({','.join('?' * len(chunk))})", chunk
+            )
+            previous.update((key, json.loads(entry)) for key, entry in rows)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO states (simple_name, entry) VALUES (?, ?) "
+                "ON CONFLICT(simple_name) DO UPDATE SET entry = excluded.entry",
+                [(entry["simple_name"], json.dumps(entry)) for entry in entries],
+            )
+        append_index_rows(self.root, entries, self, previous)
+
+    def close(self) -> None:
+        if self.owns_conn:
+            self.conn.close()
+
+
+def detect_catalog_backend(root: Path) -> str | None:
+    if sqlite_catalog_path(root).exists():
+        return "sqlite"
+    if json_catalog_path(root).exists():
+        return "json"
+    return None
+
+
+def open_catalog(
+    root: Path,
+    cache: JsonCache | None = None,
+    backend: str | None = None,
+    required: bool = True,
+) -> JsonCatalog | SqliteCatalog:
+    # A store uses SQLite once states/catalog.sqlite exists; catalog.json is then only a marker.
+    backend = backend or detect_catalog_backend(root)
+    if backend is None:
+        if required:
+            raise SystemExit(f"Missing {json_catalog_path(root)}; run init_spritelet_store.py first")
+        backend = "json"
+    if backend == "sqlite":
+        return SqliteCatalog(root, cache)
+    if backend == "json":
+        return JsonCatalog(root, cache)
+    raise SystemExit(f"Unknown catalog backend: {backend}")
+
+
+def remove_sqlite_catalog(root: Path) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{sqlite_catalog_path(root)}{suffix}").unlink(missing_ok=True)
+
+
+def write_sqlite_marker(root: Path) -> None:
+    # With sqlite, catalog.json holds no states, only a pointer to the database: no commit refreshes
+    # it, so a copy of the entries would silently go stale for anything reading the file directly.
+    atomic_write_json(json_catalog_path(root), {"backend": "sqlite", "catalog_path": "states/catalog.sqlite", "states": {}})
+
+
+def create_empty_catalog(root: Path, backend: str = "json") -> None:
+    if backend not in CATALOG_BACKENDS:
+        raise SystemExit(f"Unknown catalog backend: {backend}")
+    remove_sqlite_catalog(root)
+    reset_index(root)
+    if backend == "sqlite":
+        SqliteCatalog(root).close()
+        write_sqlite_marker(root)
+    else:
+        atomic_write_json(json_catalog_path(root), {"states": {}})
+
+
+def export_catalog_json(root: Path, catalog: JsonCatalog | SqliteCatalog, path: Path | None = None) -> Path:
+    target = path or json_catalog_path(root)
+    atomic_write_json(target, {"states": catalog.all()})
+    return target
@@ -0,0 +1,38 @@
+import sys
+from importlib import import_module
+
+# subcommand -> (module, summary). Only the chosen subcommand's module is imported, so lookups never
+# load the HTTP client, SQLite or image code that publishing needs.
+COMMANDS = {
+    "init": ("spritelet.init_spritelet_store", "Initialize a Spritelet state store"),
+    "publish": ("spritelet.publish_spritelet_state", "Publish a state, reusing or generating its image"),
+    "find": ("spritelet.tools.find_state_in_catalog", "Look up a state in the catalog"),
+    "register": ("spritelet.tools.register_state_in_catalog", "Register an existing image as a state"),
+    "set-signal": ("spritelet.tools.set_spritelet_signal", "Point signals/current.json at an existing state image"),
+    "reinit": ("spritelet.tools.reinit_spritelet_store", "Reset a store to clean starting conditions"),
+    "build-request": ("spritelet.tools.build_nano_banana_request", "Print the generation request for a state"),
+    "base-image": ("spritelet.tools.generate_initial_base_image", "Generate the identity base image"),
+}
+
+
+def usage() -> str:
+    width = max(len(command) for command in COMMANDS)
+    lines = ["usage: spritelet <command> [options]", "", "commands:"]
+    lines += [f"  {command:<{width}}  {summary}" for command, (_, summary) in COMMANDS.items()]
+    lines += ["", "Run `spritelet <command> --help` for command options."]
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    # Dispatches by hand instead of through argparse subparsers, which would have to import every
+    # command module up front to build their option lists.
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+    command, *args = argv
+    if command not in COMMANDS:
+        raise SystemExit(f"spritelet: unknown command {command!r}\n\n{usage()}")
+    module = import_module(COMMANDS[command][0])
+    sys.argv = [f"spritelet {command}", *args]
+    return module.main()
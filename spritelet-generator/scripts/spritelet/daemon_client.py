@@ -0,0 +1,43 @@
+import json
+import os
+from pathlib import Path
+
+
+def daemon_socket_path(root: Path) -> Path:
+    override = os.environ.get("SPRITELET_DAEMON_SOCKET", "")
+    if override:
+        return Path(override)
+    return root / ".locks" / "daemon.sock"
+
+
+def daemon_request(root: Path, command: str, params: dict, timeout: float | None = None) -> dict | None:
+    # Returns None when no daemon is serving this root so callers can fall back to in-process work.
+    if os.environ.get("SPRITELET_NO_DAEMON"):
+        return None
+    sock_path = daemon_socket_path(root)
+    if not sock_path.exists():
+        return None
+
+    # Imported here: without a running daemon, lookups never need the socket module.
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(str(sock_path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            return None
+        request = {"command": command, "root": str(root.resolve()), "params": params}
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("r", encoding="utf-8") as reader:
+            line = reader.readline()
+    finally:
+        sock.close()
+
+    if not line:
+        raise SystemExit(f"Spritelet daemon closed the connection: {sock_path}")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise SystemExit(response.get("error", "Spritelet daemon request failed"))
+    return response["result"]
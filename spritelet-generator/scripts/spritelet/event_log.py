@@ -0,0 +1,288 @@
+import json
+import os
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from .store_utils import atomic_write_json, fsync_path, load_json
+
+DEFAULT_MAX_SEGMENT_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_SEGMENT_SECONDS = 0
+INDEX_EVERY_BYTES = 64 * 1024
+
+
+# Layout under signals/:
+#   events.jsonl             active segment (what older readers tail)
+#   events.jsonl.idx         sparse index for the active segment: {"seq", "updated_at", "offset"} per line
+#   events.head.json         next seq, active segment first seq/start time, last indexed offset
+#   segments/events-<first seq>.jsonl[.gz] and .jsonl.idx   sealed segments
+class EventLog:
+    def __init__(self, root: Path, profile: dict | None = None) -> None:
+        self.signals_dir = root / "signals"
+        self.active_path = self.signals_dir / "events.jsonl"
+        self.active_index_path = self.signals_dir / "events.jsonl.idx"
+        self.head_path = self.signals_dir / "events.head.json"
+        self.segments_dir = self.signals_dir / "segments"
+        if profile is None:
+            profile = load_json(root / "spritelet.json", {})
+        settings = profile.get("event_log", {})
+        self.max_segment_bytes = int(settings.get("max_segment_bytes", DEFAULT_MAX_SEGMENT_BYTES))
+        self.max_segment_seconds = float(settings.get("max_segment_seconds", DEFAULT_MAX_SEGMENT_SECONDS))
+        self.compress_sealed = bool(settings.get("compress_sealed", False))
+
+    def _load_head(self) -> dict:
+        head = load_json(self.head_path, {})
+        if head:
+            return head
+        # Stores created before segmentation: number the existing lines 0..n-1 and index them once.
+        head = {"next_seq": 0, "segment_first_seq": 0, "segment_started_at": time.time(), "indexed_offset": -1}
+        if self.active_path.exists():
+            index_lines = []
+            with self.active_path.open("rb") as f:
+                offset = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    if head["indexed_offset"] < 0 or offset - head["indexed_offset"] >= INDEX_EVERY_BYTES:
+                        event = json.loads(line)
+                        index_lines.append(
+                            {"seq": head["next_seq"], "updated_at": event.get("updated_at", ""), "offset": offset}
+                        )
+                        head["indexed_offset"] = offset
+                    head["next_seq"] += 1
+                    offset += len(line)
+            self.active_index_path.write_text(
+                "".join(json.dumps(entry) + "\n" for entry in index_lines), encoding="utf-8"
+            )
+        return head
+
+    def _should_rotate(self, head: dict) -> bool:
+        try:
+            size = self.active_path.stat().st_size
+        except FileNotFoundError:
+            return False
+        if size == 0:
+            return False
+        if self.max_segment_bytes and size >= self.max_segment_bytes:
+            return True
+        return bool(self.max_segment_seconds and time.time() - head["segment_started_at"] >= self.max_segment_seconds)
+
+    def _seal(self, head: dict) -> None:
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        sealed = self.segments_dir / f"events-{head['segment_first_seq']:012d}.jsonl"
+        if self.active_index_path.exists():
+            os.replace(self.active_index_path, sealed.with_suffix(".jsonl.idx"))
+        os.replace(self.active_path, sealed)
+        head.update(segment_first_seq=head["next_seq"], segment_started_at=time.time(), indexed_offset=-1)
+
+    def append(self, events: list[dict]) -> list[dict]:
+        # Caller must hold store_lock. Returns the events as written, each with its "seq".
+        self.signals_dir.mkdir(parents=True, exist_ok=True)
+        head = self._load_head()
+        if self._should_rotate(head):
+            self._seal(head)
+
+        written = []
+        index_lines = []
+        with self.active_path.open("ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            chunks = []
+            for event in events:
+                event = {**event, "seq": head["next_seq"]}
+                data = (json.dumps(event) + "\n").encode("utf-8")
+                if offset == 0 or head["indexed_offset"] < 0 or offset - head["indexed_offset"] >= INDEX_EVERY_BYTES:
+                    index_lines.append({"seq": event["seq"], "updated_at": event.get("updated_at", ""), "offset": offset})
+                    head["indexed_offset"] = offset
+                chunks.append(data)
+                written.append(event)
+                head["next_seq"] += 1
+                offset += len(data)
+            f.write(b"".join(chunks))
+        if index_lines:
+            with self.active_index_path.open("a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in index_lines))
+        atomic_write_json(self.head_path, head)
+        return written
+
+    def sync(self) -> None:
+        # Caller must hold store_lock (shared is enough). Flushes everything append() may have written
+        # since the last sync: the active segment and index, the head, and the latest sealed segment
+        # if a rotation moved earlier lines there, then the directory entries for those renames.
+        paths = [self.active_path, self.active_index_path, self.head_path, self.signals_dir]
+        if self.segments_dir.exists():
+            sealed = self.segments()[:-1]
+            if sealed:
+                paths.append(sealed[-1][1])
+            paths.append(self.segments_dir)
+        for path in paths:
+            try:
+                fsync_path(path)
+            except FileNotFoundError:
+                continue
+
+    def compress_sealed_segments(self) -> list[Path]:
+        # Sealed segments never change, so gzipping them needs no store_lock: writers call this once
+        # they have released it (see compress_sealed), and read() re-lists when a segment it listed
+        # has been replaced by its .gz meanwhile.
+        compressed = []
+        if self.segments_dir.is_dir():
+            for path in sorted(self.segments_dir.glob("events-*.jsonl")):
+                try:
+                    compressed.append(compress_segment(path))
+                except FileNotFoundError:
+                    # Another process compressed it first.
+                    continue
+        return compressed
+
+    def reset(self, events: list[dict]) -> list[dict]:
+        # Caller must hold store_lock. Drops every segment and starts again at seq 0.
+        if self.segments_dir.exists():
+            for path in self.segments_dir.glob("events-*"):
+                path.unlink()
+        for path in (self.active_path, self.active_index_path, self.head_path):
+            path.unlink(missing_ok=True)
+        atomic_write_json(
+            self.head_path,
+            {"next_seq": 0, "segment_first_seq": 0, "segment_started_at": time.time(), "indexed_offset": -1},
+        )
+        return self.append(events)
+
+    def segments(self) -> list[tuple[int, Path, Path]]:
+        # (first seq, data path, index path) for sealed segments in order, then the active one. The
+        # head is read on both sides of the listing, so a rotation in between cannot drop a segment.
+        head = load_json(self.head_path, {})
+        found = {}
+        if self.segments_dir.exists():
+            for path in self.segments_dir.glob("events-*.jsonl*"):
+                if path.name.endswith((".idx", ".tmp")):
+                    continue
+                first_seq = int(path.name.split("-", 1)[1].split(".", 1)[0])
+                index_path = self.segments_dir / f"events-{first_seq:012d}.jsonl.idx"
+                # Prefer the plain file if a crash left both it and its compressed copy behind.
+                if first_seq not in found or not path.name.endswith(".gz"):
+                    found[first_seq] = (first_seq, path, index_path)
+        if load_json(self.head_path, {}).get("segment_first_seq") != head.get("segment_first_seq"):
+            return self.segments()
+        found_segments = [found[key] for key in sorted(found)]
+        found_segments.append((head.get("segment_first_seq", 0), self.active_path, self.active_index_path))
+        return found_segments
+
+    def last_seq(self) -> int | None:
+        head = load_json(self.head_path, {})
+        if head:
+            next_seq = head["next_seq"]
+        elif self.active_path.exists():
+            with self.active_path.open("rb") as f:
+                next_seq = sum(1 for line in f if line.endswith(b"\n"))
+        else:
+            next_seq = 0
+        return next_seq - 1 if next_seq else None
+
+    def read(self, after_seq: int | None = None, since: str | None = None) -> Iterator[dict]:
+        # Streams events with seq > after_seq and updated_at >= since, seeking via the sparse index.
+        segments = self.segments()
+        start = 0
+        for i, (first_seq, _, index_path) in enumerate(segments):
+            if after_seq is not None:
+                # Until a rotation writes the head, the sealed segment and the new active one share a
+                # first seq; reading starts at the sealed one.
+                if first_seq <= after_seq + 1 and (i == 0 or segments[i - 1][0] != first_seq):
+                    start = i
+            elif since is not None:
+                entries = read_index(index_path)
+                if entries and entries[0]["updated_at"] < since:
+                    start = i
+
+        pending = segments[start:]
+        last = after_seq
+        while pending:
+            first_seq, path, index_path = pending.pop(0)
+            try:
+                if path.name.endswith(".gz"):
+                    import gzip
+
+                    f = gzip.open(path, "rb")
+                else:
+                    f = path.open("rb")
+            except FileNotFoundError:
+                f = None
+            if path == self.active_path:
+                # An open active segment is read whole even if it is sealed meanwhile; if it was sealed
+                # before it was opened, the file opened is the next segment, even before the head says so.
+                stale = load_json(self.head_path, {}).get("segment_first_seq", 0) != first_seq
+                if f is not None and not stale:
+                    try:
+                        sealed = (self.segments_dir / f"events-{first_seq:012d}.jsonl").stat()
+                        stale = not os.path.samestat(os.fstat(f.fileno()), sealed)
+                    except FileNotFoundError:
+                        pass
+            else:
+                stale = f is None
+            if stale:
+                if f is not None:
+                    f.close()
+                # Rotated or compressed since it was listed: list again and carry on from this segment.
+                pending = [segment for segment in self.segments() if segment[0] >= first_seq]
+                continue
+            if f is None:
+                continue
+            offset, seq = 0, first_seq
+            for entry in read_index(index_path):
+                if last is None and since is None:
+                    # A full read starts at the top of the first segment.
+                    break
+                if last is not None and entry["seq"] > last + 1:
+                    break
+                if since is not None and after_seq is None and entry["updated_at"] >= since:
+                    break
+                offset, seq = entry["offset"], entry["seq"]
+            with f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # A writer is mid-append; the rest of the line belongs to the next read.
+                        return
+                    event = json.loads(line)
+                    event.setdefault("seq", seq)
+                    seq = event["seq"] + 1
+                    # last also skips what a pass over a re-listed segment already yielded.
+                    if last is not None and event["seq"] <= last:
+                        continue
+                    if since is not None and event.get("updated_at", "") < since:
+                        continue
+                    last = event["seq"]
+                    yield event
+
+
+def read_index(index_path: Path) -> list[dict]:
+    if not index_path.exists():
+        return []
+    return [json.loads(line) for line in index_path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def compress_segment(path: Path) -> Path:
+    # Runs without store_lock, so each process writes its own temp file; two compressing the same
+    # segment both produce the same .gz.
+    target = path.with_name(path.name + ".gz")
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    import gzip
+
+    with path.open("rb") as src, gzip.open(tmp, "wb") as dst:
+        while chunk := src.read(1 << 20):
+            dst.write(chunk)
+    os.replace(tmp, target)
+    path.unlink(missing_ok=True)
+    return target
+
+
+def compress_sealed(root: Path, profile: dict | None = None) -> None:
+    # Call after releasing store_lock from anything that appends: with event_log.compress_sealed,
+    # gzips the segments rotations have sealed.
+    log = EventLog(root, profile)
+    if log.compress_sealed:
+        log.compress_sealed_segments()
+
+
+def append_event(root: Path, event: dict) -> dict:
+    # Caller must hold store_lock; call compress_sealed once it is released.
+    return EventLog(root).append([event])[0]
@@ -0,0 +1,504 @@
+import base64
+import email.utils
+import http.client
+import json
+import os
+import queue
+import random
+import re
+import secrets
+import ssl
+import threading
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+from .metrics import count, record_stage
+
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+INLINE_DATA_KEYS = ("inline_data", "inlineData")
+STREAM_CHUNK_BYTES = 64 * 1024
+_STRING_STOP = re.compile(rb'["\\]')
+_LITERAL_STOP = re.compile(rb"[,}\]\s]")
+
+
+def build_generation_url(model: str, api_key: str, endpoint: str) -> str:
+    url = endpoint
+    if "{model}" in endpoint:
+        url = endpoint.replace("{model}", urllib.parse.quote(model, safe="/"))
+    if "key=" not in url:
+        joiner = "&" if "?" in url else "?"
+        url = f"{url}{joiner}key={urllib.parse.quote(api_key)}"
+    return url
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class RetryableError(Exception):
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def prepare_post(url: str, body: bytes | list[bytes], extra_headers: dict | None = None) -> tuple[tuple[str, str, int], str, dict]:
+    # Returns the (scheme, host, port) pool key, request target and headers for a POST to url.
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme or "https"
+    port = parts.port or (443 if scheme == "https" else 80)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    headers = {"Content-Type": "application/json", "Connection": "keep-alive", **(extra_headers or {})}
+    if isinstance(body, list):
+        # Pre-serialized request pieces are sent back to back instead of joined into one copy.
+        headers["Content-Length"] = str(sum(len(piece) for piece in body))
+    return (scheme, parts.hostname, port), target, headers
+
+
+def proxy_for(scheme: str, host: str) -> tuple[str, int, str] | None:
+    # (host, port, Proxy-Authorization value or "") of the proxy urllib would use for this URL, from
+    # HTTP_PROXY / HTTPS_PROXY / NO_PROXY (or the platform's settings), or None to connect directly.
+    proxy = urllib.request.getproxies().get(scheme)
+    if not proxy or urllib.request.proxy_bypass(host):
+        return None
+    parts = urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    authorization = ""
+    if parts.username:
+        credentials = f"{urllib.parse.unquote(parts.username)}:{urllib.parse.unquote(parts.password or '')}"
+        authorization = "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+    return parts.hostname, parts.port or 80, authorization
+
+
+def client_settings() -> dict:
+    return {
+        "connect_timeout": float(os.environ.get("SPRITELET_HTTP_CONNECT_TIMEOUT", "10")),
+        "read_timeout": float(os.environ.get("SPRITELET_HTTP_READ_TIMEOUT", "120")),
+        "max_retries": int(os.environ.get("SPRITELET_HTTP_MAX_RETRIES", "4")),
+    }
+
+
+class RetryPolicy:
+    # Timeouts plus jittered exponential backoff; the asyncio client awaits the same delays between its attempts.
+    def __init__(
+        self,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 120.0,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ) -> None:
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max * 4))
+        return delay
+
+    def _retry_delay(self, attempt: int, error: RetryableError) -> float:
+        # Seconds to wait before the next attempt, or SystemExit once retries are used up.
+        if attempt >= self.max_retries:
+            raise SystemExit(f"{error} (after {attempt + 1} attempts)") from error
+        return self._backoff(attempt, error.retry_after)
+
+
+class ImageFileWriter:
+    # Feeds response chunks to InlineImageStreamer over a temp file beside out_path; commit() renames
+    # it into place, so readers of an existing state path never see a partial image. The temp file is
+    # created with mode 0666 less the umask, like a plain write, so the image stays readable by the
+    # UIs and signal consumers that other users run.
+    # Local file errors (a full disk, a read-only store) raise SystemExit rather than OSError, so the
+    # clients never mistake them for connection failures and pay for the generation again.
+    def __init__(self, out_path: Path) -> None:
+        self.out_path = out_path
+        self.decode_seconds = 0.0
+        self.tmp_path = out_path.with_name(f".{out_path.name}.{secrets.token_hex(4)}.tmp")
+        try:
+            fd = os.open(self.tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except OSError as e:
+            raise SystemExit(f"Could not write generated image: {e}") from e
+        self.tmp = os.fdopen(fd, "wb")
+        self.streamer = InlineImageStreamer(self.tmp)
+
+    @property
+    def done(self) -> bool:
+        return self.streamer.done
+
+    def feed(self, chunk: bytes) -> None:
+        started = time.perf_counter()
+        try:
+            self.streamer.feed(chunk)
+        except OSError as e:
+            raise SystemExit(f"Could not write generated image: {e}") from e
+        self.decode_seconds += time.perf_counter() - started
+
+    def commit(self) -> None:
+        try:
+            self.tmp.close()
+            if self.streamer.found:
+                os.replace(self.tmp_path, self.out_path)
+        except OSError as e:
+            raise SystemExit(f"Could not write generated image: {e}") from e
+        if not self.streamer.found:
+            raise SystemExit("No image bytes found in generation API response")
+
+    def abort(self) -> None:
+        try:
+            self.tmp.close()
+        except OSError:
+            pass
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def stream_image_response(resp, out_path: Path, stop: threading.Event | None = None) -> float:
+    # Decodes the first inline image of a response into out_path; returns the seconds spent decoding
+    # and writing. Setting stop (a cancelled asyncio caller) abandons the image before it is renamed in.
+    writer = ImageFileWriter(out_path)
+    try:
+        while not writer.done:
+            chunk = resp.read(STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            if stop is not None and stop.is_set():
+                raise SystemExit("Generation cancelled")
+            writer.feed(chunk)
+        if stop is not None and stop.is_set():
+            raise SystemExit("Generation cancelled")
+        writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.decode_seconds
+
+
+def record_generation(started: float, decode_seconds: float) -> None:
+    # Decoding and disk writes interleave with the download, so their time is summed per chunk
+    # and the rest of the request is reported as API time.
+    count("spritelet_generations_total", "ok")
+    record_stage("api", time.perf_counter() - started - decode_seconds)
+    record_stage("decode_write", decode_seconds)
+
+
+class GenerationClient(RetryPolicy):
+    # Keep-alive connection pool plus retries with jittered exponential backoff for generateContent calls.
+    def __init__(
+        self,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 120.0,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        pool_size: int = 8,
+        sleep=time.sleep,
+    ) -> None:
+        super().__init__(connect_timeout, read_timeout, max_retries, backoff_base, backoff_max)
+        self.pool_size = pool_size
+        self.sleep = sleep
+        # Keyed by (scheme, host, port, proxy), so a changed proxy setting never reuses old connections.
+        self._pools: dict[tuple, queue.LifoQueue] = {}
+        self._pools_lock = threading.Lock()
+        self._ssl_context = None
+
+    def _pool(self, key: tuple) -> queue.LifoQueue:
+        with self._pools_lock:
+            return self._pools.setdefault(key, queue.LifoQueue(maxsize=self.pool_size))
+
+    def _connect(
+        self, scheme: str, host: str, port: int, proxy: tuple[str, int, str] | None
+    ) -> http.client.HTTPConnection:
+        # Through a proxy, HTTPS is tunnelled with CONNECT; plain HTTP requests go to the proxy itself.
+        address = (proxy[0], proxy[1]) if proxy else (host, port)
+        if scheme == "https":
+            if self._ssl_context is None:
+                # Honors SSL_CERT_FILE / SSL_CERT_DIR like urllib does.
+                self._ssl_context = ssl.create_default_context()
+            conn = http.client.HTTPSConnection(*address, timeout=self.connect_timeout, context=self._ssl_context)
+            if proxy:
+                conn.set_tunnel(host, port, {"Proxy-Authorization": proxy[2]} if proxy[2] else None)
+        else:
+            conn = http.client.HTTPConnection(*address, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def _checkout(self, key: tuple) -> tuple[http.client.HTTPConnection, bool]:
+        try:
+            return self._pool(key).get_nowait(), True
+        except queue.Empty:
+            return self._connect(*key), False
+
+    def _checkin(self, key: tuple, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._pool(key).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _post_once(self, url: str, body: bytes | list[bytes], handle_body=None, extra_headers: dict | None = None):
+        key, target, headers = prepare_post(url, body, extra_headers)
+        proxy = proxy_for(key[0], key[1])
+        if proxy and key[0] == "http":
+            target = url
+            if proxy[2]:
+                headers["Proxy-Authorization"] = proxy[2]
+        key = (*key, proxy)
+        conn = None
+        pooled = False
+        try:
+            conn, reused = self._checkout(key)
+            try:
+                conn.request("POST", target, body=body, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                if not reused:
+                    raise
+                # The server dropped an idle pooled connection; one fresh attempt is not a retry.
+                conn.close()
+                conn = self._connect(*key)
+                conn.request("POST", target, body=body, headers=headers)
+                resp = conn.getresponse()
+            if resp.status < 300 and handle_body is not None:
+                result = handle_body(resp)
+                # Drain anything left so the connection can go back to the pool.
+                while resp.read(STREAM_CHUNK_BYTES):
+                    pass
+            else:
+                data = resp.read()
+            if not resp.will_close:
+                self._checkin(key, conn)
+                pooled = True
+        except ssl.SSLCertVerificationError:
+            # Retrying cannot fix a local trust store problem; see README TLS troubleshooting.
+            raise
+        except (OSError, http.client.HTTPException) as e:
+            raise RetryableError(f"Generation API connection failed: {type(e).__name__}: {e}") from e
+        finally:
+            # Every connection that did not go back to the pool is closed, whatever ended the request.
+            if conn and not pooled:
+                conn.close()
+
+        if resp.status < 300 and handle_body is not None:
+            return result
+
+        if resp.status in RETRYABLE_STATUSES:
+            raise RetryableError(
+                f"Generation API failed: {resp.status} {data.decode('utf-8', errors='replace')}",
+                parse_retry_after(resp.getheader("Retry-After")),
+            )
+        if resp.status >= 400:
+            raise SystemExit(f"Generation API failed: {resp.status} {data.decode('utf-8', errors='replace')}")
+        return json.loads(data.decode("utf-8"))
+
+    def generate(self, model: str, api_key: str, endpoint: str, request_payload: dict | list[bytes]) -> dict:
+        return self._post_with_retries(build_generation_url(model, api_key, endpoint), request_payload)
+
+    def upload(self, upload_endpoint: str, api_key: str, data: bytes, mime_type: str) -> dict:
+        # Raw single-request media upload, as accepted by the Gemini Files API.
+        url = build_generation_url("", api_key, upload_endpoint)
+        headers = {"Content-Type": mime_type, "X-Goog-Upload-Protocol": "raw"}
+        return self._post_with_retries(url, [data], extra_headers=headers)
+
+    def generate_to_file(
+        self,
+        model: str,
+        api_key: str,
+        endpoint: str,
+        request_payload: dict | list[bytes],
+        out_path: Path,
+        before_retry=None,
+    ) -> None:
+        # Streams the first inline image of the response into out_path via a temp file and atomic rename.
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        started = time.perf_counter()
+        try:
+            decode_seconds = self._post_with_retries(
+                build_generation_url(model, api_key, endpoint),
+                request_payload,
+                lambda resp: stream_image_response(resp, out_path),
+                before_retry=before_retry,
+            )
+        except BaseException:
+            count("spritelet_generations_total", "error")
+            raise
+        record_generation(started, decode_seconds)
+
+    def _post_with_retries(
+        self,
+        url: str,
+        request_payload: dict | list[bytes],
+        handle_body=None,
+        extra_headers: dict | None = None,
+        before_retry=None,
+    ):
+        # before_retry runs ahead of each attempt after the first, e.g. to take another rate limit slot.
+        body = request_payload if isinstance(request_payload, list) else json.dumps(request_payload).encode("utf-8")
+        for attempt in range(self.max_retries + 1):
+            if attempt and before_retry:
+                before_retry()
+            try:
+                return self._post_once(url, body, handle_body, extra_headers)
+            except RetryableError as e:
+                self.sleep(self._retry_delay(attempt, e))
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        with self._pools_lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            while not pool.empty():
+                pool.get_nowait().close()
+
+
+class InlineImageStreamer:
+    # Incremental JSON scanner that base64-decodes the first non-empty
+    # candidates[].content.parts[].inline_data.data string straight into sink as chunks arrive, so the
+    # image never sits in memory whole. An empty data string is skipped, as extract_image_bytes does.
+    def __init__(self, sink) -> None:
+        self.sink = sink
+        self.written = 0
+        self.found = False
+        self.done = False
+        self._buf = b""
+        self._stack: list[dict] = []
+        self._string = None
+        self._key = bytearray()
+        self._b64 = bytearray()
+
+    def _emit(self, data: bytes) -> None:
+        self._b64 += data
+        usable = len(self._b64) // 4 * 4
+        if usable:
+            self._write(base64.b64decode(bytes(self._b64[:usable])))
+            del self._b64[:usable]
+
+    def _write(self, decoded: bytes) -> None:
+        self.sink.write(decoded)
+        self.written += len(decoded)
+
+    def _string_stop(self, data: bytes, i: int) -> tuple[int, bool] | None:
+        # Returns (index just past the consumed run, string_closed), or None if more bytes are needed.
+        m = _STRING_STOP.search(data, i)
+        run_end = m.start() if m else len(data)
+        if self._string == "target":
+            self._emit(data[i:run_end])
+        elif self._string == "key":
+            self._key += data[i:run_end]
+        if not m:
+            return len(data), False
+        if data[run_end] == ord('"'):
+            return run_end + 1, True
+        escape_len = 6 if data[run_end + 1 : run_end + 2] == b"u" else 2
+        if run_end + escape_len > len(data):
+            # Stop before a split escape; it is retried once the next chunk arrives.
+            return (run_end, False) if run_end > i else None
+        escape = data[run_end : run_end + escape_len]
+        if self._string == "target":
+            self._emit(json.loads(b'"' + escape + b'"').encode("utf-8"))
+        elif self._string == "key":
+            self._key += escape
+        return run_end + escape_len, False
+
+    def feed(self, chunk: bytes) -> None:
+        if self.done:
+            return
+        data = self._buf + chunk
+        i = 0
+        n = len(data)
+        while i < n and not self.done:
+            if self._string:
+                stop = self._string_stop(data, i)
+                if stop is None:
+                    break
+                i, closed = stop
+                if closed:
+                    if self._string == "key":
+                        self._stack[-1]["key"] = json.loads(b'"' + bytes(self._key) + b'"')
+                        self._key.clear()
+                    elif self._string == "target":
+                        if self._b64:
+                            self._write(base64.b64decode(bytes(self._b64)))
+                            self._b64.clear()
+                        self.found = self.done = self.written > 0
+                    self._string = None
+                continue
+
+            c = data[i : i + 1]
+            top = self._stack[-1] if self._stack else None
+            if c in b" \t\r\n":
+                i += 1
+            elif c in b"{[":
+                name = top["key"] if top and top["kind"] == "obj" else None
+                self._stack.append({"kind": "obj" if c == b"{" else "arr", "name": name, "key": None, "expect_key": True})
+                i += 1
+            elif c in b"}]":
+                self._stack.pop()
+                i += 1
+            elif c == b":":
+                top["expect_key"] = False
+                i += 1
+            elif c == b",":
+                if top and top["kind"] == "obj":
+                    top["expect_key"] = True
+                i += 1
+            elif c == b'"':
+                if top and top["kind"] == "obj" and top["expect_key"]:
+                    self._string = "key"
+                elif top and top["kind"] == "obj" and top["key"] == "data" and top["name"] in INLINE_DATA_KEYS:
+                    self._string = "target"
+                else:
+                    self._string = "skip"
+                i += 1
+            else:
+                m = _LITERAL_STOP.search(data, i)
+                if not m:
+                    break
+                i = m.start()
+        self._buf = data[i:] if not self.done else b""
+
+
+_default_client: GenerationClient | None = None
+_default_client_lock = threading.Lock()
+
+
+def default_client() -> GenerationClient:
+    # One pool per process so repeated generations (batch, daemon) reuse connections and TLS sessions.
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = GenerationClient(**client_settings())
+        return _default_client
+
+
+def call_generation_api(model: str, api_key: str, endpoint: str, request_payload: dict | list[bytes]) -> dict:
+    return default_client().generate(model, api_key, endpoint, request_payload)
+
+
+def generate_image_to_file(
+    model: str, api_key: str, endpoint: str, request_payload: dict | list[bytes], out_path: Path, before_retry=None
+) -> None:
+    default_client().generate_to_file(model, api_key, endpoint, request_payload, out_path, before_retry)
+
+
+def extract_image_bytes(response_payload: dict) -> bytes:
+    candidates = response_payload.get("candidates", [])
+    for candidate in candidates:
+        parts = candidate.get("content", {}).get("parts", [])
+        for part in parts:
+            inline = part.get("inline_data") or part.get("inlineData")
+            if inline and inline.get("data"):
+                return base64.b64decode(inline["data"])
+    raise SystemExit("No image bytes found in generation API response")
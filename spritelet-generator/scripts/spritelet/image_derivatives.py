@@ -0,0 +1,587 @@
+import math
+import os
+import struct
+import zlib
+from operator import mul
+from pathlib import Path, PurePosixPath
+
+from .store_utils import resolve_store_path
+
+# Derivatives are smaller copies of a state image for displays that never show it full size:
+# states/variants/<state path without .png>/<max edge>.png, rebuilt whenever the image is
+# regenerated. Decoding is stdlib-only: PNG through zlib, baseline JPEG (what the generation API
+# returns) through its DCT coefficients at the smallest 1/8..8/8 scale that covers the largest size,
+# which is an exact box filter per 8x8 block and skips most of a full decode.
+DERIVATIVE_FORMATS = ("png",)
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+PNG_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+JPEG_ZIGZAG = (
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63,
+)
+MASKS = [(1 << bits) - 1 for bits in range(64)]
+UINT32 = struct.Struct(">I")
+
+
+class UnsupportedImage(Exception):
+    pass
+
+
+def derivative_settings(profile: dict) -> dict:
+    # spritelet.json "derivatives": {"sizes": [max edge px, ...], "formats": ["png"]}; no sizes = off.
+    settings = profile.get("derivatives", {})
+    sizes = sorted({int(size) for size in settings.get("sizes", [])})
+    if sizes and sizes[0] < 1:
+        raise SystemExit("derivatives.sizes must be positive pixel counts")
+    formats = list(dict.fromkeys(settings.get("formats", ["png"])))
+    for fmt in formats:
+        if fmt not in DERIVATIVE_FORMATS:
+            # WebP/AVIF encoders need an imaging library; the store has no third-party dependencies.
+            raise SystemExit(f"derivatives.formats supports {', '.join(DERIVATIVE_FORMATS)}, not {fmt!r}")
+    return {"sizes": sizes, "formats": formats}
+
+
+def variants_dir_rel(spritelet_path: str) -> str:
+    return str(PurePosixPath("states/variants") / PurePosixPath(spritelet_path).relative_to("states").with_suffix(""))
+
+
+def image_dimensions(path: Path) -> tuple[str, int, int] | None:
+    # (format, width, height) from the PNG IHDR or JPEG frame header, without decoding pixels.
+    with path.open("rb") as f:
+        head = f.read(24)
+        if head[:8] == PNG_SIGNATURE and head[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", head[16:24])
+            return "png", width, height
+        if head[:2] != b"\xff\xd8":
+            return None
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+                continue
+            length = struct.unpack(">H", f.read(2))[0]
+            if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">xHH", f.read(5))
+                return "jpeg", width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def describe_variants(root: Path, spritelet_path: str) -> list[dict]:
+    # Variant files at least as new as the image they were made from, smallest first; the catalog
+    # records these on every upsert, so a regenerated image never lists its old variants.
+    try:
+        source_mtime = resolve_store_path(root, spritelet_path).stat().st_mtime_ns
+        names = os.listdir(root / variants_dir_rel(spritelet_path))
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    variants = []
+    for name in names:
+        stem, _, fmt = name.partition(".")
+        if not stem.isdigit() or fmt not in DERIVATIVE_FORMATS:
+            continue
+        path = root / variants_dir_rel(spritelet_path) / name
+        try:
+            st = path.stat()
+            dimensions = image_dimensions(path) if st.st_mtime_ns >= source_mtime else None
+        except FileNotFoundError:
+            continue
+        if dimensions is None:
+            continue
+        variants.append(
+            {
+                "spritelet_path": f"{variants_dir_rel(spritelet_path)}/{name}",
+                "format": fmt,
+                "width": dimensions[1],
+                "height": dimensions[2],
+                "bytes": st.st_size,
+            }
+        )
+    variants.sort(key=lambda variant: (int(variant["spritelet_path"].rsplit("/", 1)[1].split(".")[0]), variant["format"]))
+    return variants
+
+
+def expected_variant_names(width: int, height: int, settings: dict) -> set[str]:
+    # Sizes at or above the image's own longest edge are skipped; the image itself serves them.
+    return {f"{size}.{fmt}" for size in settings["sizes"] if size < max(width, height) for fmt in settings["formats"]}
+
+
+def variants_current(root: Path, spritelet_path: str, settings: dict) -> bool:
+    # True when the variant files on disk are exactly the configured ones, all made from this image.
+    source = resolve_store_path(root, spritelet_path)
+    dimensions = image_dimensions(source) if source.exists() else None
+    out_dir = root / variants_dir_rel(spritelet_path)
+    on_disk = {path.name for path in out_dir.iterdir() if not path.name.endswith(".tmp")} if out_dir.is_dir() else set()
+    fresh = {variant["spritelet_path"].rsplit("/", 1)[1] for variant in describe_variants(root, spritelet_path)}
+    expected = expected_variant_names(dimensions[1], dimensions[2], settings) if dimensions else set()
+    return on_disk == fresh == expected
+
+
+def build_derivatives(root: Path, spritelet_path: str, settings: dict) -> list[dict]:
+    # Writes every configured variant of one state image (temp file + rename, like the image itself)
+    # and removes variants for sizes no longer configured. Raises UnsupportedImage for PNGs and JPEGs
+    # this decoder cannot read (interlaced, progressive, CMYK, 12-bit).
+    source = resolve_store_path(root, spritelet_path)
+    out_dir = root / variants_dir_rel(spritelet_path)
+    dimensions = image_dimensions(source)
+    wanted = expected_variant_names(dimensions[1], dimensions[2], settings) if dimensions else set()
+    if wanted:
+        largest = max(int(name.split(".")[0]) for name in wanted)
+        width, height, channels, pixels = read_image(source, largest)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name in sorted(wanted, key=lambda name: -int(name.split(".")[0])):
+            size = int(name.split(".")[0])
+            scaled = downscale(width, height, channels, pixels, size)
+            target = out_dir / name
+            tmp = target.with_name(target.name + ".tmp")
+            tmp.write_bytes(encode_png(*scaled))
+            os.replace(tmp, target)
+    if out_dir.exists():
+        for path in out_dir.iterdir():
+            if path.name not in wanted and not path.name.endswith(".tmp"):
+                path.unlink(missing_ok=True)
+        if not wanted:
+            try:
+                out_dir.rmdir()
+            except OSError:
+                pass
+    if dimensions is None:
+        raise UnsupportedImage(f"{spritelet_path} is neither PNG nor JPEG")
+    return describe_variants(root, spritelet_path)
+
+
+def read_image(path: Path, max_edge: int | None = None) -> tuple[int, int, int, bytes]:
+    # (width, height, channels, 8-bit samples row by row). JPEGs are decoded at the smallest scale
+    # whose longest edge still reaches max_edge.
+    data = path.read_bytes()
+    if data[:8] == PNG_SIGNATURE:
+        return decode_png(data)
+    if data[:2] == b"\xff\xd8":
+        return decode_jpeg(data, max_edge)
+    raise UnsupportedImage(f"{path.name} is neither PNG nor JPEG")
+
+
+def _add_bytes(a: bytes, b: bytes) -> bytes:
+    # Byte-wise (a + b) mod 256 over whole rows at once: big-int adds with the carries kept out of
+    # each byte's top bit.
+    size = len(a)
+    high = int.from_bytes(b"\x80" * size, "big")
+    x = int.from_bytes(a, "big")
+    y = int.from_bytes(b, "big")
+    return (((x & ~high) + (y & ~high)) ^ ((x ^ y) & high)).to_bytes(size, "big")
+
+
+def _sub_bytes(a: bytes, b: bytes) -> bytes:
+    # Byte-wise (a - b) mod 256, the inverse of _add_bytes.
+    size = len(a)
+    high = int.from_bytes(b"\x80" * size, "big")
+    x = int.from_bytes(a, "big")
+    y = int.from_bytes(b, "big")
+    return (((x | high) - (y & ~high)) ^ ((x ^ y ^ high) & high)).to_bytes(size, "big")
+
+
+def decode_png(data: bytes) -> tuple[int, int, int, bytes]:
+    pos = 8
+    idat = []
+    palette = transparency = None
+    header = None
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos : pos + 8])
+        body = data[pos + 8 : pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif kind == b"PLTE":
+            palette = body
+        elif kind == b"tRNS":
+            transparency = body
+        elif kind == b"IDAT":
+            idat.append(body)
+        elif kind == b"IEND":
+            break
+    if header is None:
+        raise UnsupportedImage("PNG has no IHDR")
+    width, height, depth, color_type, _, _, interlace = header
+    if interlace:
+        raise UnsupportedImage("interlaced PNG is not supported")
+    if color_type not in PNG_CHANNELS or depth not in (1, 2, 4, 8, 16) or (depth < 8 and color_type not in (0, 3)):
+        raise UnsupportedImage(f"PNG color type {color_type} at bit depth {depth} is not supported")
+    channels = PNG_CHANNELS[color_type]
+    bpp = max(1, channels * depth // 8)
+    stride = (width * channels * depth + 7) // 8
+    raw = zlib.decompress(b"".join(idat))
+
+    rows = []
+    prior = bytes(stride)
+    for y in range(height):
+        offset = y * (stride + 1)
+        kind = raw[offset]
+        line = bytearray(raw[offset + 1 : offset + 1 + stride])
+        if kind == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif kind == 2:
+            line = bytearray(_add_bytes(line, prior))
+        elif kind == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prior[i]) >> 1)) & 0xFF
+        elif kind == 4:
+            for i in range(stride):
+                a = line[i - bpp] if i >= bpp else 0
+                b = prior[i]
+                c = prior[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                line[i] = (line[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+        elif kind:
+            raise UnsupportedImage(f"PNG row filter {kind} is not valid")
+        prior = bytes(line)
+        rows.append(prior)
+
+    if depth == 16:
+        rows = [row[::2] for row in rows]
+    elif depth < 8:
+        per_byte = 8 // depth
+        shifts = [8 - depth * (i + 1) for i in range(per_byte)]
+        # Grey levels stretch to 0..255; palette indexes stay indexes.
+        scale = 255 // MASKS[depth] if color_type == 0 else 1
+        rows = [
+            bytes(((byte >> shift) & MASKS[depth]) * scale for byte in row for shift in shifts)[:width] for row in rows
+        ]
+    pixels = b"".join(rows)
+
+    if color_type == 3:
+        if palette is None:
+            raise UnsupportedImage("palette PNG has no PLTE")
+        entries = len(palette) // 3
+        colors = [palette[i * 3 : i * 3 + 3] for i in range(entries)] + [b"\0\0\0"] * (256 - entries)
+        if transparency:
+            alpha = transparency + b"\xff" * (256 - len(transparency))
+            colors = [color + alpha[i : i + 1] for i, color in enumerate(colors)]
+        channels = len(colors[0])
+        pixels = b"".join([colors[index] for index in pixels])
+    return width, height, channels, pixels
+
+
+def _huffman_table(counts: bytes, symbols: bytes) -> list:
+    # 16-bit lookahead -> (run, size, code length) of the symbol whose code starts there.
+    table = [None] * 65536
+    code = index = 0
+    for length in range(1, 17):
+        for _ in range(counts[length - 1]):
+            span = 1 << (16 - length)
+            table[code * span : (code + 1) * span] = [(symbols[index] >> 4, symbols[index] & 15, length)] * span
+            code += 1
+            index += 1
+        code <<= 1
+    return table
+
+
+def _scale_weights(scale: int) -> list[list[float]]:
+    # weights[u][i]: mean over output cell i (8 // scale source pixels) of the 1-D IDCT basis u, so a
+    # block's cell averages are sum(F[v][u] * weights[v][i] * weights[u][j]).
+    cell = 8 // scale
+    return [
+        [
+            (math.sqrt(0.5) if u == 0 else 1.0)
+            / 2
+            * sum(math.cos((2 * x + 1) * u * math.pi / 16) for x in range(i * cell, (i + 1) * cell))
+            / cell
+            for i in range(scale)
+        ]
+        for u in range(8)
+    ]
+
+
+def decode_jpeg(data: bytes, max_edge: int | None = None) -> tuple[int, int, int, bytes]:
+    quant = {}
+    dc_tables = {}
+    ac_tables = {}
+    restart_interval = 0
+    adobe_transform = None
+    frame = None
+    planes = None
+    pos = 2
+    while pos < len(data):
+        if data[pos] != 0xFF:
+            raise UnsupportedImage("corrupt JPEG marker stream")
+        marker = data[pos + 1]
+        pos += 2
+        if marker == 0xFF:
+            pos -= 1
+            continue
+        if marker == 0xD9:
+            break
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            continue
+        length = struct.unpack(">H", data[pos : pos + 2])[0]
+        body = data[pos + 2 : pos + length]
+        pos += length
+        if marker == 0xDB:
+            i = 0
+            while i < len(body):
+                precision, table_id = body[i] >> 4, body[i] & 15
+                size = 128 if precision else 64
+                values = body[i + 1 : i + 1 + size]
+                quant[table_id] = (
+                    struct.unpack(">64H", values) if precision else tuple(values)
+                )
+                i += 1 + size
+        elif marker == 0xC4:
+            i = 0
+            while i < len(body):
+                table_class, table_id = body[i] >> 4, body[i] & 15
+                counts = body[i + 1 : i + 17]
+                total = sum(counts)
+                table = _huffman_table(counts, body[i + 17 : i + 17 + total])
+                (ac_tables if table_class else dc_tables)[table_id] = table
+                i += 17 + total
+        elif marker == 0xDD:
+            restart_interval = struct.unpack(">H", body[:2])[0]
+        elif marker == 0xEE and body[:5] == b"Adobe":
+            adobe_transform = body[11]
+        elif marker in (0xC0, 0xC1):
+            precision, height, width, count = struct.unpack(">BHHB", body[:6])
+            if precision != 8:
+                raise UnsupportedImage(f"{precision}-bit JPEG is not supported")
+            if count not in (1, 3):
+                raise UnsupportedImage(f"JPEG with {count} components is not supported")
+            components = [
+                {"id": body[6 + i * 3], "h": body[7 + i * 3] >> 4, "v": body[7 + i * 3] & 15, "q": body[8 + i * 3]}
+                for i in range(count)
+            ]
+            hmax = max(c["h"] for c in components)
+            vmax = max(c["v"] for c in components)
+            mcus_x = -(-width // (8 * hmax))
+            mcus_y = -(-height // (8 * vmax))
+            # Smallest number of output pixels per block edge whose image still reaches max_edge.
+            scale = 8
+            if max_edge:
+                scale = next(s for s in (1, 2, 4, 8) if s == 8 or -(-max(width, height) * s // 8) >= max_edge)
+            weights = _scale_weights(scale)
+            for c in components:
+                c["blocks_x"] = mcus_x * c["h"]
+                c["blocks_y"] = mcus_y * c["v"]
+                c["plane"] = bytearray(c["blocks_x"] * scale * c["blocks_y"] * scale)
+            frame = (width, height, components, hmax, vmax, mcus_x, mcus_y, scale, weights)
+        elif 0xC2 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            raise UnsupportedImage("only baseline JPEG is supported (this one is progressive or lossless)")
+        elif marker == 0xDA:
+            if frame is None:
+                raise UnsupportedImage("JPEG scan before frame header")
+            count = body[0]
+            by_id = {c["id"]: c for c in frame[2]}
+            scan = []
+            for i in range(count):
+                c = by_id[body[1 + i * 2]]
+                tables = body[2 + i * 2]
+                scan.append((c, dc_tables[tables >> 4], ac_tables[tables & 15]))
+            end = pos
+            while True:
+                end = data.find(b"\xff", end)
+                if end < 0 or end + 1 >= len(data):
+                    end = len(data)
+                    break
+                following = data[end + 1]
+                if following == 0 or 0xD0 <= following <= 0xD7:
+                    end += 2
+                    continue
+                break
+            try:
+                _decode_scan(data[pos:end], frame, scan, quant, restart_interval)
+            except (TypeError, ValueError):
+                # A None lookup entry (bits that start no Huffman code) or a read past the data.
+                raise UnsupportedImage("corrupt JPEG entropy data") from None
+            pos = end
+            planes = frame
+    if planes is None:
+        raise UnsupportedImage("JPEG has no image data")
+    return _assemble_jpeg(planes, adobe_transform)
+
+
+def _decode_scan(entropy: bytes, frame: tuple, scan: list, quant: dict, restart_interval: int) -> None:
+    width, height, components, hmax, vmax, mcus_x, mcus_y, scale, weights = frame
+    cells = scale * scale
+    # Per component: which zigzag coefficients can change a cell average at this scale, and per cell
+    # the weight of each coefficient, pre-multiplied by its quantizer.
+    block_weights = []
+    for c, _, _ in scan:
+        q = quant[c["q"]]
+        cell_weights = []
+        for i in range(scale):
+            for j in range(scale):
+                cell_weights.append(
+                    [q[k] * weights[natural // 8][i] * weights[natural % 8][j] for k, natural in enumerate(JPEG_ZIGZAG)]
+                )
+        needed = [any(abs(cell[k]) > 1e-9 for cell in cell_weights) for k in range(64)]
+        block_weights.append((needed, [cell[0] for cell in cell_weights], cell_weights))
+
+    if len(scan) == 1:
+        c = scan[0][0]
+        # A single-component scan covers only that component's own pixels, without MCU padding.
+        cols = -(-(-(-width * c["h"] // hmax)) // 8)
+        rows = -(-(-(-height * c["v"] // vmax)) // 8)
+        blocks = [[(0, x, y)] for y in range(rows) for x in range(cols)]
+    else:
+        blocks = [
+            [(n, mx * c["h"] + bx, my * c["v"] + by) for n, (c, _, _) in enumerate(scan) for by in range(c["v"]) for bx in range(c["h"])]
+            for my in range(mcus_y)
+            for mx in range(mcus_x)
+        ]
+
+    # Restart markers split the scan into intervals that each reset the DC predictors.
+    segments = [entropy]
+    for marker in range(0xD0, 0xD8):
+        segments = [part for segment in segments for part in segment.split(bytes((0xFF, marker)))]
+    per_segment = restart_interval or len(blocks)
+
+    for index, segment in enumerate(segments):
+        units = blocks[index * per_segment : (index + 1) * per_segment]
+        if not units:
+            break
+        data = segment.replace(b"\xff\x00", b"\xff") + b"\0" * 8
+        pos = acc = nbits = 0
+        predictors = [0] * len(scan)
+        for unit in units:
+            for n, bx, by in unit:
+                c, dc_table, ac_table = scan[n]
+                needed, dc_weights, cell_weights = block_weights[n]
+                # 32 fresh bits cover any code (<= 16) plus its value bits (<= 15).
+                if nbits < 32:
+                    acc = ((acc & MASKS[nbits]) << 32) | UINT32.unpack_from(data, pos)[0]
+                    pos += 4
+                    nbits += 32
+                _, size, length = dc_table[(acc >> (nbits - 16)) & 0xFFFF]
+                nbits -= length + size
+                if size:
+                    value = (acc >> nbits) & MASKS[size]
+                    predictors[n] += value if value >> (size - 1) else value - MASKS[size]
+                coefficients = None
+                k = 1
+                while k < 64:
+                    if nbits < 32:
+                        acc = ((acc & MASKS[nbits]) << 32) | UINT32.unpack_from(data, pos)[0]
+                        pos += 4
+                        nbits += 32
+                    run, size, length = ac_table[(acc >> (nbits - 16)) & 0xFFFF]
+                    nbits -= length + size
+                    if not size:
+                        if run != 15:
+                            break
+                        k += 16
+                        continue
+                    k += run
+                    if k < 64 and needed[k]:
+                        value = (acc >> nbits) & MASKS[size]
+                        if coefficients is None:
+                            coefficients = [0] * 64
+                        coefficients[k] = value if value >> (size - 1) else value - MASKS[size]
+                    k += 1
+                if coefficients is None:
+                    cells_out = [128.0 + predictors[n] * w for w in dc_weights]
+                else:
+                    coefficients[0] = predictors[n]
+                    cells_out = [128.0 + sum(map(mul, coefficients, weights)) for weights in cell_weights]
+                plane = c["plane"]
+                plane_width = c["blocks_x"] * scale
+                for i in range(scale):
+                    start = (by * scale + i) * plane_width + bx * scale
+                    plane[start : start + scale] = bytes(
+                        0 if v < 0 else 255 if v > 254.5 else int(v + 0.5) for v in cells_out[i * scale : (i + 1) * scale]
+                    )
+
+
+def _assemble_jpeg(frame: tuple, adobe_transform: int | None) -> tuple[int, int, int, bytes]:
+    width, height, components, hmax, vmax, _, _, scale, _ = frame
+    out_width = -(-width * scale // 8)
+    out_height = -(-height * scale // 8)
+    rows = []
+    columns = [[x * c["h"] // hmax for x in range(out_width)] for c in components]
+    for y in range(out_height):
+        samples = []
+        for c, xs in zip(components, columns):
+            plane_width = c["blocks_x"] * scale
+            start = (y * c["v"] // vmax) * plane_width
+            row = c["plane"][start : start + plane_width]
+            samples.append(row[:out_width] if c["h"] == hmax else bytes(row[x] for x in xs))
+        rows.append(samples)
+    if len(components) == 1:
+        return out_width, out_height, 1, b"".join(samples[0] for samples in rows)
+    if adobe_transform == 0:
+        # Adobe RGB JPEG: the components are already R, G and B.
+        return out_width, out_height, 3, b"".join(
+            bytes(v for pixel in zip(*samples) for v in pixel) for samples in rows
+        )
+    # JFIF YCbCr -> RGB in fixed point, as libjpeg does.
+    clamp = bytes(0 if v < 0 else 255 if v > 255 else v for v in range(-384, 640))
+    cr_r = [(91881 * (v - 128) + 32768) >> 16 for v in range(256)]
+    cb_b = [(116130 * (v - 128) + 32768) >> 16 for v in range(256)]
+    cbcr_g = [[(-22554 * (cb - 128) - 46802 * (cr - 128) + 32768) >> 16 for cr in range(256)] for cb in range(256)]
+    out = bytearray()
+    for luma, cb_row, cr_row in rows:
+        for lum, cb, cr in zip(luma, cb_row, cr_row):
+            lum += 384
+            out += bytes((clamp[lum + cr_r[cr]], clamp[lum + cbcr_g[cb][cr]], clamp[lum + cb_b[cb]]))
+    return out_width, out_height, 3, bytes(out)
+
+
+def downscale(width: int, height: int, channels: int, pixels: bytes, max_edge: int) -> tuple[int, int, int, bytes]:
+    # Box filter to fit within max_edge x max_edge, keeping the aspect ratio; never upscales.
+    ratio = min(1.0, max_edge / max(width, height))
+    return resize(width, height, channels, pixels, max(1, round(width * ratio)), max(1, round(height * ratio)))
+
+
+def resize(
+    width: int, height: int, channels: int, pixels: bytes, out_width: int, out_height: int
+) -> tuple[int, int, int, bytes]:
+    # Box filter to exactly out_width x out_height (each output pixel averages at least one source pixel).
+    if (out_width, out_height) == (width, height):
+        return width, height, channels, pixels
+    stride = width * channels
+    x_bounds = [
+        (x * width // out_width * channels, max((x + 1) * width // out_width, x * width // out_width + 1) * channels)
+        for x in range(out_width)
+    ]
+    out = bytearray()
+    for y in range(out_height):
+        y0 = y * height // out_height
+        y1 = max((y + 1) * height // out_height, y0 + 1)
+        sums = [0] * (out_width * channels)
+        for source_y in range(y0, y1):
+            row = pixels[source_y * stride : (source_y + 1) * stride]
+            i = 0
+            for x0, x1 in x_bounds:
+                for channel in range(channels):
+                    sums[i] += sum(row[x0 + channel : x1 : channels])
+                    i += 1
+        i = 0
+        for x0, x1 in x_bounds:
+            area = (x1 - x0) // channels * (y1 - y0)
+            for _ in range(channels):
+                out.append((sums[i] + area // 2) // area)
+                i += 1
+    return out_width, out_height, channels, bytes(out)
+
+
+def _png_chunk(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+
+def encode_png(width: int, height: int, channels: int, pixels: bytes) -> bytes:
+    # 8-bit PNG; every row after the first uses the Up filter, which _sub_bytes does a row at a time.
+    stride = width * channels
+    rows = [b"\0" + pixels[:stride]]
+    for y in range(1, height):
+        rows.append(b"\2" + _sub_bytes(pixels[y * stride : (y + 1) * stride], pixels[(y - 1) * stride : y * stride]))
+    header = struct.pack(">IIBBBBB", width, height, 8, PNG_COLOR_TYPES[channels], 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(b"".join(rows), 9))
+        + _png_chunk(b"IEND", b"")
+    )
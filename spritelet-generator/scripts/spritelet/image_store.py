@@ -0,0 +1,192 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+from .image_derivatives import image_dimensions, read_image, resize, variants_dir_rel
+from .store_utils import resolve_store_path
+
+# With "image_store": {"layout": "content"} every state image is stored once, under its digest:
+#   states/objects/<sha256[:2]>/<sha256>.<png|jpg>   immutable image bytes
+#   states/<simple-name>.png                          alias: a hard link to the object
+# Catalog entries, signals and UIs keep using the alias path, so readers need no changes; identical
+# images published or registered under several names share one object.
+IMAGE_LAYOUTS = ("names", "content")
+DEFAULT_NEAR_DUPLICATE_DISTANCE = 6
+OBJECT_SUFFIXES = {"png": ".png", "jpeg": ".jpg"}
+METADATA_FIELDS = ("sha256", "bytes", "format", "width", "height", "perceptual_hash")
+# Digests by (inode, size, mtime_ns) and perceptual hashes by digest, for images this process already
+# read, so the catalog commit after a generation does not hash the image again and a tool decodes
+# each distinct image once.
+_digests: dict[tuple[int, int, int], str] = {}
+_perceptual_hashes: dict[str, str] = {}
+
+
+def image_store_settings(profile: dict) -> dict:
+    # spritelet.json "image_store": {"layout", "perceptual_hash", "near_duplicate_distance"}
+    settings = profile.get("image_store", {})
+    layout = settings.get("layout", "names")
+    if layout not in IMAGE_LAYOUTS:
+        raise SystemExit(f"image_store.layout must be one of {', '.join(IMAGE_LAYOUTS)}, not {layout!r}")
+    return {
+        "layout": layout,
+        "perceptual_hash": bool(settings.get("perceptual_hash", False)),
+        "near_duplicate_distance": int(settings.get("near_duplicate_distance", DEFAULT_NEAR_DUPLICATE_DISTANCE)),
+    }
+
+
+def object_rel(sha256: str, fmt: str | None) -> str:
+    return f"states/objects/{sha256[:2]}/{sha256}{OBJECT_SUFFIXES.get(fmt, '')}"
+
+
+def _file_key(path: Path) -> tuple[int, int, int]:
+    st = path.stat()
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def file_sha256(path: Path) -> str:
+    key = _file_key(path)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    # Filesystems without hard links get a copy: the alias stays correct, only the dedup is lost.
+    # Never a symlink, since writers resolve spritelet_path and would then replace the object itself.
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _carry_variants(root: Path, spritelet_path: str, before: int, after: int) -> None:
+    # An alias relinked to its object takes the object's mtime. Variants that were current for the
+    # old file show the same bytes, so they move up to the new mtime; stale ones that the older
+    # mtime would pass off as current are removed.
+    out_dir = root / variants_dir_rel(spritelet_path)
+    if not out_dir.is_dir():
+        return
+    for variant in out_dir.glob("*.png"):
+        mtime = variant.stat().st_mtime_ns
+        if before <= mtime < after:
+            os.utime(variant, ns=(after, after))
+        elif after <= mtime < before:
+            variant.unlink()
+
+
+def ingest_image(root: Path, spritelet_path: str) -> tuple[str, bool]:
+    # Stores the image at spritelet_path as its object (or drops it for an existing identical one)
+    # and leaves spritelet_path as a hard link to the object; returns the digest and whether the
+    # object already existed. The alias is swapped in by rename, so readers of spritelet_path always
+    # see a whole image.
+    path = resolve_store_path(root, spritelet_path)
+    sha256 = file_sha256(path)
+    dimensions = image_dimensions(path)
+    target = root / object_rel(sha256, dimensions[0] if dimensions else None)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    if target.exists():
+        if not os.path.samefile(target, path):
+            before = path.stat().st_mtime_ns
+            _link_or_copy(target, tmp)
+            os.replace(tmp, path)
+            _digests[_file_key(path)] = sha256
+            _carry_variants(root, spritelet_path, before, path.stat().st_mtime_ns)
+        return sha256, True
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Staged beside the aliases, where orphaned temp files are cleaned up, then renamed into place.
+    _link_or_copy(path, tmp)
+    os.replace(tmp, target)
+    return sha256, False
+
+
+def perceptual_hash(root: Path, spritelet_path: str) -> str:
+    # 64-bit difference hash as 16 hex digits: one bit per horizontally adjacent pair in a 9x8
+    # greyscale thumbnail, set where brightness rises. Re-encodes and small edits of an image land
+    # within a few bits; unrelated images differ in about half. Always taken from the image itself
+    # (JPEGs at their cheapest decode scale), so the same bytes hash the same in every process.
+    path = resolve_store_path(root, spritelet_path)
+    sha256 = file_sha256(path)
+    if sha256 not in _perceptual_hashes:
+        width, height, channels, pixels = resize(*read_image(path, 9), 9, 8)
+        if channels >= 3:
+            grey = [
+                (r * 299 + g * 587 + b * 114) // 1000
+                for r, g, b in zip(pixels[::channels], pixels[1::channels], pixels[2::channels])
+            ]
+        else:
+            grey = list(pixels[::channels])
+        bits = 0
+        for y in range(8):
+            for x in range(8):
+                bits = bits << 1 | (grey[y * 9 + x] < grey[y * 9 + x + 1])
+        _perceptual_hashes[sha256] = f"{bits:016x}"
+    return _perceptual_hashes[sha256]
+
+
+def image_metadata(root: Path, spritelet_path: str, previous: dict | None = None, unchanged: bool = False) -> dict:
+    # Digest, size, format and dimensions (from the PNG IHDR or JPEG frame header, without decoding)
+    # for a catalog entry, plus the perceptual hash when one was computed. With unchanged, the caller
+    # knows previous describes this same image (a reused publish) and its fields are kept as they are.
+    if unchanged and previous and previous.get("sha256"):
+        return {field: previous[field] for field in METADATA_FIELDS if field in previous}
+    path = resolve_store_path(root, spritelet_path)
+    try:
+        size = path.stat().st_size
+        sha256 = file_sha256(path)
+        dimensions = image_dimensions(path)
+    except FileNotFoundError:
+        return {}
+    metadata = {"sha256": sha256, "bytes": size}
+    if dimensions:
+        metadata.update(format=dimensions[0], width=dimensions[1], height=dimensions[2])
+    if sha256 in _perceptual_hashes:
+        metadata["perceptual_hash"] = _perceptual_hashes[sha256]
+    elif previous and previous.get("sha256") == sha256 and previous.get("perceptual_hash"):
+        metadata["perceptual_hash"] = previous["perceptual_hash"]
+    return metadata
+
+
+def hash_distance(a: str, b: str) -> int:
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def near_duplicates(states: dict[str, dict], key: str, phash: str, distance: int, limit: int = 5) -> list[dict]:
+    # Other states whose perceptual hash is within distance bits of phash, closest first.
+    found = [
+        {"simple_name": other, "distance": hash_distance(phash, state["perceptual_hash"])}
+        for other, state in states.items()
+        if other != key and state.get("perceptual_hash")
+    ]
+    found = [match for match in found if match["distance"] <= distance]
+    found.sort(key=lambda match: (match["distance"], match["simple_name"]))
+    return found[:limit]
+
+
+def near_duplicate_pairs(hashes: dict[str, str], distance: int) -> list[dict]:
+    # Every pair within distance bits. Two hashes that close agree exactly on at least one of
+    # distance + 1 bands of bits (pigeonhole), so only names sharing a band are compared.
+    bands = distance + 1
+    edges = [64 * i // bands for i in range(bands + 1)]
+    values = {name: int(phash, 16) for name, phash in hashes.items()}
+    buckets: dict[tuple[int, int], list[str]] = {}
+    for name, value in values.items():
+        for band in range(bands):
+            part = (value >> edges[band]) & ((1 << (edges[band + 1] - edges[band])) - 1)
+            buckets.setdefault((band, part), []).append(name)
+    pairs = {}
+    for names in buckets.values():
+        for i, a in enumerate(names):
+            for b in names[i + 1 :]:
+                pair = (a, b) if a < b else (b, a)
+                if pair not in pairs:
+                    pairs[pair] = (values[a] ^ values[b]).bit_count()
+    return sorted(
+        ({"simple_names": list(pair), "distance": bits} for pair, bits in pairs.items() if bits <= distance),
+        key=lambda match: (match["distance"], match["simple_names"]),
+    )
@@ -0,0 +1,55 @@
+import argparse
+from pathlib import Path
+
+from .catalog_backend import CATALOG_BACKENDS, create_empty_catalog, detect_catalog_backend
+from .event_log import EventLog
+from .signal_writer import write_current
+from .store_utils import atomic_write_json, store_lock, utc_now
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Initialize a Spritelet state store")
+    parser.add_argument("--root", required=True, help="Spritelet identity root directory")
+    parser.add_argument("--base-image", default="assets/base.png", help="Path to base reference image")
+    parser.add_argument(
+        "--catalog-backend",
+        choices=CATALOG_BACKENDS,
+        help="Catalog storage: json (states/catalog.json, default) or sqlite (states/catalog.sqlite) for large catalogs; "
+        "re-initializing keeps the store's current backend unless set",
+    )
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    (root / "states").mkdir(parents=True, exist_ok=True)
+    (root / "signals").mkdir(parents=True, exist_ok=True)
+    base_image_path = Path(args.base_image)
+    if not base_image_path.is_absolute():
+        (root / base_image_path).parent.mkdir(parents=True, exist_ok=True)
+
+    with store_lock(root):
+        profile = {
+            "base_image_path": args.base_image,
+            "prompt_style": "cute animal mascot, clean lines, expressive face",
+            "created_at": utc_now(),
+        }
+        atomic_write_json(root / "spritelet.json", profile)
+
+        current = {
+            "spritelet_path": "",
+            "updated_at": utc_now(),
+        }
+        write_current(root, current)
+        create_empty_catalog(root, args.catalog_backend or detect_catalog_backend(root) or "json")
+        event_line = {
+            "type": "state_initialized",
+            "spritelet_path": current["spritelet_path"],
+            "updated_at": current["updated_at"],
+        }
+        EventLog(root, profile).append([event_line])
+
+    print(f"Initialized Spritelet store at {root}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
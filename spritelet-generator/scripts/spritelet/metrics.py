@@ -0,0 +1,231 @@
+import atexit
+import fcntl
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+
+# SPRITELET_METRICS: comma list of "file" (merge into .cache/metrics.json and .cache/metrics.prom) and
+# "events" (add per-stage "timings" to publish results and events); "1" or "all" enables both.
+# When unset, span() hands back one shared no-op context and nothing else runs.
+MODES = {mode.strip() for mode in os.environ.get("SPRITELET_METRICS", "").split(",") if mode.strip()}
+if MODES & {"1", "all", "true"}:
+    MODES = {"file", "events"}
+ENABLED = bool(MODES)
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# metric -> (label name, help text)
+METRICS = {
+    "spritelet_stage_seconds": ("stage", "Time spent in each publish/tool stage"),
+    "spritelet_operation_seconds": ("operation", "End-to-end time of each script operation"),
+    "spritelet_lock_wait_seconds": ("lock", "Time spent waiting for store, in-flight and rate limit locks"),
+    "spritelet_publishes_total": ("outcome", "Published states by outcome"),
+    "spritelet_generations_total": ("result", "Image generation requests by result"),
+    "spritelet_lock_timeouts_total": ("lock", "Lock acquisitions abandoned after their timeout"),
+    "spritelet_signal_events_total": ("outcome", "Debounced signals shown, superseded in their window, or overridden by a newer commit"),
+    "spritelet_derivatives_total": ("outcome", "State images given resized variants, or skipped as undecodable"),
+    "spritelet_image_objects_total": ("outcome", "Images stored as new content objects, or deduplicated against an existing one"),
+}
+
+_NULL_SPAN = nullcontext()
+_lock = threading.Lock()
+# root -> metric -> label -> {"buckets": [...], "sum": float, "count": int}; pending until that
+# root's next flush. Samples belong to the root of the operation they were recorded in, else to the
+# root of the latest operation (worker threads without its context), else to None until one starts.
+_histograms: dict[Path | None, dict[str, dict[str, dict]]] = {}
+_counters: dict[Path | None, dict[str, dict[str, float]]] = {}
+_flush_root: Path | None = None
+_current: ContextVar[dict | None] = ContextVar("spritelet_timings", default=None)
+_current_root: ContextVar[Path | None] = ContextVar("spritelet_root", default=None)
+
+
+def _sample_root() -> Path | None:
+    return _current_root.get() or _flush_root
+
+
+def observe(metric: str, label: str, seconds: float) -> None:
+    if not ENABLED:
+        return
+    with _lock:
+        series = _histograms.setdefault(_sample_root(), {}).setdefault(metric, {}).setdefault(
+            label, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        )
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series["buckets"][i] += 1
+        series["sum"] += seconds
+        series["count"] += 1
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    if not ENABLED:
+        return
+    observe("spritelet_stage_seconds", stage, seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def lock_wait(lock: str, seconds: float) -> None:
+    if not ENABLED:
+        return
+    observe("spritelet_lock_wait_seconds", lock, seconds)
+    timings = _current.get()
+    if timings is not None:
+        key = f"{lock}_lock_wait"
+        timings[key] = timings.get(key, 0.0) + seconds
+
+
+def count(metric: str, label: str, amount: float = 1) -> None:
+    if not ENABLED:
+        return
+    with _lock:
+        series = _counters.setdefault(_sample_root(), {}).setdefault(metric, {})
+        series[label] = series.get(label, 0) + amount
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        record_stage(self.stage, time.perf_counter() - self.started)
+
+
+def span(stage: str):
+    return _Span(stage) if ENABLED else _NULL_SPAN
+
+
+@contextmanager
+def operation(root: Path, kind: str):
+    # One script-level operation (publish, register, ...). Yields the stage timings dict it collects,
+    # or None when metrics are off, and flushes to the root's metrics files when it ends.
+    global _flush_root
+    if not ENABLED:
+        yield None
+        return
+    _flush_root = root
+    timings: dict[str, float] = {}
+    token = _current.set(timings)
+    root_token = _current_root.set(root)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        elapsed = time.perf_counter() - started
+        observe("spritelet_operation_seconds", kind, elapsed)
+        _current.reset(token)
+        _current_root.reset(root_token)
+        timings["total"] = elapsed
+        flush(root)
+
+
+def timed_operation(kind: str):
+    # Decorator form of operation() for functions whose first argument is the identity root.
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(root: Path, *args, **kwargs):
+            with operation(root, kind):
+                return function(root, *args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def event_timings() -> dict:
+    # The current operation's stage timings as fields for an event or result; empty unless "events" is on.
+    timings = _current.get()
+    if timings is None or "events" not in MODES:
+        return {}
+    return {"timings": {stage: round(seconds, 6) for stage, seconds in timings.items()}}
+
+
+def metrics_paths(root: Path) -> tuple[Path, Path]:
+    return root / ".cache" / "metrics.json", root / ".cache" / "metrics.prom"
+
+
+def _merge(histograms: dict, counters: dict, more_histograms: dict, more_counters: dict) -> None:
+    for metric, series in more_histograms.items():
+        stored = histograms.setdefault(metric, {})
+        for label, sample in series.items():
+            total = stored.setdefault(label, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], sample["buckets"])]
+            total["sum"] += sample["sum"]
+            total["count"] += sample["count"]
+    for metric, series in more_counters.items():
+        stored = counters.setdefault(metric, {})
+        for label, amount in series.items():
+            stored[label] = stored.get(label, 0) + amount
+
+
+def flush(root: Path) -> None:
+    # Merges this process's pending samples for root into the shared totals under a dedicated lock
+    # (not store.lock, so metrics never queue behind publishes) and rewrites the Prometheus text file.
+    # Samples recorded before any operation named a root go to the first root flushed.
+    if "file" not in MODES:
+        return
+    with _lock:
+        histograms, counters = _histograms.pop(root, {}), _counters.pop(root, {})
+        _merge(histograms, counters, _histograms.pop(None, {}), _counters.pop(None, {}))
+    if not histograms and not counters:
+        return
+    from .store_utils import atomic_write_json, load_json
+
+    json_path, prom_path = metrics_paths(root)
+    lock_dir = root / ".locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with (lock_dir / "metrics.lock").open("w", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        data = load_json(json_path, {})
+        if data.get("buckets") != list(BUCKETS):
+            data = {"buckets": list(BUCKETS), "histograms": {}, "counters": {}}
+        _merge(data["histograms"], data["counters"], histograms, counters)
+        atomic_write_json(json_path, data)
+        tmp_path = prom_path.with_suffix(".prom.tmp")
+        tmp_path.write_text(render(data), encoding="utf-8")
+        os.replace(tmp_path, prom_path)
+
+
+def render(data: dict) -> str:
+    lines = []
+    for metric, series in sorted(data.get("histograms", {}).items()):
+        label_name, help_text = METRICS.get(metric, ("label", metric))
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for label, sample in sorted(series.items()):
+            for bound, bucket_count in zip(data["buckets"], sample["buckets"]):
+                lines.append(f'{metric}_bucket{{{label_name}="{label}",le="{bound:g}"}} {bucket_count}')
+            lines.append(f'{metric}_bucket{{{label_name}="{label}",le="+Inf"}} {sample["count"]}')
+            lines.append(f'{metric}_sum{{{label_name}="{label}"}} {sample["sum"]:.6f}')
+            lines.append(f'{metric}_count{{{label_name}="{label}"}} {sample["count"]}')
+    for metric, series in sorted(data.get("counters", {}).items()):
+        label_name, help_text = METRICS.get(metric, ("label", metric))
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for label, amount in sorted(series.items()):
+            lines.append(f'{metric}{{{label_name}="{label}"}} {amount:g}')
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def metrics_text(root: Path) -> str:
+    from .store_utils import load_json
+
+    return render(load_json(metrics_paths(root)[0], {}))
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    # Samples recorded outside an operation (worker threads finishing late) still reach the file.
+    if ENABLED:
+        roots = {*_histograms, *_counters} - {None}
+        for root in roots or ([_flush_root] if _flush_root else []):
+            flush(root)
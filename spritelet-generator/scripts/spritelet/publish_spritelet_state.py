@@ -0,0 +1,585 @@
+import argparse
+import json
+import os
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .catalog_backend import JsonCatalog, SqliteCatalog, open_catalog
+from .daemon_client import daemon_request
+from .event_log import EventLog
+from .image_derivatives import UnsupportedImage, build_derivatives, derivative_settings, describe_variants
+from .image_store import file_sha256, image_metadata, image_store_settings, ingest_image, near_duplicates, perceptual_hash
+from .metrics import count, event_timings, operation, span, timed_operation
+from .rate_limit import ON_LIMIT_MODES, RateLimited, generation_limiter, rate_limit_settings
+from .request_payload import build_generation_request
+from .signal_writer import commit_signal, signal_settings
+from .similarity_index import similar_states
+from .store_flow import Call, GenerateImage, LockInflight, LockStore, TakeGenerationSlot, run_async, run_sync
+from .store_utils import (
+    JsonCache,
+    content_hash,
+    load_json,
+    normalize_simple_name,
+    resolve_store_path,
+    utc_now,
+)
+
+DEFAULT_MODEL = "models/gemini-3-pro-image-preview"
+DEFAULT_ENDPOINT = "https://generativelanguage.googleapis.com/v1beta/{model}:generateContent"
+DEFAULT_API_KEY_ENV = "SPRITELET_GOOGLE_API_KEY"
+
+
+def resolve_catalog_state(catalog: JsonCatalog | SqliteCatalog, simple_name: str) -> tuple[str, dict | None]:
+    key = normalize_simple_name(simple_name)
+    return key, catalog.get(key)
+
+
+def build_prompt(profile: dict, simple_name: str, description: str) -> str:
+    return (
+        "Use the provided reference image as identity lock for this mascot. "
+        f"State name: {simple_name}. "
+        f"State description: {description}. "
+        f"Style: {profile.get('prompt_style', '')}. "
+        "Choose a background that best supports the state description and emotion."
+    )
+
+
+def parse_utc_timestamp(value: str) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
+    except ValueError:
+        return None
+
+
+def should_reuse_state(base_image: Path, state: dict, base_image_sha256: str | None = None) -> bool:
+    recorded = state.get("base_image_sha256")
+    if recorded and base_image_sha256:
+        return recorded == base_image_sha256
+    # Entries written before base image hashes were recorded fall back to the mtime check;
+    # they gain a hash the next time they are published.
+    state_created_at = parse_utc_timestamp(state.get("created_at", ""))
+    if state_created_at is None:
+        return False
+    base_mtime = datetime.fromtimestamp(base_image.stat().st_mtime, tz=timezone.utc)
+    return base_mtime <= state_created_at
+
+
+def load_profile(root: Path, cache: JsonCache | None = None) -> tuple[dict, Path]:
+    profile = load_json(root / "spritelet.json", {}, cache)
+    if not profile:
+        raise SystemExit("Missing spritelet.json; run init_spritelet_store.py first")
+
+    base_image = Path(profile["base_image_path"])
+    if not base_image.is_absolute():
+        base_image = (root / base_image).resolve()
+    if not base_image.exists():
+        raise SystemExit(f"Base image not found: {base_image}")
+    return profile, base_image
+
+
+def resolve_api_key(api_key: str | None, api_key_env: str) -> str:
+    if not api_key:
+        api_key = os.environ.get(api_key_env, "")
+    if not api_key:
+        raise SystemExit(f"Missing API key env var: {api_key_env}")
+    return api_key
+
+
+def plan_state(
+    root: Path,
+    base_image: Path,
+    state: dict | None,
+    force_generate: bool,
+    base_image_sha256: str | None = None,
+) -> bool:
+    # Returns True when the existing catalog entry can be republished without generation.
+    if not state or force_generate:
+        return False
+    if not resolve_store_path(root, state["spritelet_path"]).exists():
+        raise SystemExit(f"Catalog points to missing file: {state['spritelet_path']}")
+    return should_reuse_state(base_image, state, base_image_sha256)
+
+
+def generate_state_flow(
+    root: Path,
+    profile: dict,
+    base_image: Path,
+    simple_name: str,
+    description: str,
+    state: dict | None,
+    api_key: str,
+    model: str = DEFAULT_MODEL,
+    endpoint: str = DEFAULT_ENDPOINT,
+    aspect_ratio: str = "1:1",
+    image_size: str = "1K",
+    on_limit: str | None = None,
+):
+    # Shared with every process using this root (or this API key), so a slot is taken before any request work.
+    limiter = generation_limiter(root, profile, api_key)
+    if limiter:
+        yield TakeGenerationSlot(limiter, on_limit)
+    prompt = build_prompt(profile, simple_name, description)
+    # The base64 base image and the JSON around it come pre-serialized from the payload cache,
+    # keyed by the base image content hash, so only the prompt is encoded per request. In upload
+    # mode a cache miss transfers the base image, so this is a step rather than an inline call.
+    with span("request_build"):
+        request_payload = yield Call(
+            build_generation_request,
+            root,
+            profile,
+            base_image,
+            prompt,
+            model,
+            {
+                "response_modalities": ["IMAGE"],
+                "image_config": {
+                    "aspect_ratio": aspect_ratio,
+                    "image_size": image_size,
+                },
+            },
+            api_key=api_key,
+        )
+
+    if state:
+        # Existing state path is overwritten for stale regeneration and force regeneration.
+        out_rel = state["spritelet_path"]
+        out_abs = resolve_store_path(root, out_rel)
+    else:
+        target_name = normalize_simple_name(simple_name)
+        out_rel = f"states/{target_name}.png"
+        out_abs = resolve_store_path(root, out_rel)
+        if out_abs.exists():
+            out_rel = f"states/{target_name}-{utc_now().replace(':', '').replace('-', '')}.png"
+            out_abs = resolve_store_path(root, out_rel)
+    # The image is decoded from the response stream into a temp file and renamed into place,
+    # so readers of an existing state path never see a partial file.
+    yield GenerateImage(model, api_key, endpoint, request_payload, out_abs, limiter, on_limit)
+    if limiter:
+        yield Call(limiter.record_image)
+    # Digest the image here, outside the store lock; the catalog commit picks it up from
+    # image_store's per-process memo. Perceptual hashes need a decode, so they wait for describe_images_flow.
+    images = image_store_settings(profile)
+    with span("digest"):
+        if images["layout"] == "content":
+            _, existed = yield Call(ingest_image, root, out_rel)
+            count("spritelet_image_objects_total", "deduplicated" if existed else "stored")
+        else:
+            yield Call(file_sha256, out_abs)
+    return out_rel
+
+
+def generate_state_image(*args, **kwargs) -> str:
+    return run_sync(generate_state_flow(*args, **kwargs))
+
+
+def upsert_catalog_entries(
+    catalog: JsonCatalog | SqliteCatalog,
+    entries: list[dict],
+    now: str,
+    base_image_sha256: str | None = None,
+) -> None:
+    # Caller must hold store_lock. Each entry carries simple_name, spritelet_path, description and reused.
+    # Every committed entry is current for the base image it was checked or generated against.
+    rows = []
+    for entry in entries:
+        key = entry["simple_name"]
+        existing = catalog.get(key) or {}
+        existing_created_at = existing.get("created_at")
+        created_at = existing_created_at if entry["reused"] and existing_created_at else now
+        row = {
+            "simple_name": key,
+            "spritelet_path": entry["spritelet_path"],
+            "created_at": created_at,
+            "description": entry["description"],
+        }
+        if base_image_sha256:
+            row["base_image_sha256"] = base_image_sha256
+        # A reused entry keeps its recorded digest and dimensions instead of re-reading the image.
+        unchanged = entry["reused"] and existing.get("spritelet_path") == entry["spritelet_path"]
+        row.update(image_metadata(catalog.root, entry["spritelet_path"], existing, unchanged))
+        variants = describe_variants(catalog.root, entry["spritelet_path"])
+        if variants:
+            row["variants"] = variants
+        rows.append(row)
+    catalog.upsert(rows)
+
+
+def describe_images_flow(root: Path, profile: dict, catalog: JsonCatalog | SqliteCatalog, entries: list[dict]):
+    # Builds the resized variants and perceptual hash of newly committed images and records them in
+    # their catalog entries. Runs after the commit with no lock held while decoding, so the signal is
+    # already current and publishers coalesced onto this generation are not kept waiting on it.
+    # Returns the near duplicates found, by simple_name.
+    derivatives = derivative_settings(profile)
+    images = image_store_settings(profile)
+    if not derivatives["sizes"] and not images["perceptual_hash"]:
+        return {}
+    for path in dict.fromkeys(entry["spritelet_path"] for entry in entries):
+        if derivatives["sizes"]:
+            with span("derivatives"):
+                try:
+                    yield Call(build_derivatives, root, path, derivatives)
+                    count("spritelet_derivatives_total", "built")
+                except UnsupportedImage:
+                    # The state stays published at full size; rebuild_state_derivatives.py reports why.
+                    count("spritelet_derivatives_total", "unsupported")
+        if images["perceptual_hash"]:
+            with span("perceptual_hash"):
+                try:
+                    yield Call(perceptual_hash, root, path)
+                except UnsupportedImage:
+                    pass
+    # Other states' hashes only change through their own writes, so a snapshot read suffices.
+    states = catalog.all() if images["perceptual_hash"] else {}
+
+    now = utc_now()
+    flagged = {}
+    log = EventLog(root, profile)
+    with span("describe_commit"), (yield LockStore(root)):
+        rows = []
+        events = []
+        for entry in entries:
+            key, path = entry["simple_name"], entry["spritelet_path"]
+            current = catalog.get(key)
+            # Skip entries that moved to another image since the commit; that publish describes its own.
+            if current is None or current["spritelet_path"] != path:
+                continue
+            fields = image_metadata(root, path, current)
+            if fields.get("sha256") != current.get("sha256"):
+                continue
+            row = {name: value for name, value in current.items() if name != "variants"}
+            row.update(fields)
+            variants = describe_variants(root, path)
+            if variants:
+                row["variants"] = variants
+            if row == current:
+                continue
+            rows.append(row)
+            states[key] = row
+        for row in rows:
+            event = {
+                "type": "state_image_described",
+                "simple_name": row["simple_name"],
+                "spritelet_path": row["spritelet_path"],
+                "variants": len(row.get("variants", [])),
+                "updated_at": now,
+            }
+            # Advisory only: the image stays published, with its look-alikes named.
+            if row.get("perceptual_hash"):
+                matches = near_duplicates(
+                    states, row["simple_name"], row["perceptual_hash"], images["near_duplicate_distance"]
+                )
+                if matches:
+                    event["near_duplicates"] = flagged[row["simple_name"]] = matches
+            events.append(event)
+        if rows:
+            catalog.upsert(rows)
+            log.append(events)
+    if log.compress_sealed:
+        yield Call(log.compress_sealed_segments)
+    return flagged
+
+
+def describe_images(*args, **kwargs) -> dict:
+    return run_sync(describe_images_flow(*args, **kwargs))
+
+
+def commit_publish_flow(
+    root: Path,
+    catalog: JsonCatalog | SqliteCatalog,
+    key: str,
+    spritelet_path: str,
+    description: str,
+    reused: bool,
+    coalesced: bool = False,
+    base_image_sha256: str | None = None,
+    event_fields: dict | None = None,
+    update_catalog: bool = True,
+    durable: bool = False,
+):
+    now = utc_now()
+    event = {
+        "type": "state_published",
+        "simple_name": key,
+        "spritelet_path": spritelet_path,
+        "description": description,
+        "reused": reused,
+        "updated_at": now,
+        **(event_fields or {}),
+    }
+    if coalesced:
+        event["coalesced"] = True
+    if event.get("degraded"):
+        outcome = "degraded"
+    elif event.get("requested_simple_name"):
+        outcome = "similar"
+    else:
+        outcome = "coalesced" if coalesced else "reused" if reused else "generated"
+    count("spritelet_publishes_total", outcome)
+    # Timings cover the stages up to this commit; the commit itself is only in the metrics file.
+    event.update(event_timings())
+    with span("commit"), (yield LockStore(root)):
+        if update_catalog:
+            upsert_catalog_entries(
+                catalog,
+                [{"simple_name": key, "spritelet_path": spritelet_path, "description": description, "reused": reused}],
+                now,
+                base_image_sha256,
+            )
+
+        commit_signal(root, {"spritelet_path": spritelet_path, "updated_at": now}, [event], durable)
+    log = EventLog(root)
+    if log.compress_sealed:
+        yield Call(log.compress_sealed_segments)
+
+
+def commit_publish(*args, **kwargs) -> None:
+    run_sync(commit_publish_flow(*args, **kwargs))
+
+
+def find_similar_state(
+    root: Path,
+    catalog: JsonCatalog | SqliteCatalog,
+    base_image: Path,
+    simple_name: str,
+    description: str,
+    threshold: float,
+    base_image_sha256: str | None = None,
+) -> tuple[str, dict, float] | None:
+    # Best reusable catalog entry whose name/description similarity reaches threshold.
+    for candidate in similar_states(root, catalog, simple_name, description):
+        if candidate["score"] < threshold:
+            break
+        state = candidate["state"]
+        if resolve_store_path(root, state["spritelet_path"]).exists() and should_reuse_state(
+            base_image, state, base_image_sha256
+        ):
+            return candidate["simple_name"], state, candidate["score"]
+    return None
+
+
+def find_cached_fallback(
+    root: Path,
+    catalog: JsonCatalog | SqliteCatalog,
+    key: str,
+    state: dict | None,
+    simple_name: str,
+    description: str,
+) -> tuple[str, dict, float] | None:
+    # Closest image already on disk, fresh or not: the requested state's own image first, then the most similar state.
+    if state and resolve_store_path(root, state["spritelet_path"]).exists():
+        return key, state, 1.0
+    for candidate in similar_states(root, catalog, simple_name, description):
+        if candidate["score"] > 0 and resolve_store_path(root, candidate["state"]["spritelet_path"]).exists():
+            return candidate["simple_name"], candidate["state"], candidate["score"]
+    return None
+
+
+def publish_flow(
+    root: Path,
+    simple_name: str,
+    description: str,
+    model: str = DEFAULT_MODEL,
+    endpoint: str = DEFAULT_ENDPOINT,
+    api_key_env: str = DEFAULT_API_KEY_ENV,
+    aspect_ratio: str = "1:1",
+    image_size: str = "1K",
+    force_generate: bool = False,
+    api_key: str | None = None,
+    cache: JsonCache | None = None,
+    reuse_similar: float | None = None,
+    on_limit: str | None = None,
+):
+    with span("profile"):
+        profile, base_image = load_profile(root, cache)
+        on_limit = on_limit or rate_limit_settings(profile)["on_limit"]
+        durable = signal_settings(profile)["durability"] != "none"
+        base_image_sha256 = content_hash(root, base_image)
+    with span("catalog_lookup"):
+        catalog = open_catalog(root, cache, required=False)
+        key, state = resolve_catalog_state(catalog, simple_name)
+    with catalog:
+        similar = None
+        if state is None and reuse_similar is not None and not force_generate:
+            with span("similarity"):
+                similar = find_similar_state(
+                    root, catalog, base_image, simple_name, description, reuse_similar, base_image_sha256
+                )
+        if similar:
+            # Publish the matched state as-is; the requested name is not added to the catalog.
+            requested_key = key
+            key, state, score = similar
+            yield from commit_publish_flow(
+                root,
+                catalog,
+                key,
+                state["spritelet_path"],
+                state.get("description", ""),
+                True,
+                base_image_sha256=base_image_sha256,
+                event_fields={"requested_simple_name": requested_key, "similarity": score},
+                durable=durable,
+            )
+            return {
+                "published": True,
+                "simple_name": key,
+                "spritelet_path": state["spritelet_path"],
+                "reused": True,
+                "requested_simple_name": requested_key,
+                "similarity": score,
+                **event_timings(),
+            }
+
+        reused = plan_state(root, base_image, state, force_generate, base_image_sha256)
+        coalesced = False
+        # Generations hold a per-state flight lock through the catalog commit so concurrent publishers
+        # of the same state wait for the first one and reuse its image instead of paying again.
+        flight = None if reused else (yield LockInflight(root, key, base_image_sha256))
+        with flight or nullcontext():
+            if flight and flight.waited:
+                key, state = resolve_catalog_state(catalog, simple_name)
+                coalesced = reused = plan_state(root, base_image, state, False, base_image_sha256)
+
+            if reused:
+                spritelet_path = state["spritelet_path"]
+            else:
+                try:
+                    spritelet_path = yield from generate_state_flow(
+                        root,
+                        profile,
+                        base_image,
+                        simple_name,
+                        description,
+                        state,
+                        resolve_api_key(api_key, api_key_env),
+                        model=model,
+                        endpoint=endpoint,
+                        aspect_ratio=aspect_ratio,
+                        image_size=image_size,
+                        on_limit="fail" if on_limit == "degrade" else on_limit,
+                    )
+                except RateLimited as e:
+                    if on_limit != "degrade":
+                        raise
+                    fallback = find_cached_fallback(root, catalog, key, state, simple_name, description)
+                    if fallback is None:
+                        raise
+                    # Show the closest image we already have without touching the catalog, so a stale
+                    # entry still regenerates once the limit clears.
+                    fallback_key, fallback_state, score = fallback
+                    degraded = {"degraded": True, "rate_limited": str(e.code)}
+                    if fallback_key != key:
+                        degraded.update(requested_simple_name=key, similarity=score)
+                    yield from commit_publish_flow(
+                        root,
+                        catalog,
+                        fallback_key,
+                        fallback_state["spritelet_path"],
+                        fallback_state.get("description", ""),
+                        True,
+                        event_fields=degraded,
+                        update_catalog=False,
+                        durable=durable,
+                    )
+                    return {
+                        "published": True,
+                        "simple_name": fallback_key,
+                        "spritelet_path": fallback_state["spritelet_path"],
+                        "reused": True,
+                        **degraded,
+                        **event_timings(),
+                    }
+
+            yield from commit_publish_flow(
+                root, catalog, key, spritelet_path, description, reused, coalesced, base_image_sha256, durable=durable
+            )
+        flagged = {}
+        if not reused:
+            flagged = yield from describe_images_flow(
+                root, profile, catalog, [{"simple_name": key, "spritelet_path": spritelet_path}]
+            )
+
+    result = {
+        "published": True,
+        "simple_name": key,
+        "spritelet_path": spritelet_path,
+        "reused": reused,
+    }
+    if coalesced:
+        result["coalesced"] = True
+    if key in flagged:
+        result["near_duplicates"] = flagged[key]
+    result.update(event_timings())
+    return result
+
+
+@timed_operation("publish")
+def publish_state(root: Path, *args, **kwargs) -> dict:
+    return run_sync(publish_flow(root, *args, **kwargs))
+
+
+async def publish_state_async(root: Path, *args, **kwargs) -> dict:
+    # Same flow as publish_state; locks, rate limit waits and generation are awaited instead of blocking.
+    with operation(root, "publish"):
+        return await run_async(publish_flow(root, *args, **kwargs))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reuse or generate and publish a Spritelet state")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--simple-name", required=True)
+    parser.add_argument("--description", required=True)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT)
+    parser.add_argument("--api-key-env", default=DEFAULT_API_KEY_ENV)
+    parser.add_argument("--aspect-ratio", default="1:1", help="Output image aspect ratio (default: 1:1)")
+    parser.add_argument("--image-size", default="1K", help="Output image size tier (default: 1K)")
+    parser.add_argument(
+        "--force-generate",
+        action="store_true",
+        help="Always generate a fresh image; if state exists, overwrite its current spritelet_path",
+    )
+    parser.add_argument(
+        "--reuse-similar",
+        type=float,
+        metavar="THRESHOLD",
+        help="When the name is not in the catalog, reuse the most similar fresh state scoring at least THRESHOLD (0-1)",
+    )
+    parser.add_argument(
+        "--on-limit",
+        choices=ON_LIMIT_MODES,
+        help="When the shared request rate or daily image budget is exhausted: wait for a slot, fail, "
+        "or publish the closest cached state (default: spritelet.json rate_limit.on_limit, else wait)",
+    )
+    parser.add_argument("--no-daemon", action="store_true", help="Publish in this process even if a daemon is running")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    params = {
+        "simple_name": args.simple_name,
+        "description": args.description,
+        "model": args.model,
+        "endpoint": args.endpoint,
+        "api_key_env": args.api_key_env,
+        "aspect_ratio": args.aspect_ratio,
+        "image_size": args.image_size,
+        "force_generate": args.force_generate,
+        "reuse_similar": args.reuse_similar,
+        "on_limit": args.on_limit,
+    }
+    result = None
+    if not args.no_daemon:
+        # The daemon may run under a different environment, so forward the caller's key if it has one.
+        api_key = os.environ.get(args.api_key_env, "")
+        result = daemon_request(root, "publish", {**params, "api_key": api_key or None})
+    if result is None:
+        result = publish_state(root, **params)
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
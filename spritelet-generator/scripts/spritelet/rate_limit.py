@@ -0,0 +1,200 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from .metrics import lock_wait
+
+ON_LIMIT_MODES = ("wait", "fail", "degrade")
+DEFAULT_MAX_WAIT_SECONDS = 300.0
+
+
+class RateLimited(SystemExit):
+    # A SystemExit so CLIs and per-item error handlers report it like any other generation failure.
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def rate_limit_settings(profile: dict) -> dict:
+    # spritelet.json "rate_limit": {"requests_per_minute", "burst", "daily_images", "scope", "on_limit", "max_wait_seconds"}
+    settings = profile.get("rate_limit", {})
+    requests_per_minute = float(settings.get("requests_per_minute", 0))
+    return {
+        "requests_per_minute": requests_per_minute,
+        "burst": float(settings.get("burst", max(requests_per_minute, 1.0))),
+        "daily_images": int(settings.get("daily_images", 0)),
+        "scope": settings.get("scope", "root"),
+        "on_limit": settings.get("on_limit", "wait"),
+        "max_wait_seconds": float(settings.get("max_wait_seconds", DEFAULT_MAX_WAIT_SECONDS)),
+    }
+
+
+def _utc_day(now: float) -> str:
+    return datetime.fromtimestamp(now, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _seconds_to_utc_midnight(now: float) -> float:
+    moment = datetime.fromtimestamp(now, tz=timezone.utc)
+    midnight = (moment + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - moment).total_seconds()
+
+
+class GenerationLimiter:
+    # Token bucket plus daily image count in one SQLite file, shared by every process that uses it.
+    # scope "root" keeps it in <root>/.locks/rate-limit.sqlite; scope "api_key" shares one bucket per
+    # key across roots in ~/.cache/spritelet/rate-limit.sqlite (SPRITELET_RATE_LIMIT_DB overrides both).
+    def __init__(self, root: Path, settings: dict, api_key: str = "") -> None:
+        self.settings = settings
+        if settings["scope"] == "api_key":
+            import hashlib
+
+            self.path = Path.home() / ".cache" / "spritelet" / "rate-limit.sqlite"
+            self.bucket = "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        elif settings["scope"] == "root":
+            self.path = root / ".locks" / "rate-limit.sqlite"
+            self.bucket = "root"
+        else:
+            raise SystemExit(f"Unknown rate_limit scope: {settings['scope']} (expected root or api_key)")
+        if os.environ.get("SPRITELET_RATE_LIMIT_DB"):
+            self.path = Path(os.environ["SPRITELET_RATE_LIMIT_DB"])
+
+    def _connect(self) -> "sqlite3.Connection":
+        # sqlite3 loads only once a publish actually needs a generation slot.
+        import sqlite3
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets (bucket TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage (bucket TEXT NOT NULL, day TEXT NOT NULL, images INTEGER NOT NULL, "
+            "limited INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (bucket, day))"
+        )
+        return conn
+
+    def _refill(self, conn: "sqlite3.Connection", now: float) -> float:
+        rate = self.settings["requests_per_minute"] / 60.0
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE bucket = ?", (self.bucket,)).fetchone()
+        if row is None:
+            return self.settings["burst"]
+        tokens, updated = row
+        return min(self.settings["burst"], tokens + max(now - updated, 0.0) * rate)
+
+    def try_acquire(self, retry: bool = False) -> tuple[float, str]:
+        # Takes one request token; a first attempt also needs an image left in today's budget, which
+        # record_image() charges once the image is written. Returns (0, "") on success, else (seconds
+        # until a slot could free up, reason) without taking anything.
+        conn = self._connect()
+        try:
+            now = time.time()
+            day = _utc_day(now)
+            conn.execute("BEGIN IMMEDIATE")
+            tokens = self._refill(conn, now)
+            row = conn.execute("SELECT images FROM usage WHERE bucket = ? AND day = ?", (self.bucket, day)).fetchone()
+            images = row[0] if row else 0
+            wait, reason = 0.0, ""
+            if not retry and self.settings["daily_images"] and images >= self.settings["daily_images"]:
+                wait, reason = _seconds_to_utc_midnight(now), f"daily image budget of {self.settings['daily_images']} used up"
+            elif self.settings["requests_per_minute"] and tokens < 1.0:
+                wait = (1.0 - tokens) * 60.0 / self.settings["requests_per_minute"]
+                reason = f"over {self.settings['requests_per_minute']:g} requests per minute"
+            elif self.settings["requests_per_minute"]:
+                tokens -= 1.0
+            conn.execute(
+                "INSERT INTO buckets (bucket, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(bucket) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (self.bucket, tokens, now),
+            )
+            conn.execute(
+                "INSERT INTO usage (bucket, day, images, limited) VALUES (?, ?, 0, ?) "
+                "ON CONFLICT(bucket, day) DO UPDATE SET limited = usage.limited + excluded.limited",
+                (self.bucket, day, 1 if reason else 0),
+            )
+            conn.execute("COMMIT")
+            return wait, reason
+        finally:
+            conn.close()
+
+    def record_image(self) -> None:
+        # Counts one generated image against today's budget; failed attempts only spend request tokens.
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO usage (bucket, day, images) VALUES (?, ?, 1) "
+                "ON CONFLICT(bucket, day) DO UPDATE SET images = usage.images + 1",
+                (self.bucket, _utc_day(time.time())),
+            )
+        finally:
+            conn.close()
+
+    def slot_waits(self, on_limit: str | None = None, retry: bool = False):
+        # Yields each wait for the caller to sleep (time.sleep or asyncio.sleep) until a slot is
+        # taken. "fail" and "degrade" raise RateLimited at once; "wait" gives up past max_wait_seconds.
+        on_limit = on_limit or self.settings["on_limit"]
+        if on_limit not in ON_LIMIT_MODES:
+            raise SystemExit(f"Unknown on_limit mode: {on_limit} (expected one of: {', '.join(ON_LIMIT_MODES)})")
+        waited = 0.0
+        while True:
+            wait, reason = self.try_acquire(retry)
+            if not reason:
+                lock_wait("rate_limit", waited)
+                return
+            if on_limit != "wait" or waited + wait > self.settings["max_wait_seconds"]:
+                raise RateLimited(f"Generation rate limited: {reason}; retry in {wait:.0f}s", wait)
+            yield wait
+            waited += wait
+
+    def acquire(self, on_limit: str | None = None, retry: bool = False) -> float:
+        # Returns the seconds spent waiting. Every POST attempt takes a slot; retry skips the daily check.
+        waited = 0.0
+        for wait in self.slot_waits(on_limit, retry):
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+    async def acquire_async(self, on_limit: str | None = None, retry: bool = False) -> float:
+        import asyncio
+
+        waited = 0.0
+        for wait in self.slot_waits(on_limit, retry):
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+    def usage(self, days: int = 7) -> dict:
+        now = time.time()
+        tokens, rows = self.settings["burst"], []
+        # Unlimited roots never create the file, and looking at usage should not either.
+        if self.path.exists():
+            conn = self._connect()
+            try:
+                tokens = self._refill(conn, now)
+                rows = conn.execute(
+                    "SELECT day, images, limited FROM usage WHERE bucket = ? ORDER BY day DESC LIMIT ?", (self.bucket, days)
+                ).fetchall()
+            finally:
+                conn.close()
+        today = _utc_day(now)
+        used_today = next((images for day, images, _ in rows if day == today), 0)
+        daily = self.settings["daily_images"]
+        return {
+            "db": str(self.path),
+            "bucket": self.bucket,
+            "requests_per_minute": self.settings["requests_per_minute"] or None,
+            "burst": self.settings["burst"] if self.settings["requests_per_minute"] else None,
+            "tokens_available": round(tokens, 3) if self.settings["requests_per_minute"] else None,
+            "daily_images": daily or None,
+            "used_today": used_today,
+            "remaining_today": max(daily - used_today, 0) if daily else None,
+            "resets_in_seconds": round(_seconds_to_utc_midnight(now)),
+            "history": [{"day": day, "images": images, "rate_limited": limited} for day, images, limited in rows],
+        }
+
+
+def generation_limiter(root: Path, profile: dict, api_key: str = "") -> GenerationLimiter | None:
+    # None when no limit is set, so unlimited roots never open (or create) the SQLite file.
+    settings = rate_limit_settings(profile)
+    if not settings["requests_per_minute"] and not settings["daily_images"]:
+        return None
+    return GenerationLimiter(root, settings, api_key)
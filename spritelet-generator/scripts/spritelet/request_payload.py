@@ -0,0 +1,225 @@
+import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from .store_utils import atomic_write_json, content_hash, load_json
+
+BASE_IMAGE_TRANSFERS = ("inline", "file")
+DEFAULT_UPLOAD_ENDPOINT = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+# Uploaded files expire after 48h; stop reusing a handle well before that.
+FILE_HANDLE_MARGIN_SECONDS = 3600
+FILE_HANDLE_DEFAULT_TTL_SECONDS = 47 * 3600
+MAX_ENCODED_ON_DISK = 4
+_PROMPT_SLOT = "\u0000spritelet-prompt\u0000"
+_IMAGE_SLOT = "\u0000spritelet-image\u0000"
+
+
+class RequestTemplate:
+    # Request JSON pre-serialized around the base image and prompt. The base64 image bytes are
+    # shared with the cache, so rendering a request copies only the prompt and a few small pieces.
+    def __init__(self, head: bytes, image: bytes, middle: bytes, tail: bytes) -> None:
+        self.head = head
+        self.image = image
+        self.middle = middle
+        self.tail = tail
+
+    def render(self, prompt: str) -> list[bytes]:
+        return [self.head, self.image, self.middle, json.dumps(prompt)[1:-1].encode("utf-8"), self.tail]
+
+
+def _split_template(request: dict, indent: int | None) -> tuple[bytes, bytes, bytes]:
+    text = json.dumps(request, indent=indent)
+    head, rest = text.split(json.dumps(_IMAGE_SLOT)[1:-1], 1)
+    middle, tail = rest.split(json.dumps(_PROMPT_SLOT)[1:-1], 1)
+    return head.encode("utf-8"), middle.encode("utf-8"), tail.encode("utf-8")
+
+
+def _parse_expiry(value: str | None) -> float:
+    if value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time() + FILE_HANDLE_DEFAULT_TTL_SECONDS
+
+
+class BasePayloadCache:
+    # Base image encodings keyed by content hash: base64 kept in memory and under
+    # <root>/.cache/base-payload/, uploaded file handles in <root>/.cache/base-image-files.json,
+    # and serialized request templates per (image, model, generation config, layout).
+    def __init__(self, max_entries: int = 4, max_templates: int = 32) -> None:
+        self.max_entries = max_entries
+        self.max_templates = max_templates
+        self._encoded: OrderedDict[str, bytes] = OrderedDict()
+        self._templates: OrderedDict[tuple, RequestTemplate] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encoded(self, root: Path, base_image: Path) -> tuple[str, bytes]:
+        sha256 = content_hash(root, base_image)
+        with self._lock:
+            if sha256 in self._encoded:
+                self._encoded.move_to_end(sha256)
+                return sha256, self._encoded[sha256]
+
+        cache_dir = root / ".cache" / "base-payload"
+        cache_path = cache_dir / f"{sha256}.b64"
+        try:
+            data = cache_path.read_bytes()
+        except OSError:
+            data = b""
+        if len(data) != (base_image.stat().st_size + 2) // 3 * 4:
+            data = base64.b64encode(base_image.read_bytes())
+            self._store_encoded(cache_dir, cache_path, data)
+
+        with self._lock:
+            self._encoded[sha256] = data
+            while len(self._encoded) > self.max_entries:
+                self._encoded.popitem(last=False)
+        return sha256, data
+
+    @staticmethod
+    def _store_encoded(cache_dir: Path, cache_path: Path, data: bytes) -> None:
+        # Best-effort, like the content hash cache; only the most recent encodings are kept.
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, cache_path)
+            stale = sorted(cache_dir.glob("*.b64"), key=lambda path: path.stat().st_mtime, reverse=True)
+            for path in stale[MAX_ENCODED_ON_DISK:]:
+                path.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def file_handle(
+        self,
+        root: Path,
+        base_image: Path,
+        api_key: str,
+        upload_endpoint: str = DEFAULT_UPLOAD_ENDPOINT,
+        mime_type: str = "image/png",
+    ) -> tuple[str, str]:
+        # Returns (sha256, file_uri), uploading the base image only when no live handle is recorded.
+        sha256 = content_hash(root, base_image)
+        handles_path = root / ".cache" / "base-image-files.json"
+        try:
+            handles = load_json(handles_path, {})
+        except (OSError, ValueError):
+            handles = {}
+        handle = handles.get(sha256)
+        if (
+            handle
+            and handle.get("upload_endpoint") == upload_endpoint
+            and handle.get("expires_at", 0) - FILE_HANDLE_MARGIN_SECONDS > time.time()
+        ):
+            return sha256, handle["file_uri"]
+
+        from .generation_client import default_client
+
+        response = default_client().upload(upload_endpoint, api_key, base_image.read_bytes(), mime_type)
+        uploaded = response.get("file", response)
+        if not uploaded.get("uri"):
+            raise SystemExit(f"Upload response has no file uri: {json.dumps(response)[:200]}")
+        handles = {
+            key: value for key, value in handles.items() if value.get("expires_at", 0) > time.time()
+        }
+        handles[sha256] = {
+            "file_uri": uploaded["uri"],
+            "upload_endpoint": upload_endpoint,
+            "expires_at": _parse_expiry(uploaded.get("expirationTime")),
+        }
+        try:
+            atomic_write_json(handles_path, handles)
+        except OSError:
+            pass
+        return sha256, uploaded["uri"]
+
+    def template(
+        self,
+        root: Path,
+        base_image: Path,
+        model: str,
+        generation_config: dict,
+        transfer: str = "inline",
+        api_key: str = "",
+        upload_endpoint: str = DEFAULT_UPLOAD_ENDPOINT,
+        indent: int | None = None,
+    ) -> RequestTemplate:
+        if transfer == "file":
+            sha256, file_uri = self.file_handle(root, base_image, api_key, upload_endpoint)
+            image_part = {"file_data": {"mime_type": "image/png", "file_uri": _IMAGE_SLOT}}
+            image = json.dumps(file_uri)[1:-1].encode("utf-8")
+        elif transfer == "inline":
+            sha256, image = self.encoded(root, base_image)
+            image_part = {"inline_data": {"mime_type": "image/png", "data": _IMAGE_SLOT}}
+        else:
+            raise SystemExit(f"Unknown base image transfer: {transfer} (expected one of: {', '.join(BASE_IMAGE_TRANSFERS)})")
+
+        config_key = json.dumps(generation_config, sort_keys=True)
+        key = (sha256, transfer, image if transfer == "file" else b"", model, config_key, indent)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+
+        request = {
+            "model": model,
+            "contents": [{"role": "user", "parts": [image_part, {"text": _PROMPT_SLOT}]}],
+            "generation_config": generation_config,
+        }
+        head, middle, tail = _split_template(request, indent)
+        template = RequestTemplate(head, image, middle, tail)
+        with self._lock:
+            self._templates[key] = template
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return template
+
+
+_default_cache: BasePayloadCache | None = None
+_default_cache_lock = threading.Lock()
+
+
+def default_payload_cache() -> BasePayloadCache:
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = BasePayloadCache()
+        return _default_cache
+
+
+def base_image_transfer_settings(profile: dict) -> tuple[str, str]:
+    # spritelet.json: "base_image_transfer": {"mode": "inline" | "file", "upload_endpoint": "..."}
+    settings = profile.get("base_image_transfer", {})
+    return settings.get("mode", "inline"), settings.get("upload_endpoint", DEFAULT_UPLOAD_ENDPOINT)
+
+
+def build_generation_request(
+    root: Path,
+    profile: dict,
+    base_image: Path,
+    prompt: str,
+    model: str,
+    generation_config: dict,
+    api_key: str = "",
+    transfer: str | None = None,
+    indent: int | None = None,
+) -> list[bytes]:
+    mode, upload_endpoint = base_image_transfer_settings(profile)
+    template = default_payload_cache().template(
+        root,
+        base_image,
+        model,
+        generation_config,
+        transfer=transfer or mode,
+        api_key=api_key,
+        upload_endpoint=upload_endpoint,
+        indent=indent,
+    )
+    return template.render(prompt)
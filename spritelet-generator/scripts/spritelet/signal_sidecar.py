@@ -0,0 +1,128 @@
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+# signals/current.bin mirrors signals/current.json in a fixed layout that display clients map once and
+# poll with one memory load. All integers are little-endian:
+#   offset  size  field
+#        0     4  magic b"SPRT"
+#        4     2  version (1)
+#        6     2  header size (32); the path starts here
+#        8     8  seq: seqlock counter, odd while a writer is inside, +2 per update, 0 before the first
+#       16     8  updated_ns: commit time in Unix nanoseconds
+#       24     4  path_len: bytes of spritelet_path
+#       28     4  reserved (0)
+#       32     n  spritelet_path, UTF-8
+# The file is SIDECAR_BYTES long, created once by rename and afterwards rewritten in place, so a
+# mapping stays valid for the life of the store.
+MAGIC = b"SPRT"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQQII")
+SEQ = struct.Struct("<Q")
+SEQ_OFFSET = 8
+SIDECAR_BYTES = 4096
+MAX_PATH_BYTES = SIDECAR_BYTES - HEADER.size
+READ_ATTEMPTS = 100
+
+
+def sidecar_path(root: Path) -> Path:
+    return root / "signals" / "current.bin"
+
+
+def encode_sidecar_path(spritelet_path: str) -> bytes:
+    data = spritelet_path.encode("utf-8")
+    if len(data) > MAX_PATH_BYTES:
+        raise SystemExit(f"spritelet_path is longer than {MAX_PATH_BYTES} bytes: {spritelet_path[:80]}...")
+    return data
+
+
+def sidecar_seq(root: Path) -> int | None:
+    # The seq counter read through the file (writers and tools); None when there is no sidecar yet.
+    try:
+        with sidecar_path(root).open("rb") as f:
+            f.seek(SEQ_OFFSET)
+            raw = f.read(SEQ.size)
+    except FileNotFoundError:
+        return None
+    return SEQ.unpack(raw)[0] if len(raw) == SEQ.size else None
+
+
+def write_sidecar(root: Path, spritelet_path: str, updated_ns: int | None = None) -> int:
+    # Caller must hold store_lock, which makes it the only writer. Returns the new (even) seq.
+    data = encode_sidecar_path(spritelet_path)
+    updated_ns = time.time_ns() if updated_ns is None else updated_ns
+    path = sidecar_path(root)
+    if not path.exists():
+        # First write: build the whole file aside so no reader ever maps a short one.
+        tmp = path.with_name(path.name + ".tmp")
+        page = bytearray(SIDECAR_BYTES)
+        HEADER.pack_into(page, 0, MAGIC, VERSION, HEADER.size, 2, updated_ns, len(data), 0)
+        page[HEADER.size:HEADER.size + len(data)] = data
+        tmp.write_bytes(page)
+        os.replace(tmp, path)
+        return 2
+    fd = os.open(path, os.O_RDWR)
+    try:
+        raw = os.pread(fd, SEQ.size, SEQ_OFFSET)
+        seq = SEQ.unpack(raw)[0] if len(raw) == SEQ.size else 0
+        # A writer that died mid-update leaves an odd value; move on to the next odd one.
+        writing = seq + 1 if seq % 2 == 0 else seq + 2
+        os.pwrite(fd, SEQ.pack(writing), SEQ_OFFSET)
+        body = struct.pack("<QII", updated_ns, len(data), 0) + data
+        os.pwrite(fd, body, SEQ_OFFSET + SEQ.size)
+        os.pwrite(fd, SEQ.pack(writing + 1), SEQ_OFFSET)
+    finally:
+        os.close(fd)
+    return writing + 1
+
+
+class SignalReader:
+    # Maps signals/current.bin read-only. `seq` is one load from the shared mapping (no syscall), so a
+    # frame loop can call `changed()` every frame and `read()` only when it returns True.
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        path = sidecar_path(root)
+        try:
+            with path.open("rb") as f:
+                self._map = mmap.mmap(f.fileno(), SIDECAR_BYTES, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise SystemExit(f"Missing {path}; publish or set a signal first") from None
+        except ValueError:
+            raise SystemExit(f"{path} is shorter than {SIDECAR_BYTES} bytes") from None
+        magic, version = HEADER.unpack_from(self._map, 0)[:2]
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise SystemExit(f"{path} is not a version {VERSION} Spritelet signal sidecar")
+        self.last_seq = -1
+
+    @property
+    def seq(self) -> int:
+        return SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+
+    def changed(self) -> bool:
+        # True when a signal was committed since the last read().
+        return self.seq != self.last_seq
+
+    def read(self) -> dict:
+        # Seqlock read: retried until the counter is even and unchanged across the copy.
+        for attempt in range(READ_ATTEMPTS):
+            before = self.seq
+            if before % 2 == 0:
+                _, _, header_size, _, updated_ns, path_len, _ = HEADER.unpack_from(self._map, 0)
+                data = self._map[header_size:header_size + min(path_len, MAX_PATH_BYTES)]
+                if self.seq == before:
+                    self.last_seq = before
+                    return {"seq": before, "spritelet_path": data.decode("utf-8"), "updated_ns": updated_ns}
+            time.sleep(0 if attempt < 10 else 0.001)
+        raise SystemExit(f"{sidecar_path(self.root)} stayed mid-update; a writer may have died inside store_lock")
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "SignalReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,187 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+from pathlib import Path
+from collections.abc import AsyncIterator, Iterator
+
+from .event_log import EventLog
+
+# Events that rewrite signals/current.json; their seq is the change's sequence number.
+CURRENT_EVENT_TYPES = ("state_initialized", "current_spritelet_updated", "state_published")
+
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+
+
+def _load_libc() -> ctypes.CDLL | None:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class SignalWatcher:
+    # Wakes when anything under signals/ changes: inotify on Linux, stat polling elsewhere.
+    def __init__(self, root: Path, poll_interval: float = 0.5, use_inotify: bool = True) -> None:
+        self.signals_dir = root / "signals"
+        self.poll_interval = poll_interval
+        self.fd = -1
+        libc = _load_libc() if use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(self.signals_dir), mask) >= 0:
+                self.fd = fd
+            elif fd >= 0:
+                os.close(fd)
+        self._signature = self._stat_signature()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.fd >= 0 else "poll"
+
+    def _stat_signature(self) -> tuple:
+        signature = []
+        for name in ("current.json", "events.jsonl", "events.head.json"):
+            try:
+                st = (self.signals_dir / name).stat()
+                signature.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _drain(self) -> None:
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _poll_changed(self) -> bool:
+        signature = self._stat_signature()
+        changed = signature != self._signature
+        self._signature = signature
+        return changed
+
+    def wait(self, timeout: float | None = None) -> bool:
+        # Returns True on a change, False when timeout expired first.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.fd >= 0:
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+            if readable:
+                self._drain()
+            return bool(readable)
+        while not self._poll_changed():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            remaining = self.poll_interval if deadline is None else min(self.poll_interval, deadline - time.monotonic())
+            time.sleep(max(remaining, 0))
+        return True
+
+    async def wait_async(self, timeout: float | None = None) -> bool:
+        if self.fd < 0:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._poll_changed():
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                await asyncio.sleep(self.poll_interval)
+            return True
+
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(self.fd, lambda: ready.done() or ready.set_result(True))
+        try:
+            await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(self.fd)
+        self._drain()
+        return True
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def current_changes(log: EventLog, after_seq: int) -> list[dict]:
+    changes = []
+    for event in log.read(after_seq=after_seq):
+        if event.get("type") not in CURRENT_EVENT_TYPES:
+            continue
+        change = {
+            "seq": event["seq"],
+            "type": event["type"],
+            "spritelet_path": event.get("spritelet_path", ""),
+            "updated_at": event.get("updated_at", ""),
+        }
+        # Debounced by SignalWriter: logged, but never shown in signals/current.json.
+        if event.get("superseded"):
+            change["superseded"] = True
+        changes.append(change)
+    return changes
+
+
+def latest_seq(root: Path) -> int:
+    last = EventLog(root).last_seq()
+    return -1 if last is None else last
+
+
+def wait_for_changes(root: Path, after_seq: int, timeout: float, watcher: SignalWatcher | None = None) -> list[dict]:
+    # Long-poll primitive: changes after after_seq, waiting up to timeout seconds for the first one.
+    log = EventLog(root)
+    own_watcher = watcher is None
+    watcher = watcher or SignalWatcher(root)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            changes = current_changes(log, after_seq)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                return changes
+            watcher.wait(remaining)
+    finally:
+        if own_watcher:
+            watcher.close()
+
+
+def watch_current(root: Path, after_seq: int | None = None, poll_interval: float = 0.5) -> Iterator[dict]:
+    # Yields every current.json change after after_seq (default: only changes from now on), forever.
+    log = EventLog(root)
+    with SignalWatcher(root, poll_interval) as watcher:
+        if after_seq is None:
+            after_seq = latest_seq(root)
+        while True:
+            for change in current_changes(log, after_seq):
+                after_seq = change["seq"]
+                yield change
+            watcher.wait()
+
+
+async def awatch_current(root: Path, after_seq: int | None = None, poll_interval: float = 0.5) -> AsyncIterator[dict]:
+    log = EventLog(root)
+    with SignalWatcher(root, poll_interval) as watcher:
+        if after_seq is None:
+            after_seq = latest_seq(root)
+        while True:
+            for change in current_changes(log, after_seq):
+                after_seq = change["seq"]
+                yield change
+            await watcher.wait_async()
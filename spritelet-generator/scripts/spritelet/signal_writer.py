@@ -0,0 +1,249 @@
+import threading
+import time
+from pathlib import Path
+
+from .event_log import EventLog, compress_sealed
+from .metrics import count
+from .signal_sidecar import encode_sidecar_path, sidecar_seq, write_sidecar
+from .store_utils import atomic_write_json, fsync_path, load_json, remove_orphaned_tmp_files, resolve_store_path, store_lock, utc_now
+
+DURABILITY_MODES = ("none", "commit", "group")
+DEFAULT_GROUP_FSYNC_MS = 100.0
+
+
+def signal_settings(profile: dict) -> dict:
+    # spritelet.json "signals": {"debounce_ms", "durability", "group_fsync_ms"}
+    settings = profile.get("signals", {})
+    durability = settings.get("durability", "none")
+    if durability not in DURABILITY_MODES:
+        raise SystemExit(f"signals.durability must be one of {', '.join(DURABILITY_MODES)}, not {durability!r}")
+    return {
+        "debounce_ms": float(settings.get("debounce_ms", 0)),
+        "durability": durability,
+        "group_fsync_ms": float(settings.get("group_fsync_ms", DEFAULT_GROUP_FSYNC_MS)),
+    }
+
+
+def write_current(root: Path, current: dict, durable: bool = False) -> None:
+    # Caller must hold store_lock. Rewrites signals/current.json and its binary sidecar (see
+    # signal_sidecar.py); the sidecar is derived, so it is never fsynced.
+    encode_sidecar_path(current["spritelet_path"])
+    atomic_write_json(root / "signals" / "current.json", current, durable)
+    write_sidecar(root, current["spritelet_path"])
+
+
+def sync_sidecar(root: Path) -> None:
+    # Caller must hold store_lock. Rebuilds the sidecar from current.json when it is missing (stores
+    # made before it existed) or was left mid-update by a crashed writer.
+    current = load_json(root / "signals" / "current.json", {})
+    if not current:
+        return
+    seq = sidecar_seq(root)
+    if seq is None or seq % 2:
+        write_sidecar(root, current.get("spritelet_path", ""))
+
+
+def commit_signal(root: Path, current: dict | None, events: list[dict], durable: bool = False) -> list[dict]:
+    # Caller must hold store_lock. Points signals/current.json at current (unless None) and appends
+    # events in one write; with durable, both are fsynced before returning.
+    if current is not None:
+        write_current(root, current, durable)
+    log = EventLog(root)
+    written = log.append(events)
+    if durable:
+        log.sync()
+    return written
+
+
+def current_identity(root: Path) -> tuple[int, int] | None:
+    # Every atomic write of current.json is a new inode, so (inode, mtime) names one write.
+    try:
+        st = (root / "signals" / "current.json").stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+class SignalWriter:
+    # Resident writer for signals/current.json (daemons, long-running agents). Signals submitted
+    # within debounce_ms of the first pending one are committed together: current.json gets only the
+    # latest, and every event goes into the log in one append with the intermediate ones marked
+    # "superseded". A batch never overwrites a signal that another process committed after the
+    # batch's latest submission (publish, set_spritelet_signal.py); that signal wins and only the
+    # events are logged. Durability:
+    #   none    rely on the page cache, like the scripts do by default
+    #   commit  fsync current.json and the event log before each batch is acknowledged
+    #   group   fsync at most every group_fsync_ms, covering every batch committed since the last one
+    def __init__(
+        self,
+        root: Path,
+        debounce_ms: float | None = None,
+        durability: str | None = None,
+        group_fsync_ms: float | None = None,
+        lock_timeout: float | None = None,
+    ) -> None:
+        settings = signal_settings(load_json(root / "spritelet.json", {}))
+        self.root = root
+        self.debounce = (settings["debounce_ms"] if debounce_ms is None else debounce_ms) / 1000
+        self.durability = durability or settings["durability"]
+        if self.durability not in DURABILITY_MODES:
+            raise SystemExit(f"durability must be one of {', '.join(DURABILITY_MODES)}, not {self.durability!r}")
+        self.group_fsync = (settings["group_fsync_ms"] if group_fsync_ms is None else group_fsync_ms) / 1000
+        self.lock_timeout = lock_timeout
+        self._cond = threading.Condition()
+        self._pending: list[dict] = []
+        self._latest: dict | None = None
+        self._latest_base: tuple[int, int] | None = None
+        self._window_started = 0.0
+        # Tickets: one per submission. committed/synced are the highest tickets written/fsynced.
+        self._submitted = 0
+        self._committed = 0
+        self._synced = 0
+        self._written: tuple[int, int] | None = None
+        self._last_sync = time.monotonic()
+        self._error: BaseException | None = None
+        self._closed = False
+        with store_lock(root, timeout=lock_timeout):
+            self.removed_tmp_files = remove_orphaned_tmp_files(root)
+            sync_sidecar(root)
+        self._thread = threading.Thread(target=self._run, name="spritelet-signal-writer", daemon=True)
+        self._thread.start()
+
+    def set_signal(self, spritelet_path: str, wait: bool = False) -> dict:
+        if not resolve_store_path(self.root, spritelet_path).exists():
+            raise SystemExit(f"spritelet_path does not exist: {spritelet_path}")
+        current = {"spritelet_path": spritelet_path, "updated_at": utc_now()}
+        self.submit(current, {"type": "current_spritelet_updated", **current}, wait)
+        return current
+
+    def submit(self, current: dict, event: dict, wait: bool = False) -> int:
+        # Queues current as the newest signal and event for the log; returns the submission's ticket.
+        # With wait, returns only once the ticket is committed (and fsynced, unless durability is none).
+        base = current_identity(self.root)
+        with self._cond:
+            if self._closed:
+                raise SystemExit("SignalWriter is closed")
+            if not self._pending:
+                self._window_started = time.monotonic()
+            self._submitted += 1
+            self._pending.append(event)
+            self._latest = current
+            self._latest_base = base
+            ticket = self._submitted
+            self._cond.notify_all()
+        if wait:
+            self.wait(ticket)
+        return ticket
+
+    def wait(self, ticket: int | None = None) -> None:
+        # Blocks until ticket (default: everything submitted so far) is durable per the durability mode.
+        with self._cond:
+            ticket = self._submitted if ticket is None else ticket
+            self._window_started = 0.0
+            self._cond.notify_all()
+            while (self._synced if self.durability != "none" else self._committed) < ticket:
+                if self._error is not None:
+                    raise self._error
+                self._cond.wait()
+
+    def flush(self) -> None:
+        # Commits pending signals now instead of at the end of the debounce window, and waits for them.
+        self.wait()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._window_started = 0.0
+            self._cond.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> "SignalWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _next_deadline(self) -> float | None:
+        # Caller holds _cond. Monotonic time of the next commit or group fsync, None when idle.
+        deadlines = []
+        if self._pending:
+            deadlines.append(self._window_started + self.debounce)
+        if self.durability == "group" and self._synced < self._committed:
+            deadlines.append(self._last_sync + self.group_fsync)
+        return min(deadlines) if deadlines else None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    deadline = self._next_deadline()
+                    if deadline is None and self._closed:
+                        return
+                    now = time.monotonic()
+                    if deadline is not None and (deadline <= now or self._closed):
+                        break
+                    self._cond.wait(None if deadline is None else deadline - now)
+                now = time.monotonic()
+                batch = None
+                if self._pending and (self._window_started + self.debounce <= now or self._closed):
+                    batch = (self._pending, self._latest, self._latest_base, self._submitted)
+                    self._pending, self._latest, self._latest_base = [], None, None
+                sync_upto = None
+                if self.durability == "group" and (
+                    self._last_sync + self.group_fsync <= now or self._closed
+                ):
+                    sync_upto = self._committed
+            try:
+                if batch is not None:
+                    self._commit(*batch)
+                if sync_upto is not None and sync_upto > self._synced:
+                    self._sync(sync_upto)
+                elif sync_upto is not None:
+                    self._last_sync = time.monotonic()
+            except BaseException as e:
+                with self._cond:
+                    if batch is not None:
+                        # Keep the failed batch ahead of anything submitted since; it is retried next round.
+                        events, latest, base, _ = batch
+                        self._pending = events + self._pending
+                        if self._latest is None:
+                            self._latest, self._latest_base = latest, base
+                        self._window_started = time.monotonic()
+                    self._error = e
+                    self._cond.notify_all()
+                    if self._closed:
+                        return
+                    self._cond.wait(max(self.debounce, 0.1))
+
+    def _commit(self, events: list[dict], latest: dict, base: tuple[int, int] | None, ticket: int) -> None:
+        durable = self.durability == "commit"
+        events = [{**event, "superseded": True} for event in events[:-1]] + events[-1:]
+        with store_lock(self.root, timeout=self.lock_timeout):
+            on_disk = current_identity(self.root)
+            # Another process replaced current.json after the latest submission was made.
+            overridden = on_disk not in (base, self._written)
+            commit_signal(self.root, None if overridden else latest, events, durable)
+            if not overridden:
+                self._written = current_identity(self.root)
+        compress_sealed(self.root)
+        count("spritelet_signal_events_total", "overridden" if overridden else "shown")
+        count("spritelet_signal_events_total", "superseded", len(events) - 1)
+        with self._cond:
+            self._committed = ticket
+            if durable:
+                self._synced = ticket
+            self._error = None
+            self._cond.notify_all()
+
+    def _sync(self, ticket: int) -> None:
+        with store_lock(self.root, shared=True, timeout=self.lock_timeout):
+            EventLog(self.root).sync()
+            try:
+                fsync_path(self.root / "signals" / "current.json")
+            except FileNotFoundError:
+                pass
+        with self._cond:
+            self._last_sync = time.monotonic()
+            self._synced = ticket
+            self._error = None
+            self._cond.notify_all()
@@ -0,0 +1,348 @@
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from array import array
+from pathlib import Path
+
+from .store_utils import store_lock
+
+NGRAM = 3
+NAME_WEIGHT = 2.0
+# Rewrite the row log once superseded rows outnumber live ones by this much.
+COMPACT_SLACK_ROWS = 1000
+# Re-snapshot the arrays once this many rows were read from the log on top of the last snapshot.
+SNAPSHOT_EVERY_ROWS = 1000
+SNAPSHOT_VERSION = 1
+
+
+# Layout under .cache/:
+#   similarity-index.jsonl   append-only row log, one {"simple_name", "description"} per catalog change
+#   similarity-index.bin     JSON header line, then the matrix arrays as of header["log_offset"]
+def similarity_index_path(root: Path) -> Path:
+    return root / ".cache" / "similarity-index.jsonl"
+
+
+def similarity_snapshot_path(root: Path) -> Path:
+    return root / ".cache" / "similarity-index.bin"
+
+
+def text_features(simple_name: str, description: str = "") -> dict[int, float]:
+    # Character trigrams of each word, so "coding focused" matches "focused coding" and
+    # "heads-down coding" shares most of its grams with "heads down coding".
+    counts: dict[int, float] = {}
+    for weight, text in ((NAME_WEIGHT, simple_name.replace("-", " ")), (1.0, description)):
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            padded = f" {word} "
+            for i in range(max(len(padded) - NGRAM + 1, 1)):
+                feature = zlib.crc32(padded[i : i + NGRAM].encode("utf-8"))
+                counts[feature] = counts.get(feature, 0.0) + weight
+    return {feature: 1.0 + math.log(count) for feature, count in counts.items()}
+
+
+def append_index_rows(root: Path, entries: list[dict], catalog=None, previous: dict | None = None) -> None:
+    # Caller must hold store_lock. Called on every catalog upsert; the row log is append-only and
+    # skips entries whose text did not change, so republishing a state costs nothing here.
+    path = similarity_index_path(root)
+    if not path.exists() and catalog is not None:
+        entries = [{"simple_name": key, **entry} for key, entry in catalog.all().items()]
+    elif previous is not None:
+        entries = [
+            entry
+            for entry in entries
+            if entry["simple_name"] not in previous
+            or previous[entry["simple_name"]].get("description", "") != entry.get("description", "")
+        ]
+    if not entries:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as f:
+        f.write(
+            "".join(
+                json.dumps({"simple_name": entry["simple_name"], "description": entry.get("description", "")}) + "\n"
+                for entry in entries
+            )
+        )
+
+
+def reset_index(root: Path) -> None:
+    similarity_index_path(root).unlink(missing_ok=True)
+    similarity_snapshot_path(root).unlink(missing_ok=True)
+
+
+class SimilarityIndex:
+    # TF-IDF over character trigrams in array-backed sparse matrices: rows (CSR) to retire a
+    # superseded row, columns (CSC) to score a query. Columns from the snapshot are flat arrays;
+    # rows read from the log since then keep small per-feature arrays until the next snapshot.
+    # Row norms use the IDF in effect when the row was added.
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = similarity_index_path(root)
+        self.snapshot_path = similarity_snapshot_path(root)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.names: list[str] = []
+        self.row_of: dict[str, int] = {}
+        self.alive = array("b")
+        self.norms = array("d")
+        self.row_ptr = array("q", [0])
+        self.row_features = array("I")
+        self.row_weights = array("f")
+        self.column_of: dict[int, int] = {}
+        self.column_ptr = array("q", [0])
+        self.column_rows = array("i")
+        self.column_weights = array("f")
+        self.tail_postings: dict[int, tuple[array, array]] = {}
+        self.df: dict[int, int] = {}
+        self.offset = 0
+        self.inode = None
+        self.rows_since_snapshot = 0
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def _idf(self, feature: int) -> float:
+        return math.log((1 + len(self.row_of)) / (1 + self.df.get(feature, 0))) + 1.0
+
+    def _row_norm(self, row: int) -> float:
+        start, end = self.row_ptr[row], self.row_ptr[row + 1]
+        features = self.row_features[start:end]
+        weights = self.row_weights[start:end]
+        return math.sqrt(sum((weight * self._idf(feature)) ** 2 for feature, weight in zip(features, weights)))
+
+    def _add_row(self, simple_name: str, description: str, with_norm: bool = True) -> None:
+        old = self.row_of.get(simple_name)
+        if old is not None:
+            self.alive[old] = 0
+            for feature in self.row_features[self.row_ptr[old] : self.row_ptr[old + 1]]:
+                self.df[feature] -= 1
+        row = len(self.names)
+        features = text_features(simple_name, description)
+        self.names.append(simple_name)
+        self.row_of[simple_name] = row
+        self.alive.append(1)
+        self.row_features.extend(features)
+        self.row_weights.extend(features.values())
+        self.row_ptr.append(len(self.row_features))
+        df = self.df
+        postings = self.tail_postings
+        for feature, weight in features.items():
+            posting = postings.get(feature)
+            if posting is None:
+                posting = postings[feature] = (array("i"), array("f"))
+            posting[0].append(row)
+            posting[1].append(weight)
+            df[feature] = df.get(feature, 0) + 1
+        self.norms.append(self._row_norm(row) if with_norm else 0.0)
+        self.rows_since_snapshot += 1
+
+    def _load_snapshot(self, inode: int, size: int) -> None:
+        try:
+            with self.snapshot_path.open("rb") as f:
+                header = json.loads(f.readline())
+                if (
+                    header.get("version") != SNAPSHOT_VERSION
+                    or header["log_inode"] != inode
+                    or header["log_offset"] > size
+                ):
+                    return
+                rows, nnz, columns = header["rows"], header["nnz"], header["columns"]
+                arrays = {}
+                for name, typecode, count in (
+                    ("norms", "d", rows),
+                    ("row_ptr", "q", rows + 1),
+                    ("row_features", "I", nnz),
+                    ("row_weights", "f", nnz),
+                    ("column_features", "I", columns),
+                    ("column_ptr", "q", columns + 1),
+                    ("column_rows", "i", nnz),
+                    ("column_weights", "f", nnz),
+                ):
+                    arrays[name] = array(typecode)
+                    arrays[name].fromfile(f, count)
+        except (OSError, ValueError, KeyError, EOFError):
+            return
+        self.names = header["names"]
+        self.row_of = {name: row for row, name in enumerate(self.names)}
+        self.alive = array("b", [1]) * rows
+        self.norms = arrays["norms"]
+        self.row_ptr = arrays["row_ptr"]
+        self.row_features = arrays["row_features"]
+        self.row_weights = arrays["row_weights"]
+        self.column_ptr = column_ptr = arrays["column_ptr"]
+        self.column_rows = arrays["column_rows"]
+        self.column_weights = arrays["column_weights"]
+        self.column_of = {feature: i for i, feature in enumerate(arrays["column_features"])}
+        self.df = {feature: column_ptr[i + 1] - column_ptr[i] for feature, i in self.column_of.items()}
+        self.offset = header["log_offset"]
+
+    def _write_snapshot(self) -> None:
+        # Live rows only, renumbered; columns are rebuilt with a counting sort over the row arrays.
+        live = [row for row in range(len(self.names)) if self.alive[row]]
+        row_ptr = array("q", [0])
+        row_features = array("I")
+        row_weights = array("f")
+        for row in live:
+            start, end = self.row_ptr[row], self.row_ptr[row + 1]
+            row_features.extend(self.row_features[start:end])
+            row_weights.extend(self.row_weights[start:end])
+            row_ptr.append(len(row_features))
+        column_features = array("I", sorted(set(row_features)))
+        column_of = {feature: i for i, feature in enumerate(column_features)}
+        columns = [column_of[feature] for feature in row_features]
+        column_ptr = array("q", [0]) * (len(column_features) + 1)
+        for column in columns:
+            column_ptr[column + 1] += 1
+        for i in range(len(column_features)):
+            column_ptr[i + 1] += column_ptr[i]
+        fill = array("q", column_ptr)
+        column_rows = array("i", [0]) * len(row_features)
+        column_weights = array("f", [0.0]) * len(row_features)
+        for new_row in range(len(live)):
+            for i in range(row_ptr[new_row], row_ptr[new_row + 1]):
+                slot = fill[columns[i]]
+                fill[columns[i]] = slot + 1
+                column_rows[slot] = new_row
+                column_weights[slot] = row_weights[i]
+
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "log_inode": self.inode,
+            "log_offset": self.offset,
+            "rows": len(live),
+            "nnz": len(row_features),
+            "columns": len(column_features),
+            "names": [self.names[row] for row in live],
+        }
+        tmp = self.snapshot_path.with_name(f"{self.snapshot_path.name}.{os.getpid()}.tmp")
+        try:
+            with tmp.open("wb") as f:
+                f.write((json.dumps(header) + "\n").encode("utf-8"))
+                for values in (
+                    array("d", (self.norms[row] for row in live)),
+                    row_ptr,
+                    row_features,
+                    row_weights,
+                    column_features,
+                    column_ptr,
+                    column_rows,
+                    column_weights,
+                ):
+                    values.tofile(f)
+            os.replace(tmp, self.snapshot_path)
+        except OSError:
+            # Best-effort like the other caches; the row log stays the source of truth.
+            tmp.unlink(missing_ok=True)
+        self.rows_since_snapshot = 0
+
+    def refresh(self) -> None:
+        # Loads the snapshot once, then reads only what the row log gained since; a rewritten
+        # (compacted) log is reloaded whole.
+        with self._lock:
+            try:
+                st = self.path.stat()
+            except FileNotFoundError:
+                self._reset()
+                return
+            if st.st_ino != self.inode or st.st_size < self.offset:
+                self._reset()
+                self.inode = st.st_ino
+                self._load_snapshot(st.st_ino, st.st_size)
+            if st.st_size == self.offset:
+                return
+            initial = not self.names
+            with self.path.open("rb") as f:
+                f.seek(self.offset)
+                data = f.read(st.st_size - self.offset)
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                row = json.loads(line)
+                self._add_row(row["simple_name"], row.get("description", ""), with_norm=not initial)
+            self.offset += end
+            if initial:
+                # Norms of a cold load all use the final IDF.
+                for row in range(len(self.names)):
+                    self.norms[row] = self._row_norm(row)
+            if self.rows_since_snapshot >= SNAPSHOT_EVERY_ROWS:
+                self._write_snapshot()
+
+    def needs_compaction(self) -> bool:
+        return len(self.names) - len(self.row_of) > len(self.row_of) + COMPACT_SLACK_ROWS
+
+    def compact(self, catalog) -> None:
+        # Rewrites the log with one row per live catalog entry.
+        with store_lock(self.root):
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(
+                "".join(
+                    json.dumps({"simple_name": key, "description": entry.get("description", "")}) + "\n"
+                    for key, entry in catalog.all().items()
+                ),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self.path)
+        self.refresh()
+
+    def query(self, simple_name: str, description: str = "", top_k: int = 5) -> list[tuple[str, float]]:
+        with self._lock:
+            features = text_features(simple_name, description)
+            query = {feature: weight * self._idf(feature) for feature, weight in features.items()}
+            query_norm = math.sqrt(sum(weight * weight for weight in query.values()))
+            if not query_norm:
+                return []
+            scores: dict[int, float] = {}
+            for feature, query_weight in query.items():
+                scale = query_weight * self._idf(feature)
+                column = self.column_of.get(feature)
+                if column is not None:
+                    start, end = self.column_ptr[column], self.column_ptr[column + 1]
+                    for row, weight in zip(self.column_rows[start:end], self.column_weights[start:end]):
+                        scores[row] = scores.get(row, 0.0) + scale * weight
+                posting = self.tail_postings.get(feature)
+                if posting is not None:
+                    for row, weight in zip(*posting):
+                        scores[row] = scores.get(row, 0.0) + scale * weight
+            ranked = []
+            for row, score in scores.items():
+                if self.alive[row] and self.norms[row]:
+                    ranked.append((self.names[row], min(score / (query_norm * self.norms[row]), 1.0)))
+            ranked.sort(key=lambda item: -item[1])
+            return ranked[:top_k]
+
+
+_indexes: dict[Path, SimilarityIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def forget_similarity_index(root: Path) -> None:
+    # Drops this process's in-memory index for root; the files stay for the next load.
+    with _indexes_lock:
+        _indexes.pop(root.resolve(), None)
+
+
+def load_similarity_index(root: Path, catalog) -> SimilarityIndex:
+    # One index per root and process, so a daemon tails the row log instead of reloading it.
+    with _indexes_lock:
+        index = _indexes.setdefault(root.resolve(), SimilarityIndex(root))
+    if not index.path.exists():
+        with store_lock(root):
+            if not index.path.exists():
+                append_index_rows(root, [], catalog)
+    index.refresh()
+    if index.needs_compaction():
+        index.compact(catalog)
+    return index
+
+
+def similar_states(root: Path, catalog, simple_name: str, description: str = "", top_k: int = 5) -> list[dict]:
+    index = load_similarity_index(root, catalog)
+    candidates = []
+    for key, score in index.query(simple_name, description, top_k):
+        entry = catalog.get(key)
+        if entry:
+            candidates.append({"simple_name": key, "score": round(score, 4), "state": entry})
+    return candidates
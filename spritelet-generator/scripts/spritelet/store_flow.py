@@ -0,0 +1,125 @@
+from pathlib import Path
+
+# Store operations (publish, register, set-signal) are written once as generators that yield the
+# steps which block: lock acquisition, rate limit slots and image generation. run_sync() performs
+# each step in the calling thread; run_async() awaits it on the event loop, so the catalog, event
+# and signal logic between steps is shared by the scripts and the asyncio API.
+
+
+class Step:
+    # Each step defines run(), its blocking form; event loops default to running that in a thread.
+    async def run_async(self):
+        import asyncio
+
+        return await asyncio.to_thread(self.run)
+
+
+class Call(Step):
+    # Any blocking call with no native async form; event loops run it in a worker thread.
+    def __init__(self, function, *args, **kwargs) -> None:
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        return self.function(*self.args, **self.kwargs)
+
+
+class LockStore(Step):
+    # Result is the held StoreLock; the flow releases it with `with`.
+    def __init__(self, root: Path, shared: bool = False, timeout: float | None = None) -> None:
+        self.root = root
+        self.shared = shared
+        self.timeout = timeout
+
+    def _lock(self):
+        from .store_utils import StoreLock
+
+        return StoreLock(self.root, self.shared, self.timeout)
+
+    def run(self):
+        return self._lock().acquire()
+
+    async def run_async(self):
+        return await self._lock().acquire_async()
+
+
+class LockInflight(Step):
+    # Result is the held InflightLock; its `waited` flag says whether another publisher went first.
+    def __init__(self, root: Path, key: str, fingerprint: str) -> None:
+        self.root = root
+        self.key = key
+        self.fingerprint = fingerprint
+
+    def _lock(self):
+        from .store_utils import InflightLock
+
+        return InflightLock(self.root, self.key, self.fingerprint)
+
+    def run(self):
+        return self._lock().acquire()
+
+    async def run_async(self):
+        return await self._lock().acquire_async()
+
+
+class TakeGenerationSlot(Step):
+    def __init__(self, limiter, on_limit: str | None) -> None:
+        self.limiter = limiter
+        self.on_limit = on_limit
+
+    def run(self):
+        return self.limiter.acquire(self.on_limit)
+
+    async def run_async(self):
+        return await self.limiter.acquire_async(self.on_limit)
+
+
+class GenerateImage(Step):
+    # With a limiter, every retried POST takes another slot (TakeGenerationSlot covers the first).
+    def __init__(
+        self, model: str, api_key: str, endpoint: str, request_payload, out_path: Path, limiter=None, on_limit=None
+    ) -> None:
+        self.args = (model, api_key, endpoint, request_payload, out_path)
+        self.limiter = limiter
+        self.on_limit = on_limit
+
+    def run(self):
+        # The HTTP client (http.client, ssl, email) loads only when a publish actually generates.
+        from .generation_client import generate_image_to_file
+
+        before_retry = self.limiter and (lambda: self.limiter.acquire(self.on_limit, retry=True))
+        return generate_image_to_file(*self.args, before_retry)
+
+    async def run_async(self):
+        from .async_generation_client import generate_image_to_file_async
+
+        before_retry = self.limiter and (lambda: self.limiter.acquire_async(self.on_limit, retry=True))
+        return await generate_image_to_file_async(*self.args, before_retry)
+
+
+def run_sync(flow):
+    resume, value = flow.send, None
+    while True:
+        try:
+            step = resume(value)
+        except StopIteration as done:
+            return done.value
+        try:
+            resume, value = flow.send, step.run()
+        except BaseException as e:
+            # Raised inside the flow so its `with` blocks release whatever it holds.
+            resume, value = flow.throw, e
+
+
+async def run_async(flow):
+    resume, value = flow.send, None
+    while True:
+        try:
+            step = resume(value)
+        except StopIteration as done:
+            return done.value
+        try:
+            resume, value = flow.send, await step.run_async()
+        except BaseException as e:
+            resume, value = flow.throw, e
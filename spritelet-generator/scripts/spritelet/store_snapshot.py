@@ -0,0 +1,31 @@
+import time
+from pathlib import Path
+
+from .catalog_backend import open_catalog
+from .store_utils import JsonCache, load_json, store_generation, store_lock
+
+SNAPSHOT_ATTEMPTS = 10
+
+
+def _read_store(root: Path, cache: JsonCache | None) -> dict:
+    with open_catalog(root, cache, required=False) as catalog:
+        entries = catalog.all()
+    return {"current": load_json(root / "signals" / "current.json", {}, cache), "catalog": entries}
+
+
+def read_store_snapshot(root: Path, cache: JsonCache | None = None, attempts: int = SNAPSHOT_ATTEMPTS) -> dict:
+    # Catalog and current signal as of one committed generation, read without taking store_lock:
+    # the read is kept only if the generation was even (no writer inside) and unchanged afterwards.
+    # Every file read is whole because writers rename files into place; the generation check catches
+    # a commit landing between the two reads.
+    for attempt in range(attempts):
+        before = store_generation(root)
+        if before % 2 == 0:
+            snapshot = _read_store(root, cache)
+            if store_generation(root) == before:
+                return {"generation": before, "retries": attempt, **snapshot}
+        time.sleep(min(0.0005 * 2**attempt, 0.01))
+    # Writers kept the store busy, or one died mid-commit and left the generation odd:
+    # a shared lock waits out any writer and is always consistent.
+    with store_lock(root, shared=True):
+        return {"generation": store_generation(root), "retries": attempts, "locked": True, **_read_store(root, cache)}
@@ -0,0 +1,403 @@
+import hashlib
+import json
+import os
+import struct
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import fcntl
+
+from .metrics import count, lock_wait
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace('+00:00', 'Z')
+
+
+def normalize_simple_name(name: str) -> str:
+    return "-".join(name.strip().lower().split())
+
+
+class JsonCache:
+    # Keeps parsed JSON files in memory and re-reads them only when the file on disk changes.
+    def __init__(self) -> None:
+        self._entries: dict[Path, tuple[tuple[int, int, int], dict]] = {}
+
+    @staticmethod
+    def _stat_key(path: Path) -> tuple[int, int, int] | None:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def load(self, path: Path, default: dict) -> dict:
+        key = self._stat_key(path)
+        if key is None:
+            self._entries.pop(path, None)
+            return default
+        cached = self._entries.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        self._entries[path] = (key, payload)
+        return payload
+
+    def remember(self, path: Path, payload: dict) -> None:
+        key = self._stat_key(path)
+        if key is not None:
+            self._entries[path] = (key, payload)
+
+
+def load_json(path: Path, default: dict, cache: JsonCache | None = None) -> dict:
+    if cache is not None:
+        return cache.load(path, default)
+    if not path.exists():
+        return default
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def fsync_path(path: Path) -> None:
+    # Works for directories too, which is how a rename into them is made durable.
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: Path, payload: dict, durable: bool = False) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write(json.dumps(payload, indent=2) + "\n")
+        if durable:
+            # The data must reach disk before the rename does, or a crash can leave an empty file.
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if durable:
+        fsync_path(path.parent)
+
+
+# Temp files outside signals/ are written without store_lock (image downloads, caches), so only
+# ones untouched for this long are treated as orphaned.
+ORPHAN_TMP_GRACE_SECONDS = 600
+
+
+def remove_orphaned_tmp_files(root: Path) -> list[str]:
+    # Caller must hold store_lock. Removes temp files left by writers that crashed between writing
+    # and renaming; returns their paths relative to root.
+    removed = []
+    cutoff = time.time() - ORPHAN_TMP_GRACE_SECONDS
+    for directory, locked in (
+        (root / "signals", True),
+        (root / "signals" / "segments", False),
+        (root / "states", False),
+        (root / ".cache", False),
+    ):
+        if not directory.is_dir():
+            continue
+        for path in directory.glob("*.tmp"):
+            try:
+                # Under store_lock nobody is mid-write in signals/ or on the catalog; sealed segments
+                # are compressed without it.
+                if not (locked or path.name == "catalog.json.tmp") and path.stat().st_mtime > cutoff:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed.append(str(path.relative_to(root)))
+    return removed
+
+
+def append_jsonl(path: Path, payload: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(payload) + "\n")
+
+
+def ensure_state_relative_path(path_str: str) -> None:
+    if Path(path_str).is_absolute():
+        raise SystemExit("spritelet_path must be relative, not absolute")
+    normalized = path_str.replace('\\', '/')
+    if not normalized.startswith("states/"):
+        raise SystemExit("spritelet_path must stay inside states/")
+
+
+def resolve_store_path(root: Path, relative_path: str) -> Path:
+    ensure_state_relative_path(relative_path)
+    abs_path = (root / relative_path).resolve()
+    states_root = (root / "states").resolve()
+    if states_root not in abs_path.parents and abs_path != states_root:
+        raise SystemExit("spritelet_path escapes states/")
+    return abs_path
+
+
+STORE_GENERATION = struct.Struct("<Q")
+
+
+class LockTimeout(SystemExit):
+    def __init__(self, message: str, waited: float) -> None:
+        super().__init__(message)
+        self.waited = waited
+
+
+def default_lock_timeout() -> float | None:
+    # SPRITELET_LOCK_TIMEOUT bounds every store_lock wait (seconds); unset waits indefinitely.
+    value = os.environ.get("SPRITELET_LOCK_TIMEOUT", "")
+    return float(value) if value else None
+
+
+def flock_waits(fd: int, operation: int, timeout: float | None, description: str):
+    # Polls a non-blocking flock, yielding each backoff delay for the caller to sleep (time.sleep or
+    # asyncio.sleep); returns once the lock is held and raises LockTimeout after timeout seconds.
+    started = time.monotonic()
+    delay = 0.001
+    while True:
+        try:
+            fcntl.flock(fd, operation | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            waited = time.monotonic() - started
+            if timeout is not None and waited >= timeout:
+                count("spritelet_lock_timeouts_total", description)
+                raise LockTimeout(f"Timed out after {waited:.1f}s waiting for the {description} lock", waited)
+            yield delay if timeout is None else min(delay, timeout - waited)
+            delay = min(delay * 2, 0.05)
+
+
+def acquire_flock(fd: int, operation: int, timeout: float | None, description: str) -> None:
+    if timeout is None:
+        fcntl.flock(fd, operation)
+        return
+    for delay in flock_waits(fd, operation, timeout, description):
+        time.sleep(delay)
+
+
+def store_generation_path(root: Path) -> Path:
+    return root / ".locks" / "store.generation"
+
+
+def store_generation(root: Path) -> int:
+    # Seqlock counter bumped by every exclusive store_lock holder: odd while a writer is inside,
+    # even once it has finished.
+    try:
+        with store_generation_path(root).open("rb") as f:
+            data = f.read(STORE_GENERATION.size)
+    except FileNotFoundError:
+        return 0
+    return STORE_GENERATION.unpack(data)[0] if len(data) == STORE_GENERATION.size else 0
+
+
+class StoreLock:
+    # Exclusive for writers; shared holders only exclude writers. Lock-free readers use
+    # store_generation() instead (see store_snapshot.py). `with StoreLock(...)` blocks; event loops
+    # await acquire_async() first, which polls instead, and then enter the held lock.
+    def __init__(self, root: Path, shared: bool = False, timeout: float | None = None) -> None:
+        self.root = root
+        self.shared = shared
+        self.timeout = timeout if timeout is not None else default_lock_timeout()
+        self.description = "store_shared" if shared else "store"
+        self._lock_file = None
+        self._generation_fd = None
+        self._generation = 0
+
+    def _open(self) -> int:
+        lock_dir = self.root / ".locks"
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        self._lock_file = (lock_dir / "store.lock").open("w", encoding="utf-8")
+        return self._lock_file.fileno()
+
+    def _locked(self, started: float) -> "StoreLock":
+        lock_wait(self.description, time.perf_counter() - started)
+        if not self.shared:
+            # The counter is rewritten in place (not renamed) so readers always find one file.
+            self._generation_fd = os.open(store_generation_path(self.root), os.O_RDWR | os.O_CREAT, 0o644)
+            data = os.pread(self._generation_fd, STORE_GENERATION.size, 0)
+            current = STORE_GENERATION.unpack(data)[0] if len(data) == STORE_GENERATION.size else 0
+            # A writer that died mid-commit leaves an odd value; move on to the next odd one.
+            self._generation = current + 1 if current % 2 == 0 else current + 2
+            os.pwrite(self._generation_fd, STORE_GENERATION.pack(self._generation), 0)
+        return self
+
+    def _operation(self) -> int:
+        return fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+
+    def acquire(self) -> "StoreLock":
+        started = time.perf_counter()
+        fd = self._open()
+        try:
+            acquire_flock(fd, self._operation(), self.timeout, self.description)
+            return self._locked(started)
+        except BaseException:
+            # Closing the file also drops the flock.
+            self._lock_file.close()
+            self._lock_file = None
+            raise
+
+    async def acquire_async(self) -> "StoreLock":
+        import asyncio
+
+        started = time.perf_counter()
+        fd = self._open()
+        try:
+            for delay in flock_waits(fd, self._operation(), self.timeout, self.description):
+                await asyncio.sleep(delay)
+            return self._locked(started)
+        except BaseException:
+            self._lock_file.close()
+            self._lock_file = None
+            raise
+
+    def release(self) -> None:
+        try:
+            if self._generation_fd is not None:
+                try:
+                    os.pwrite(self._generation_fd, STORE_GENERATION.pack(self._generation + 1), 0)
+                finally:
+                    os.close(self._generation_fd)
+                    self._generation_fd = None
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def __enter__(self) -> "StoreLock":
+        return self if self._lock_file is not None else self.acquire()
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+def store_lock(root: Path, shared: bool = False, timeout: float | None = None) -> StoreLock:
+    return StoreLock(root, shared, timeout)
+
+
+_content_hashes: dict[str, tuple[list[int], str]] = {}
+
+
+def content_hash(root: Path, path: Path) -> str:
+    # sha256 of a file, cached in memory and in <root>/.cache/content-hashes.json keyed on
+    # (inode, size, mtime_ns) so unchanged multi-MB images are hashed once, not on every publish.
+    st = path.stat()
+    stat_key = [st.st_ino, st.st_size, st.st_mtime_ns]
+    abs_key = str(path.resolve())
+    cached = _content_hashes.get(abs_key)
+    if cached and cached[0] == stat_key:
+        return cached[1]
+
+    cache_path = root / ".cache" / "content-hashes.json"
+    try:
+        disk_cache = load_json(cache_path, {})
+    except (OSError, ValueError):
+        disk_cache = {}
+    entry = disk_cache.get(abs_key)
+    if entry and entry.get("stat") == stat_key:
+        _content_hashes[abs_key] = (stat_key, entry["sha256"])
+        return entry["sha256"]
+
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+    _content_hashes[abs_key] = (stat_key, value)
+    _store_content_hash(cache_path, abs_key, {"stat": stat_key, "sha256": value})
+    return value
+
+
+def _store_content_hash(cache_path: Path, abs_key: str, entry: dict) -> None:
+    # Best-effort. The file is re-read under its own small lock so concurrent publishers add to each
+    # other's entries instead of overwriting them, and each process writes its own temp file.
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with cache_path.with_suffix(".lock").open("w", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                disk_cache = json.loads(cache_path.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                disk_cache = {}
+            disk_cache[abs_key] = entry
+            tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(disk_cache, indent=2) + "\n", encoding="utf-8")
+            os.replace(tmp, cache_path)
+    except OSError:
+        pass
+
+
+class InflightLock:
+    # Single-flight guard for one generation. After acquiring, `waited` is True when another process
+    # or thread held the flight first, meaning its result should be in the catalog by now.
+    def __init__(self, root: Path, key: str, fingerprint: str) -> None:
+        inflight_dir = root / ".locks" / "inflight"
+        inflight_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256(f"{key}\0{fingerprint}".encode("utf-8")).hexdigest()[:24]
+        self.path = inflight_dir / f"{digest}.lock"
+        self.waited = False
+        self._lock_file = None
+
+    def _is_current(self, lock_file) -> bool:
+        # The previous holder unlinks the file on release; a lock on that stale inode does not count.
+        try:
+            if os.fstat(lock_file.fileno()).st_ino == self.path.stat().st_ino:
+                return True
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+        return False
+
+    def acquire(self) -> "InflightLock":
+        started = time.perf_counter()
+        while True:
+            lock_file = self.path.open("a", encoding="utf-8")
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.waited = True
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            if self._is_current(lock_file):
+                break
+        self._lock_file = lock_file
+        lock_wait("inflight", time.perf_counter() - started)
+        return self
+
+    async def acquire_async(self) -> "InflightLock":
+        import asyncio
+
+        started = time.perf_counter()
+        while True:
+            lock_file = self.path.open("a", encoding="utf-8")
+            try:
+                for delay in flock_waits(lock_file.fileno(), fcntl.LOCK_EX, None, "inflight"):
+                    self.waited = True
+                    await asyncio.sleep(delay)
+            except BaseException:
+                lock_file.close()
+                raise
+            if self._is_current(lock_file):
+                break
+        self._lock_file = lock_file
+        lock_wait("inflight", time.perf_counter() - started)
+        return self
+
+    def release(self) -> None:
+        self.path.unlink(missing_ok=True)
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+        self._lock_file.close()
+        self._lock_file = None
+
+    def __enter__(self) -> "InflightLock":
+        return self if self._lock_file is not None else self.acquire()
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+@contextmanager
+def inflight_lock(root: Path, key: str, fingerprint: str):
+    # Yields True when another process or thread held the flight first.
+    with InflightLock(root, key, fingerprint) as flight:
+        yield flight.waited
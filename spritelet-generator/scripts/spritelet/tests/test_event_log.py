@@ -0,0 +1,138 @@
+import json
+
+import pytest
+
+from spritelet import event_log
+from spritelet.event_log import EventLog, compress_sealed, read_index
+
+
+def event(i: int) -> dict:
+    return {"event": "signal", "spritelet_path": f"states/idle/{i:04d}.png", "updated_at": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}Z"}
+
+
+@pytest.fixture
+def small_index(monkeypatch):
+    monkeypatch.setattr(event_log, "INDEX_EVERY_BYTES", 256)
+
+
+def rotating_log(root, **settings) -> EventLog:
+    return EventLog(root, {"event_log": {"max_segment_bytes": 1024, **settings}})
+
+
+def fill(log: EventLog, count: int, batch: int = 3) -> None:
+    for start in range(0, count, batch):
+        log.append([event(i) for i in range(start, min(start + batch, count))])
+
+
+def test_append_numbers_events(tmp_path):
+    log = EventLog(tmp_path, {})
+    assert log.last_seq() is None
+    written = log.append([event(0), event(1)])
+    assert [e["seq"] for e in written] == [0, 1]
+    assert log.append([event(2)])[0]["seq"] == 2
+    assert log.last_seq() == 2
+    assert [e["seq"] for e in log.read()] == [0, 1, 2]
+    assert [e["seq"] for e in log.read(after_seq=0)] == [1, 2]
+    assert list(log.read(after_seq=2)) == []
+
+
+def test_rotation_keeps_seqs_contiguous(tmp_path, small_index):
+    log = rotating_log(tmp_path)
+    fill(log, 200)
+    segments = log.segments()
+    assert len(segments) > 3
+    assert [s[0] for s in segments] == sorted(s[0] for s in segments)
+    assert segments[-1][1] == log.active_path
+    assert [e["seq"] for e in log.read()] == list(range(200))
+    assert [e["spritelet_path"] for e in log.read()] == [event(i)["spritelet_path"] for i in range(200)]
+    assert log.last_seq() == 199
+
+
+@pytest.mark.parametrize("after_seq", [-1, 0, 17, 63, 64, 150, 198, 199])
+def test_read_after_seq_across_segments(tmp_path, small_index, after_seq):
+    log = rotating_log(tmp_path)
+    fill(log, 200)
+    assert [e["seq"] for e in log.read(after_seq=after_seq)] == list(range(after_seq + 1, 200))
+
+
+def test_read_since_across_segments(tmp_path, small_index):
+    log = rotating_log(tmp_path)
+    fill(log, 200)
+    since = event(130)["updated_at"]
+    assert [e["seq"] for e in log.read(since=since)] == list(range(130, 200))
+    assert [e["seq"] for e in log.read(after_seq=150, since=since)] == list(range(151, 200))
+
+
+def test_index_points_at_event_starts(tmp_path, small_index):
+    log = rotating_log(tmp_path)
+    fill(log, 200)
+    for first_seq, path, index_path in log.segments():
+        entries = read_index(index_path)
+        assert entries[0] == {"seq": first_seq, "updated_at": event(first_seq)["updated_at"], "offset": 0}
+        data = path.read_bytes()
+        for entry in entries:
+            line = data[entry["offset"]:].split(b"\n", 1)[0]
+            assert json.loads(line)["seq"] == entry["seq"]
+
+
+def test_compressed_segments_stay_readable(tmp_path, small_index):
+    log = rotating_log(tmp_path, compress_sealed=True)
+    fill(log, 200)
+    compress_sealed(tmp_path, {"event_log": {"compress_sealed": True}})
+    sealed = [path for _, path, _ in log.segments()[:-1]]
+    assert sealed and all(path.name.endswith(".jsonl.gz") for path in sealed)
+    assert not list(log.segments_dir.glob("*.tmp"))
+    assert [e["seq"] for e in log.read()] == list(range(200))
+    assert [e["seq"] for e in log.read(after_seq=100)] == list(range(101, 200))
+    assert log.compress_sealed_segments() == []
+
+
+def test_compress_during_read_yields_every_event(tmp_path, small_index):
+    log = rotating_log(tmp_path)
+    fill(log, 200)
+    events = log.read()
+    seqs = [next(events)["seq"]]
+    log.compress_sealed_segments()
+    seqs.extend(e["seq"] for e in events)
+    assert seqs == list(range(200))
+
+
+def test_rotation_during_read_yields_every_event(tmp_path, small_index):
+    log = rotating_log(tmp_path)
+    fill(log, 100)
+    events = log.read()
+    seqs = [next(events)["seq"]]
+    fill_more = EventLog(tmp_path, {"event_log": {"max_segment_bytes": 1024}})
+    for i in range(100, 200):
+        fill_more.append([event(i)])
+    seqs.extend(e["seq"] for e in events)
+    assert seqs == sorted(set(seqs))
+    assert seqs[:100] == list(range(100))
+
+
+def test_partial_last_line_is_left_for_the_next_read(tmp_path):
+    log = EventLog(tmp_path, {})
+    log.append([event(0), event(1)])
+    with log.active_path.open("ab") as f:
+        f.write(b'{"event": "sig')
+    assert [e["seq"] for e in log.read()] == [0, 1]
+
+
+def test_legacy_log_without_head_is_numbered_from_zero(tmp_path):
+    signals = tmp_path / "signals"
+    signals.mkdir()
+    (signals / "events.jsonl").write_text("".join(json.dumps(event(i)) + "\n" for i in range(5)), encoding="utf-8")
+    log = EventLog(tmp_path, {})
+    assert log.last_seq() == 4
+    assert [e["seq"] for e in log.read(after_seq=2)] == [3, 4]
+    assert log.append([event(5)])[0]["seq"] == 5
+    assert [e["seq"] for e in log.read()] == list(range(6))
+
+
+def test_reset_drops_segments(tmp_path, small_index):
+    log = rotating_log(tmp_path)
+    fill(log, 200)
+    written = log.reset([event(0)])
+    assert written[0]["seq"] == 0
+    assert len(log.segments()) == 1
+    assert [e["seq"] for e in log.read()] == [0]
@@ -0,0 +1,99 @@
+import base64
+import io
+import json
+import threading
+
+import pytest
+
+from spritelet.generation_client import InlineImageStreamer, extract_image_bytes, stream_image_response
+
+IMAGE = bytes(range(256)) * 40
+
+
+def response(image: bytes = IMAGE, key: str = "inlineData", escape_slashes: bool = False) -> bytes:
+    data = base64.b64encode(image).decode()
+    payload = {
+        "candidates": [
+            {
+                "content": {
+                    "parts": [
+                        {"text": "here you go", "data": "not an image"},
+                        {key: {"mimeType": "image/png", "data": ""}},
+                        {key: {"mimeType": "image/png", "data": data}},
+                    ]
+                },
+                "finishReason": "STOP",
+            }
+        ],
+        "usageMetadata": {"totalTokenCount": 1290},
+    }
+    text = json.dumps(payload, indent=1)
+    if escape_slashes:
+        text = text.replace("/", "\\/")
+    return text.encode()
+
+
+def stream(body: bytes, chunk_size: int) -> tuple[InlineImageStreamer, bytes]:
+    sink = io.BytesIO()
+    streamer = InlineImageStreamer(sink)
+    for i in range(0, len(body), chunk_size):
+        streamer.feed(body[i : i + chunk_size])
+    return streamer, sink.getvalue()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64, 1 << 20])
+@pytest.mark.parametrize("key", ["inlineData", "inline_data"])
+def test_streamer_decodes_first_image_at_any_chunk_boundary(chunk_size, key):
+    body = response(key=key)
+    streamer, written = stream(body, chunk_size)
+    assert streamer.found and streamer.done
+    assert written == IMAGE == extract_image_bytes(json.loads(body))
+    assert streamer.written == len(IMAGE)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 6, 1 << 20])
+def test_streamer_decodes_escaped_base64(chunk_size):
+    body = response(escape_slashes=True)
+    assert b"\\/" in body
+    streamer, written = stream(body, chunk_size)
+    assert streamer.found
+    assert written == IMAGE
+
+
+def test_streamer_stops_after_the_first_image():
+    body = response()
+    streamer, _ = stream(body, 1 << 20)
+    streamer.feed(b"garbage that is never parsed")
+    assert streamer.written == len(IMAGE)
+
+
+def test_streamer_without_image():
+    streamer, written = stream(json.dumps({"candidates": [{"content": {"parts": [{"text": "no"}]}}]}).encode(), 3)
+    assert not streamer.found
+    assert written == b""
+
+
+def test_stream_image_response_renames_complete_image(tmp_path):
+    out = tmp_path / "state.png"
+    out.write_bytes(b"old image")
+    stream_image_response(io.BytesIO(response()), out)
+    assert out.read_bytes() == IMAGE
+    assert [path.name for path in tmp_path.iterdir()] == ["state.png"]
+
+
+def test_stream_image_response_without_image_keeps_existing_file(tmp_path):
+    out = tmp_path / "state.png"
+    out.write_bytes(b"old image")
+    with pytest.raises(SystemExit, match="No image bytes"):
+        stream_image_response(io.BytesIO(b'{"candidates": []}'), out)
+    assert out.read_bytes() == b"old image"
+    assert [path.name for path in tmp_path.iterdir()] == ["state.png"]
+
+
+def test_stream_image_response_stop_abandons_image(tmp_path):
+    out = tmp_path / "state.png"
+    stop = threading.Event()
+    stop.set()
+    with pytest.raises(SystemExit, match="cancelled"):
+        stream_image_response(io.BytesIO(response()), out, stop)
+    assert list(tmp_path.iterdir()) == []
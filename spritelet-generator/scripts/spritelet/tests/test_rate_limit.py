@@ -0,0 +1,134 @@
+import pytest
+
+from spritelet import rate_limit
+from spritelet.rate_limit import GenerationLimiter, RateLimited, generation_limiter, rate_limit_settings
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0) -> None:
+        self.now = now
+        self.slept = []
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    monkeypatch.delenv("SPRITELET_RATE_LIMIT_DB", raising=False)
+    return clock
+
+
+def limiter(root, **settings) -> GenerationLimiter:
+    return generation_limiter(root, {"rate_limit": settings})
+
+
+def test_unlimited_profile_has_no_limiter(tmp_path):
+    assert generation_limiter(tmp_path, {}) is None
+    assert generation_limiter(tmp_path, {"rate_limit": {"on_limit": "fail"}}) is None
+    assert not (tmp_path / ".locks").exists()
+
+
+def test_settings_defaults():
+    settings = rate_limit_settings({"rate_limit": {"requests_per_minute": 10}})
+    assert settings["burst"] == 10
+    assert settings["scope"] == "root"
+    assert settings["on_limit"] == "wait"
+
+
+def test_unknown_scope_is_refused(tmp_path):
+    with pytest.raises(SystemExit, match="scope"):
+        limiter(tmp_path, requests_per_minute=1, scope="galaxy")
+
+
+def test_token_bucket_allows_burst_then_refills(tmp_path, clock):
+    bucket = limiter(tmp_path, requests_per_minute=60, burst=2)
+    assert bucket.try_acquire() == (0.0, "")
+    assert bucket.try_acquire() == (0.0, "")
+    wait, reason = bucket.try_acquire()
+    assert wait == pytest.approx(1.0)
+    assert "requests per minute" in reason
+    clock.now += 0.5
+    assert bucket.try_acquire()[0] == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.try_acquire() == (0.0, "")
+    # Refill is capped at the burst size.
+    clock.now += 3600
+    assert bucket.usage()["tokens_available"] == 2
+
+
+def test_bucket_is_shared_between_limiters(tmp_path, clock):
+    limiter(tmp_path, requests_per_minute=60, burst=1).try_acquire()
+    assert limiter(tmp_path, requests_per_minute=60, burst=1).try_acquire()[1]
+
+
+def test_acquire_waits_for_a_token(tmp_path, clock):
+    bucket = limiter(tmp_path, requests_per_minute=30, burst=1)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(2.0)
+    assert clock.slept == [pytest.approx(2.0)]
+
+
+def test_fail_mode_raises_with_retry_after(tmp_path, clock):
+    bucket = limiter(tmp_path, requests_per_minute=6, burst=1, on_limit="fail")
+    bucket.acquire()
+    with pytest.raises(RateLimited) as raised:
+        bucket.acquire()
+    assert raised.value.retry_after == pytest.approx(10.0)
+    assert clock.slept == []
+    assert bucket.usage()["history"][0]["rate_limited"] == 1
+
+
+def test_wait_mode_gives_up_past_max_wait(tmp_path, clock):
+    bucket = limiter(tmp_path, requests_per_minute=1, burst=1, max_wait_seconds=30)
+    bucket.acquire()
+    with pytest.raises(RateLimited, match="retry in 60s"):
+        bucket.acquire()
+
+
+def test_unknown_on_limit_mode_is_refused(tmp_path, clock):
+    with pytest.raises(SystemExit, match="on_limit"):
+        limiter(tmp_path, requests_per_minute=1).acquire("sometimes")
+
+
+def test_daily_budget_counts_recorded_images_only(tmp_path, clock):
+    bucket = limiter(tmp_path, daily_images=2, on_limit="fail")
+    for _ in range(5):
+        bucket.acquire()
+    bucket.record_image()
+    bucket.acquire()
+    bucket.record_image()
+    with pytest.raises(RateLimited, match="daily image budget"):
+        bucket.acquire()
+    # Retries of an attempt that already passed the daily check are not refused.
+    assert bucket.acquire(retry=True) == 0.0
+    usage = bucket.usage()
+    assert usage["used_today"] == 2
+    assert usage["remaining_today"] == 0
+    clock.now += 86400
+    assert bucket.acquire() == 0.0
+
+
+def test_usage_does_not_create_the_database(tmp_path, clock):
+    bucket = limiter(tmp_path, requests_per_minute=10)
+    usage = bucket.usage()
+    assert usage["used_today"] == 0
+    assert usage["tokens_available"] == 10
+    assert not bucket.path.exists()
+
+
+def test_api_key_scope_shares_one_file_per_key(tmp_path, clock, monkeypatch):
+    monkeypatch.setenv("SPRITELET_RATE_LIMIT_DB", str(tmp_path / "shared.sqlite"))
+    first = generation_limiter(tmp_path / "a", {"rate_limit": {"requests_per_minute": 60, "burst": 1, "scope": "api_key"}}, "k1")
+    second = generation_limiter(tmp_path / "b", {"rate_limit": {"requests_per_minute": 60, "burst": 1, "scope": "api_key"}}, "k1")
+    other = generation_limiter(tmp_path / "b", {"rate_limit": {"requests_per_minute": 60, "burst": 1, "scope": "api_key"}}, "k2")
+    assert first.bucket == second.bucket != other.bucket
+    assert first.try_acquire() == (0.0, "")
+    assert second.try_acquire()[1]
+    assert other.try_acquire() == (0.0, "")
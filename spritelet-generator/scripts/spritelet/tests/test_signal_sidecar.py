@@ -0,0 +1,103 @@
+import os
+import threading
+
+import pytest
+
+from spritelet import signal_sidecar
+from spritelet.signal_sidecar import SEQ, SEQ_OFFSET, SIDECAR_BYTES, SignalReader, sidecar_path, sidecar_seq, write_sidecar
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "signals").mkdir()
+    return tmp_path
+
+
+def set_seq(root, seq):
+    fd = os.open(sidecar_path(root), os.O_RDWR)
+    try:
+        os.pwrite(fd, SEQ.pack(seq), SEQ_OFFSET)
+    finally:
+        os.close(fd)
+
+
+def test_write_sidecar_advances_even_seq(root):
+    assert sidecar_seq(root) is None
+    assert write_sidecar(root, "states/idle/a.png", 1) == 2
+    assert write_sidecar(root, "states/idle/b.png", 2) == 4
+    assert sidecar_seq(root) == 4
+    assert sidecar_path(root).stat().st_size == SIDECAR_BYTES
+    assert not sidecar_path(root).with_name("current.bin.tmp").exists()
+
+
+def test_reader_sees_updates_through_the_mapping(root):
+    write_sidecar(root, "states/idle/a.png", 10)
+    with SignalReader(root) as reader:
+        assert reader.changed()
+        assert reader.read() == {"seq": 2, "spritelet_path": "states/idle/a.png", "updated_ns": 10}
+        assert not reader.changed()
+        write_sidecar(root, "states/happy/é.png", 11)
+        assert reader.changed()
+        assert reader.read() == {"seq": 4, "spritelet_path": "states/happy/é.png", "updated_ns": 11}
+        # A shorter path must not leave bytes of the longer one behind.
+        write_sidecar(root, "s.png", 12)
+        assert reader.read()["spritelet_path"] == "s.png"
+
+
+def test_write_after_dead_writer_skips_to_next_odd_seq(root):
+    write_sidecar(root, "states/idle/a.png")
+    set_seq(root, 5)
+    assert write_sidecar(root, "states/idle/b.png") == 8
+    with SignalReader(root) as reader:
+        assert reader.read()["spritelet_path"] == "states/idle/b.png"
+
+
+def test_reader_gives_up_on_stuck_odd_seq(root, monkeypatch):
+    write_sidecar(root, "states/idle/a.png")
+    set_seq(root, 3)
+    monkeypatch.setattr(signal_sidecar.time, "sleep", lambda seconds: None)
+    with SignalReader(root) as reader, pytest.raises(SystemExit, match="mid-update"):
+        reader.read()
+
+
+def test_reader_never_sees_a_torn_path(root):
+    paths = [f"states/{name}/{name * 20}.png" for name in ("a", "bb", "ccc")]
+    write_sidecar(root, paths[0])
+    stop = threading.Event()
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            write_sidecar(root, paths[i % len(paths)])
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        with SignalReader(root) as reader:
+            seqs = []
+            for _ in range(2000):
+                record = reader.read()
+                assert record["spritelet_path"] in paths
+                assert record["seq"] % 2 == 0
+                seqs.append(record["seq"])
+    finally:
+        stop.set()
+        thread.join()
+    assert seqs == sorted(seqs)
+
+
+def test_reader_rejects_missing_or_foreign_file(root):
+    with pytest.raises(SystemExit, match="Missing"):
+        SignalReader(root)
+    sidecar_path(root).write_bytes(b"JUNK" + bytes(SIDECAR_BYTES - 4))
+    with pytest.raises(SystemExit, match="not a version"):
+        SignalReader(root)
+    sidecar_path(root).write_bytes(b"SPRT")
+    with pytest.raises(SystemExit, match="shorter"):
+        SignalReader(root)
+
+
+def test_path_longer_than_the_page_is_refused(root):
+    with pytest.raises(SystemExit, match="longer than"):
+        write_sidecar(root, "x" * SIDECAR_BYTES)
@@ -0,0 +1 @@
+# Optional tools; each one with a main() also runs as scripts/optional-tools/<module>.py.
@@ -0,0 +1,230 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+
+from ..catalog_backend import JsonCatalog, SqliteCatalog, open_catalog
+from ..event_log import EventLog, compress_sealed
+from ..metrics import operation, span
+from ..publish_spritelet_state import (
+    DEFAULT_API_KEY_ENV,
+    DEFAULT_ENDPOINT,
+    DEFAULT_MODEL,
+    describe_images,
+    generate_state_image,
+    load_profile,
+    plan_state,
+    resolve_api_key,
+    resolve_catalog_state,
+    upsert_catalog_entries,
+)
+from ..signal_writer import write_current
+from ..store_utils import (
+    JsonCache,
+    content_hash,
+    inflight_lock,
+    normalize_simple_name,
+    store_lock,
+    utc_now,
+)
+
+
+def read_manifest(path: str) -> list[dict]:
+    if path == "-":
+        text = sys.stdin.read()
+        is_csv = False
+    else:
+        manifest_path = Path(path)
+        if not manifest_path.exists():
+            raise SystemExit(f"Manifest not found: {manifest_path}")
+        text = manifest_path.read_text(encoding="utf-8")
+        is_csv = manifest_path.suffix.lower() == ".csv"
+
+    if is_csv:
+        rows = list(csv.DictReader(text.splitlines()))
+    else:
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    items = []
+    for number, row in enumerate(rows, start=1):
+        simple_name = (row.get("simple_name") or "").strip()
+        description = (row.get("description") or "").strip()
+        if not simple_name or not description:
+            raise SystemExit(f"Manifest row {number} needs simple_name and description")
+        items.append({"simple_name": simple_name, "description": description})
+    return items
+
+
+def commit_batch(
+    root: Path,
+    catalog: JsonCatalog | SqliteCatalog,
+    results: list[dict],
+    now: str,
+    publish_last: bool,
+    base_image_sha256: str,
+) -> None:
+    with store_lock(root):
+        upsert_catalog_entries(catalog, results, now, base_image_sha256)
+        events = []
+        for result in results:
+            event = {
+                "type": "state_catalog_upserted",
+                "simple_name": result["simple_name"],
+                "spritelet_path": result["spritelet_path"],
+                "reused": result["reused"],
+                "updated_at": now,
+            }
+            if result.get("coalesced"):
+                event["coalesced"] = True
+            if result.get("prewarmed"):
+                event["prewarmed"] = True
+            events.append(event)
+        if publish_last:
+            last = results[-1]
+            write_current(root, {"spritelet_path": last["spritelet_path"], "updated_at": now})
+            events.append(
+                {
+                    "type": "state_published",
+                    "simple_name": last["simple_name"],
+                    "spritelet_path": last["spritelet_path"],
+                    "description": last["description"],
+                    "reused": last["reused"],
+                    "updated_at": now,
+                }
+            )
+        EventLog(root).append(events)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reuse or generate many Spritelet states and commit them to the catalog at once")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--manifest", required=True, help="JSONL or .csv file of simple_name/description pairs, or '-' for JSONL on stdin")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent generation requests (default: 4)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT)
+    parser.add_argument("--api-key-env", default=DEFAULT_API_KEY_ENV)
+    parser.add_argument("--aspect-ratio", default="1:1", help="Output image aspect ratio (default: 1:1)")
+    parser.add_argument("--image-size", default="1K", help="Output image size tier (default: 1K)")
+    parser.add_argument("--force-generate", action="store_true", help="Regenerate every manifest state")
+    parser.add_argument(
+        "--publish-last",
+        action="store_true",
+        help="Also point signals/current.json at the last successful manifest state",
+    )
+    args = parser.parse_args()
+    if args.workers < 1:
+        raise SystemExit("--workers must be at least 1")
+
+    started = time.monotonic()
+    root = Path(args.root)
+    cache = JsonCache()
+    profile, base_image = load_profile(root, cache)
+    base_image_sha256 = content_hash(root, base_image)
+    catalog = open_catalog(root, cache, required=False)
+
+    results = []
+    seen = set()
+    for item in read_manifest(args.manifest):
+        key = normalize_simple_name(item["simple_name"])
+        result = {"simple_name": key, "description": item["description"]}
+        if key in seen:
+            result["error"] = "duplicate simple_name in manifest"
+        seen.add(key)
+        results.append(result)
+
+    misses = []
+    for result in results:
+        if "error" in result:
+            continue
+        state = catalog.get(result["simple_name"])
+        try:
+            result["reused"] = plan_state(root, base_image, state, args.force_generate, base_image_sha256)
+        except SystemExit as e:
+            result["error"] = str(e.code)
+            continue
+        if result["reused"]:
+            result["spritelet_path"] = state["spritelet_path"]
+            result["seconds"] = 0.0
+        else:
+            misses.append((result, state))
+
+    if misses:
+        api_key = resolve_api_key(None, args.api_key_env)
+    # Flight locks stay held until the catalog commit so other publishers coalesce onto our results.
+    # They are all taken up front in name order, so two batches sharing states cannot deadlock.
+    flights = ExitStack()
+    waited = {}
+
+    def generate(miss: tuple[dict, dict | None]) -> None:
+        result, state = miss
+        item_started = time.monotonic()
+        try:
+            if waited[result["simple_name"]]:
+                _, state = resolve_catalog_state(catalog, result["simple_name"])
+                if plan_state(root, base_image, state, False, base_image_sha256):
+                    result.update(reused=True, coalesced=True, spritelet_path=state["spritelet_path"])
+                    return
+            result["spritelet_path"] = generate_state_image(
+                root,
+                profile,
+                base_image,
+                result["simple_name"],
+                result["description"],
+                state,
+                api_key,
+                model=args.model,
+                endpoint=args.endpoint,
+                aspect_ratio=args.aspect_ratio,
+                image_size=args.image_size,
+            )
+        except (SystemExit, Exception) as e:
+            result["error"] = str(e.code) if isinstance(e, SystemExit) else f"{type(e).__name__}: {e}"
+        finally:
+            result["seconds"] = round(time.monotonic() - item_started, 3)
+
+    with operation(root, "batch_publish"), catalog, flights:
+        for result, _ in sorted(misses, key=lambda miss: miss[0]["simple_name"]):
+            waited[result["simple_name"]] = flights.enter_context(
+                inflight_lock(root, result["simple_name"], base_image_sha256)
+            )
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(generate, misses))
+
+        committed = [result for result in results if "error" not in result]
+        now = utc_now()
+        if committed:
+            with span("commit"):
+                commit_batch(root, catalog, committed, now, args.publish_last, base_image_sha256)
+        # Decoding waits until every flight is released, so coalesced publishers are not held up.
+        flights.close()
+        generated = [result for result in committed if not result["reused"]]
+        if generated:
+            flagged = describe_images(root, profile, catalog, generated)
+            for result in generated:
+                if result["simple_name"] in flagged:
+                    result["near_duplicates"] = flagged[result["simple_name"]]
+    compress_sealed(root, profile)
+
+    failed = len(results) - len(committed)
+    print(
+        json.dumps(
+            {
+                "committed": len(committed),
+                "reused": sum(1 for result in committed if result["reused"]),
+                "generated": sum(1 for result in committed if not result["reused"]),
+                "failed": failed,
+                "seconds": round(time.monotonic() - started, 3),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
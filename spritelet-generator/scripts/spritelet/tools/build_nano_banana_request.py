@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from ..publish_spritelet_state import build_prompt, load_profile
+from ..request_payload import BASE_IMAGE_TRANSFERS, base_image_transfer_settings, build_generation_request
+from ..store_utils import load_json
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build an image generation API request JSON from Spritelet state")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--simple-name", required=True, help="Simple state name")
+    parser.add_argument("--description", required=True, help="State description")
+    parser.add_argument("--base-image", help="Override base image path")
+    parser.add_argument("--model", default="models/gemini-3-pro-image-preview", help="Model name")
+    parser.add_argument("--output", default="-", help="Write JSON to file path or '-' for stdout")
+    parser.add_argument(
+        "--base-image-transfer",
+        choices=BASE_IMAGE_TRANSFERS,
+        help="inline embeds base64; file uploads once and references the handle (default: from spritelet.json, else inline)",
+    )
+    parser.add_argument("--api-key-env", default="SPRITELET_GOOGLE_API_KEY", help="API key env var, needed for file transfer")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    if args.base_image:
+        profile = load_json(root / "spritelet.json", {})
+        base_image_path = Path(args.base_image)
+        if not base_image_path.is_absolute():
+            base_image_path = (root / base_image_path).resolve()
+        if not base_image_path.exists():
+            raise SystemExit(f"Base image not found: {base_image_path}")
+    else:
+        profile, base_image_path = load_profile(root)
+
+    transfer = args.base_image_transfer or base_image_transfer_settings(profile)[0]
+    api_key = os.environ.get(args.api_key_env, "")
+    if transfer == "file" and not api_key:
+        raise SystemExit(f"Missing API key env var: {args.api_key_env}")
+
+    pieces = build_generation_request(
+        root,
+        profile,
+        base_image_path,
+        build_prompt(profile, args.simple_name, args.description),
+        args.model,
+        {"response_modalities": ["IMAGE"]},
+        api_key=api_key,
+        transfer=transfer,
+        indent=2,
+    )
+
+    if args.output == "-":
+        for piece in pieces:
+            sys.stdout.buffer.write(piece)
+        sys.stdout.buffer.write(b"\n")
+    else:
+        with Path(args.output).open("wb") as f:
+            f.writelines(pieces)
+            f.write(b"\n")
+        print(f"Wrote {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
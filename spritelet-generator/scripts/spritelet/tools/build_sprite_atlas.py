@@ -0,0 +1,321 @@
+import argparse
+import fcntl
+import json
+import os
+import time
+from pathlib import Path
+
+from ..catalog_backend import open_catalog
+from ..event_log import EventLog
+from ..image_derivatives import (
+    UnsupportedImage,
+    decode_png,
+    derivative_settings,
+    downscale,
+    encode_png,
+    read_image,
+    variants_dir_rel,
+)
+from ..metrics import operation, span
+from ..signal_watch import SignalWatcher
+from ..store_utils import JsonCache, acquire_flock, atomic_write_json, default_lock_timeout, load_json, resolve_store_path, utc_now
+
+ATLAS_VERSION = 1
+DEFAULT_SPRITE_SIZE = 128
+DEFAULT_MAX_SHEET_SIZE = 2048
+DEFAULT_PADDING = 2
+# Catalog changes that can add, replace or remove a state image, or add its variants.
+REPACK_EVENTS = ("state_published", "state_catalog_upserted", "state_image_described", "state_initialized")
+
+
+# Layout under states/atlas/:
+#   atlas.json            index: sheets, one rectangle per state image, and simple_name -> rectangle
+#   sheet-<n>.r<rev>.png  RGBA sheets; a sheet gets a new file name whenever its pixels change, so
+#                         HTTP caches never serve a stale sheet for a new index
+# Each image keeps its rectangle for as long as its size does: replacing an image repaints its
+# rectangle, removing one frees it for the next image that fits, and only sheets whose pixels
+# changed are re-encoded.
+def atlas_dir(root: Path) -> Path:
+    return root / "states" / "atlas"
+
+
+def atlas_index_path(root: Path) -> Path:
+    return atlas_dir(root) / "atlas.json"
+
+
+def to_rgba(width: int, height: int, channels: int, pixels: bytes) -> bytes:
+    if channels == 4:
+        return pixels
+    rgba = bytearray(width * height * 4)
+    if channels == 3:
+        for channel in range(3):
+            rgba[channel::4] = pixels[channel::3]
+        rgba[3::4] = b"\xff" * (width * height)
+    else:
+        for channel in range(3):
+            rgba[channel::4] = pixels[::channels]
+        rgba[3::4] = pixels[1::2] if channels == 2 else b"\xff" * (width * height)
+    return bytes(rgba)
+
+
+def sprite_pixels(root: Path, spritelet_path: str, size: int | None) -> tuple[int, int, bytes]:
+    # A variant of exactly this size is used when it is current; otherwise the image is decoded at
+    # the smallest scale that still covers size and box-filtered down.
+    source = resolve_store_path(root, spritelet_path)
+    if size:
+        variant = root / variants_dir_rel(spritelet_path) / f"{size}.png"
+        try:
+            if variant.stat().st_mtime_ns >= source.stat().st_mtime_ns:
+                width, height, channels, pixels = decode_png(variant.read_bytes())
+                return width, height, to_rgba(width, height, channels, pixels)
+        except FileNotFoundError:
+            pass
+    width, height, channels, pixels = read_image(source, size)
+    if size:
+        width, height, channels, pixels = downscale(width, height, channels, pixels, size)
+    return width, height, to_rgba(width, height, channels, pixels)
+
+
+def allocate(sheets: list[dict], width: int, height: int, max_sheet_size: int, padding: int) -> tuple[int, int, int]:
+    # (sheet, x, y) for a width x height sprite: a freed rectangle it fits, else room on a shelf
+    # (a row of sprites no taller than its first), else a new shelf, else a new sheet.
+    for number, sheet in enumerate(sheets):
+        for i, (x, y, free_width, free_height) in enumerate(sheet["free"]):
+            if width <= free_width and height <= free_height:
+                sheet["free"].pop(i)
+                return number, x, y
+        for shelf in sheet["shelves"]:
+            y, shelf_height, x_end = shelf
+            if height <= shelf_height and x_end + width + padding <= max_sheet_size:
+                shelf[2] = x_end + width + padding
+                return number, x_end, y
+        bottom = sheet["shelves"][-1][0] + sheet["shelves"][-1][1] + padding if sheet["shelves"] else padding
+        if bottom + height + padding <= max_sheet_size:
+            sheet["shelves"].append([bottom, height, padding + width + padding])
+            return number, padding, bottom
+    sheets.append({"spritelet_path": None, "width": 0, "height": 0, "bytes": 0, "shelves": [], "free": []})
+    return allocate(sheets, width, height, max_sheet_size, padding)
+
+
+def sheet_extent(sheet: dict, padding: int) -> tuple[int, int]:
+    if not sheet["shelves"]:
+        return 0, 0
+    return (
+        max(x_end for _, _, x_end in sheet["shelves"]),
+        sheet["shelves"][-1][0] + sheet["shelves"][-1][1] + padding,
+    )
+
+
+def load_sheet(root: Path, sheet: dict, width: int, height: int) -> bytearray:
+    # The sheet's current pixels on a width x height canvas; a sheet only ever grows.
+    canvas = bytearray(width * height * 4)
+    if not sheet["spritelet_path"]:
+        return canvas
+    old_width, old_height, channels, pixels = decode_png(resolve_store_path(root, sheet["spritelet_path"]).read_bytes())
+    pixels = to_rgba(old_width, old_height, channels, pixels)
+    for y in range(min(old_height, height)):
+        canvas[y * width * 4 : y * width * 4 + old_width * 4] = pixels[y * old_width * 4 : (y + 1) * old_width * 4]
+    return canvas
+
+
+def paste(canvas: bytearray, canvas_width: int, x: int, y: int, width: int, height: int, rgba: bytes | None) -> None:
+    # Copies rgba into the rectangle, or clears it when rgba is None.
+    row = bytes(width * 4)
+    for line in range(height):
+        start = ((y + line) * canvas_width + x) * 4
+        canvas[start : start + width * 4] = row if rgba is None else rgba[line * width * 4 : (line + 1) * width * 4]
+
+
+def update_atlas(
+    root: Path,
+    size: int | None = None,
+    max_sheet_size: int | None = None,
+    padding: int | None = None,
+    rebuild: bool = False,
+    cache: JsonCache | None = None,
+) -> dict:
+    # Brings states/atlas/ in line with the catalog. Parameters default to the ones the atlas was
+    # built with (size: the smallest configured derivative size, else 128; 0 packs full-size
+    # images); changing any of them rebuilds every sheet.
+    started = time.monotonic()
+    lock_dir = root / ".locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with (lock_dir / "atlas.lock").open("w", encoding="utf-8") as lock_file:
+        acquire_flock(lock_file.fileno(), fcntl.LOCK_EX, default_lock_timeout(), "atlas")
+        index = load_json(atlas_index_path(root), {})
+        if index.get("version") != ATLAS_VERSION:
+            index = {}
+        if size is None:
+            sizes = derivative_settings(load_json(root / "spritelet.json", {}, cache))["sizes"]
+            size = index.get("size", sizes[0] if sizes else DEFAULT_SPRITE_SIZE)
+        max_sheet_size = max_sheet_size or index.get("max_sheet_size", DEFAULT_MAX_SHEET_SIZE)
+        padding = index.get("padding", DEFAULT_PADDING) if padding is None else padding
+        params = {"size": size, "max_sheet_size": max_sheet_size, "padding": padding}
+        # Revisions keep counting across rebuilds so a sheet file name is never reused.
+        previous_revision = index.get("revision", 0)
+        if rebuild or any(index.get(key) != value for key, value in params.items()):
+            index = {}
+        sheets = index.get("sheets", [])
+        images = index.get("images", {})
+
+        with span("catalog_lookup"), open_catalog(root, cache, required=False) as catalog:
+            states = catalog.all()
+        current = {}
+        for key, state in states.items():
+            try:
+                st = resolve_store_path(root, state["spritelet_path"]).stat()
+            except FileNotFoundError:
+                continue
+            current.setdefault(state["spritelet_path"], (st.st_mtime_ns, st.st_size))
+
+        dirty = set()
+        cleared = []
+        removed = [path for path in images if path not in current]
+        for path in removed:
+            placed = images.pop(path)
+            sheets[placed["sheet"]]["free"].append([placed["x"], placed["y"], placed["width"], placed["height"]])
+            cleared.append(placed)
+            dirty.add(placed["sheet"])
+
+        painted = {}
+        skipped = {}
+        with span("decode"):
+            for path, (mtime_ns, nbytes) in sorted(current.items()):
+                placed = images.get(path)
+                if placed and (placed["mtime_ns"], placed["bytes"]) == (mtime_ns, nbytes):
+                    continue
+                try:
+                    painted[path] = sprite_pixels(root, path, size)
+                except UnsupportedImage as e:
+                    skipped[path] = str(e)
+                    continue
+                width, height, _ = painted[path]
+                if width + 2 * padding > max_sheet_size or height + 2 * padding > max_sheet_size:
+                    del painted[path]
+                    skipped[path] = f"{width}x{height} does not fit a {max_sheet_size}px sheet"
+
+        # Stale images whose size changed, or that can no longer be read, give up their rectangle.
+        for path in painted.keys() | skipped.keys():
+            placed = images.get(path)
+            if placed and (path in skipped or (placed["width"], placed["height"]) != painted[path][:2]):
+                images.pop(path)
+                sheets[placed["sheet"]]["free"].append([placed["x"], placed["y"], placed["width"], placed["height"]])
+                cleared.append(placed)
+                dirty.add(placed["sheet"])
+        added = [path for path in painted if path not in images]
+        # Tallest first packs shelves tighter.
+        for path in sorted(added, key=lambda path: (-painted[path][1], path)):
+            width, height, _ = painted[path]
+            number, x, y = allocate(sheets, width, height, max_sheet_size, padding)
+            images[path] = {"sheet": number, "x": x, "y": y, "width": width, "height": height}
+        for path in painted:
+            images[path].update(mtime_ns=current[path][0], bytes=current[path][1])
+            dirty.add(images[path]["sheet"])
+
+        revision = previous_revision + (1 if dirty or not index else 0)
+        out_dir = atlas_dir(root)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with span("encode"):
+            for number in sorted(dirty):
+                sheet = sheets[number]
+                width, height = sheet_extent(sheet, padding)
+                canvas = load_sheet(root, sheet, width, height)
+                for placed in cleared:
+                    if placed["sheet"] == number:
+                        paste(canvas, width, placed["x"], placed["y"], placed["width"], placed["height"], None)
+                for path, (_, _, rgba) in painted.items():
+                    placed = images[path]
+                    if placed["sheet"] == number:
+                        paste(canvas, width, placed["x"], placed["y"], placed["width"], placed["height"], rgba)
+                target = out_dir / f"sheet-{number}.r{revision}.png"
+                tmp = target.with_name(target.name + ".tmp")
+                data = encode_png(width, height, 4, bytes(canvas))
+                tmp.write_bytes(data)
+                os.replace(tmp, target)
+                sheet.update(spritelet_path=f"states/atlas/{target.name}", width=width, height=height, bytes=len(data))
+        # Trailing sheets left without images are dropped; earlier ones keep their numbers.
+        used = {placed["sheet"] for placed in images.values()}
+        while sheets and len(sheets) - 1 not in used:
+            sheets.pop()
+
+        index = {
+            "version": ATLAS_VERSION,
+            **params,
+            "revision": revision,
+            "updated_at": utc_now() if dirty or not index else index.get("updated_at", utc_now()),
+            "sheets": sheets,
+            "images": images,
+            "sprites": {
+                key: {field: images[state["spritelet_path"]][field] for field in ("sheet", "x", "y", "width", "height")}
+                for key, state in sorted(states.items())
+                if state["spritelet_path"] in images
+            },
+        }
+        atomic_write_json(atlas_index_path(root), index)
+        # Sheet files the new index no longer names; readers of the previous index may still be
+        # fetching them, so these go last.
+        live = {sheet["spritelet_path"].rsplit("/", 1)[1] for sheet in sheets if sheet["spritelet_path"]}
+        for path in out_dir.glob("sheet-*.png"):
+            if path.name not in live:
+                path.unlink(missing_ok=True)
+
+    return {
+        "revision": revision,
+        "sheets": len(sheets),
+        "sprites": len(index["sprites"]),
+        "added": len(added),
+        "repainted": len(painted) - len(added),
+        "removed": len(removed),
+        "encoded_sheets": len(dirty),
+        "skipped": skipped,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pack every catalog state image into sprite sheets with a JSON index")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument(
+        "--size",
+        type=int,
+        help=f"Longest sprite edge in pixels, 0 for full-size images (default: the atlas's current size, else the "
+        f"smallest spritelet.json derivatives size, else {DEFAULT_SPRITE_SIZE})",
+    )
+    parser.add_argument(
+        "--max-sheet-size", type=int, help=f"Longest sheet edge in pixels (default: {DEFAULT_MAX_SHEET_SIZE})"
+    )
+    parser.add_argument("--padding", type=int, help=f"Transparent pixels around each sprite (default: {DEFAULT_PADDING})")
+    parser.add_argument("--rebuild", action="store_true", help="Repack every image instead of updating the atlas")
+    parser.add_argument("--follow", action="store_true", help="Keep running and update after every catalog change")
+    args = parser.parse_args()
+    if args.size is not None and args.size < 0:
+        raise SystemExit("--size must be 0 or more")
+    if args.padding is not None and args.padding < 0:
+        raise SystemExit("--padding must be 0 or more")
+
+    root = Path(args.root)
+    cache = JsonCache()
+    log = EventLog(root)
+    params = {"size": args.size, "max_sheet_size": args.max_sheet_size, "padding": args.padding}
+    with SignalWatcher(root) as watcher:
+        try:
+            rebuild = args.rebuild
+            while True:
+                after_seq = log.last_seq()
+                with operation(root, "atlas"):
+                    result = update_atlas(root, rebuild=rebuild, cache=cache, **params)
+                print(json.dumps(result, indent=None if args.follow else 2), flush=True)
+                if not args.follow:
+                    return 0
+                rebuild = False
+                while not any(
+                    event.get("type") in REPACK_EVENTS and not event.get("reused")
+                    for event in log.read(after_seq=after_seq)
+                ):
+                    watcher.wait()
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from ..catalog_backend import open_catalog
+from ..event_log import EventLog
+from ..image_derivatives import UnsupportedImage
+from ..image_store import (
+    METADATA_FIELDS,
+    file_sha256,
+    image_metadata,
+    image_store_settings,
+    ingest_image,
+    near_duplicate_pairs,
+    near_duplicates,
+    perceptual_hash,
+)
+from ..metrics import count, operation
+from ..signal_watch import SignalWatcher
+from ..store_utils import JsonCache, load_json, resolve_store_path, store_lock
+
+DEDUPE_EVENTS = ("state_published", "state_catalog_upserted")
+
+
+def hash_one(root: str, spritelet_path: str) -> dict:
+    # Runs in a worker process: decoding is pure Python, so threads would share one core.
+    result = {"spritelet_path": spritelet_path}
+    try:
+        result["perceptual_hash"] = perceptual_hash(Path(root), spritelet_path)
+    except UnsupportedImage as e:
+        result["unsupported"] = str(e)
+    except (SystemExit, Exception) as e:
+        result["error"] = str(e.code) if isinstance(e, SystemExit) else f"{type(e).__name__}: {e}"
+    return result
+
+
+def collect_garbage(root: Path, referenced: set[str]) -> list[str]:
+    # Caller must hold store_lock. An object is garbage once no catalog entry names its digest and
+    # no alias links to it; a publish in progress always has its alias in place before it commits.
+    removed = []
+    for path in sorted((root / "states" / "objects").glob("*/*")):
+        if path.stem not in referenced and path.is_file() and path.stat().st_nlink == 1:
+            path.unlink()
+            removed.append(path.relative_to(root).as_posix())
+    return removed
+
+
+def dedupe_images(
+    root: Path,
+    migrate: bool,
+    want_hashes: bool,
+    max_distance: int,
+    gc: bool,
+    workers: int,
+    cache: JsonCache,
+    names: list[str] | None = None,
+) -> dict:
+    # With names, only those states are checked (a --follow pass) and the store-wide duplicate
+    # reports and garbage collection are left to full passes.
+    started = time.monotonic()
+    catalog = open_catalog(root, cache)
+    with operation(root, "dedupe_images"), catalog:
+        states = catalog.all()
+        checked = states if names is None else {key: states[key] for key in names if key in states}
+        paths: dict[str, list[str]] = {}
+        for key, state in sorted(checked.items()):
+            if resolve_store_path(root, state["spritelet_path"]).exists():
+                paths.setdefault(state["spritelet_path"], []).append(key)
+
+        # Digests and dimensions only read headers, so they stay in this process.
+        metadata = {path: image_metadata(root, path, states[keys[0]]) for path, keys in paths.items()}
+        # One perceptual hash per digest: taken from any entry that already has one for those bytes,
+        # else decoded in worker processes.
+        known = {state["sha256"]: state["perceptual_hash"] for state in states.values() if state.get("perceptual_hash")}
+        unhashed: dict[str, list[str]] = {}
+        for path, fields in metadata.items():
+            if not fields or "perceptual_hash" in fields:
+                continue
+            if fields["sha256"] in known:
+                fields["perceptual_hash"] = known[fields["sha256"]]
+            elif want_hashes:
+                unhashed.setdefault(fields["sha256"], []).append(path)
+        results = []
+        if unhashed:
+            with ProcessPoolExecutor(max_workers=min(workers, len(unhashed))) as pool:
+                futures = [pool.submit(hash_one, str(root), same[0]) for same in unhashed.values()]
+                results = [future.result() for future in futures]
+        for result in results:
+            if "perceptual_hash" in result:
+                for path in unhashed[metadata[result["spritelet_path"]]["sha256"]]:
+                    metadata[path]["perceptual_hash"] = result["perceptual_hash"]
+
+        # Ingest and record under the store lock, re-reading each entry and skipping images replaced
+        # meanwhile. A publisher renames its new image in before taking the lock for its commit, so the
+        # digest is checked again here, right before the image is swapped for an alias.
+        rows = []
+        stored = deduplicated = 0
+        with store_lock(root):
+            for path, keys in paths.items():
+                fields = metadata[path]
+                current = resolve_store_path(root, path)
+                if not fields or not current.exists() or file_sha256(current) != fields["sha256"]:
+                    continue
+                if migrate:
+                    _, existed = ingest_image(root, path)
+                    count("spritelet_image_objects_total", "deduplicated" if existed else "stored")
+                    stored += not existed
+                    deduplicated += existed
+                for key in keys:
+                    entry = catalog.get(key)
+                    if entry is None or entry["spritelet_path"] != path:
+                        continue
+                    if all(entry.get(name) == fields.get(name) for name in METADATA_FIELDS):
+                        continue
+                    entry = {name: value for name, value in entry.items() if name not in METADATA_FIELDS}
+                    rows.append({**entry, **fields})
+            if rows:
+                catalog.upsert(rows)
+            referenced = {fields["sha256"] for fields in metadata.values() if fields}
+            removed = collect_garbage(root, referenced) if gc and names is None else []
+
+    hashes = {}
+    for path, fields in metadata.items():
+        if fields.get("perceptual_hash"):
+            for key in paths[path]:
+                hashes[key] = fields["perceptual_hash"]
+    # Look-alikes of the states hashed in this pass, among every hashed catalog state.
+    hash_states = {key: state for key, state in states.items() if state.get("perceptual_hash")}
+    hash_states.update((key, {"perceptual_hash": phash}) for key, phash in hashes.items())
+    flagged = {}
+    for key, phash in hashes.items():
+        if states[key].get("perceptual_hash") != phash:
+            matches = near_duplicates(hash_states, key, phash, max_distance)
+            if matches:
+                flagged[key] = matches
+
+    failed = [result for result in results if "error" in result]
+    report = {
+        "checked": len(checked),
+        "images": len(paths),
+        "updated": len(rows),
+        "stored_objects": stored,
+        "deduplicated": deduplicated,
+        "hashed": sum(1 for result in results if "perceptual_hash" in result),
+        "unsupported": sum(1 for result in results if "unsupported" in result),
+        "failed": len(failed),
+        "flagged": flagged,
+    }
+    if names is None:
+        # Exact duplicates: one digest under several paths; separate inodes are bytes still stored twice.
+        by_digest: dict[str, list[str]] = {}
+        for path, fields in metadata.items():
+            if fields:
+                by_digest.setdefault(fields["sha256"], []).append(path)
+        duplicates = []
+        reclaimable = 0
+        for sha256, same in sorted(by_digest.items()):
+            same_names = sorted(key for path in same for key in paths[path])
+            if len(same_names) < 2:
+                continue
+            inodes = {resolve_store_path(root, path).stat().st_ino for path in same}
+            reclaimable += (len(inodes) - 1) * metadata[same[0]]["bytes"]
+            duplicates.append({"sha256": sha256, "simple_names": same_names, "stored_copies": len(inodes)})
+        digests = {key: metadata[path]["sha256"] for path, keys in paths.items() if metadata[path] for key in keys}
+        report.update(
+            duplicates=duplicates,
+            reclaimable_bytes=reclaimable,
+            near_duplicates=[
+                pair
+                for pair in near_duplicate_pairs(hashes, max_distance)
+                if digests[pair["simple_names"][0]] != digests[pair["simple_names"][1]]
+            ],
+            removed_objects=removed,
+        )
+    report.update(max_distance=max_distance, seconds=round(time.monotonic() - started, 3), errors=failed)
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Record image digests and perceptual hashes in the catalog and report duplicate states"
+    )
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument(
+        "--migrate", action="store_true", help="Move existing state images into states/objects/ (layout \"content\")"
+    )
+    parser.add_argument(
+        "--perceptual-hash",
+        action="store_true",
+        help="Compute missing perceptual hashes even if image_store.perceptual_hash is off",
+    )
+    parser.add_argument(
+        "--max-distance", type=int, help="Report pairs within this many bits (default: image_store.near_duplicate_distance)"
+    )
+    parser.add_argument("--gc", action="store_true", help="Delete objects that no catalog entry or alias uses")
+    parser.add_argument(
+        "--follow", action="store_true", help="Keep running and hash states published or registered later"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: one per CPU)"
+    )
+    args = parser.parse_args()
+    if args.workers < 1:
+        raise SystemExit("--workers must be at least 1")
+
+    root = Path(args.root)
+    cache = JsonCache()
+    settings = image_store_settings(load_json(root / "spritelet.json", {}, cache))
+    if args.migrate and settings["layout"] != "content":
+        raise SystemExit('--migrate needs "image_store": {"layout": "content"} in spritelet.json')
+    want_hashes = args.perceptual_hash or settings["perceptual_hash"]
+    max_distance = settings["near_duplicate_distance"] if args.max_distance is None else args.max_distance
+    if not 0 <= max_distance < 64:
+        raise SystemExit("--max-distance must be between 0 and 63")
+
+    if not args.follow:
+        result = dedupe_images(root, args.migrate, want_hashes, max_distance, args.gc, args.workers, cache)
+        print(json.dumps(result, indent=2))
+        return 0 if not result["failed"] else 1
+
+    log = EventLog(root)
+    with SignalWatcher(root) as watcher:
+        try:
+            after_seq = log.last_seq()
+            result = dedupe_images(root, args.migrate, want_hashes, max_distance, args.gc, args.workers, cache)
+            print(json.dumps(result), flush=True)
+            while True:
+                # Reused publishes leave the image as it was; only the states named by other writes are checked.
+                names = set()
+                while not names:
+                    watcher.wait()
+                    for event in log.read(after_seq=after_seq):
+                        after_seq = event["seq"]
+                        if event.get("type") in DEDUPE_EVENTS and not event.get("reused"):
+                            names.add(event["simple_name"])
+                result = dedupe_images(
+                    root, args.migrate, want_hashes, max_distance, False, args.workers, cache, sorted(names)
+                )
+                print(json.dumps(result), flush=True)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
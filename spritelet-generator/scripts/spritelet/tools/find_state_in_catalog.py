@@ -0,0 +1,118 @@
+import argparse
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+from ..catalog_backend import open_catalog
+from ..daemon_client import daemon_request
+from ..metrics import timed_operation
+from ..similarity_index import similar_states
+from ..store_utils import JsonCache, content_hash, load_json, normalize_simple_name
+
+
+def parse_utc_timestamp(value: str) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
+    except ValueError:
+        return None
+
+
+@timed_operation("find")
+def find_state(
+    root: Path,
+    simple_name: str,
+    cache: JsonCache | None = None,
+    top_k: int = 0,
+    description: str = "",
+) -> dict:
+    key = normalize_simple_name(simple_name)
+    with open_catalog(root, cache) as catalog:
+        found = catalog.get(key)
+        candidates = similar_states(root, catalog, simple_name, description, top_k) if top_k else None
+
+    if not found:
+        result = {"found": False, "simple_name": key}
+        if candidates is not None:
+            result["candidates"] = candidates
+        return result
+
+    base_image_rel = load_json(root / "spritelet.json", {}, cache).get("base_image_path", "")
+    base_image_abs = Path(base_image_rel)
+    if base_image_rel and not base_image_abs.is_absolute():
+        base_image_abs = (root / base_image_abs).resolve()
+
+    state_created_at = parse_utc_timestamp(found.get("created_at", ""))
+    base_image_mtime = None
+    base_image_sha256 = None
+    if base_image_rel and base_image_abs.exists():
+        base_image_mtime = datetime.fromtimestamp(base_image_abs.stat().st_mtime, tz=timezone.utc)
+        base_image_sha256 = content_hash(root, base_image_abs)
+
+    base_image_is_newer = bool(
+        base_image_mtime is not None and state_created_at is not None and base_image_mtime > state_created_at
+    )
+    recorded_sha256 = found.get("base_image_sha256")
+    if recorded_sha256 and base_image_sha256:
+        staleness_check = "content_hash"
+        state_is_stale = recorded_sha256 != base_image_sha256
+    else:
+        staleness_check = "mtime"
+        state_is_stale = base_image_is_newer or state_created_at is None
+    would_reuse_on_publish = not state_is_stale
+
+    result = {
+        "found": True,
+        "simple_name": key,
+        "base_image_path": base_image_rel,
+        "base_image_mtime": base_image_mtime.isoformat().replace("+00:00", "Z") if base_image_mtime else None,
+        "state_created_at": found.get("created_at"),
+        "base_image_is_newer": base_image_is_newer,
+        "base_image_sha256": base_image_sha256,
+        "staleness_check": staleness_check,
+        "state_is_stale": state_is_stale,
+        "would_reuse_on_publish": would_reuse_on_publish,
+        "state": found,
+    }
+    if candidates is not None:
+        result["candidates"] = candidates
+    return result
+
+
+async def find_state_async(root: Path, *args, **kwargs) -> dict:
+    # Lookups hold no lock of their own but may build the similarity index on first use, so the
+    # whole lookup runs in a worker thread.
+    import asyncio
+
+    return await asyncio.to_thread(find_state, root, *args, **kwargs)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Find a state in Spritelet catalog")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--simple-name", required=True, help="Simple state name, for example 'focused coding'")
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=0,
+        help="Also list up to this many catalog states ranked by name/description similarity",
+    )
+    parser.add_argument("--description", default="", help="Description to include in the similarity query")
+    parser.add_argument("--no-daemon", action="store_true", help="Read the catalog in this process even if a daemon is running")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    params = {"simple_name": args.simple_name, "top_k": args.top_k, "description": args.description}
+    result = None
+    if not args.no_daemon:
+        result = daemon_request(root, "find", params)
+    if result is None:
+        result = find_state(root, **params)
+
+    print(json.dumps(result, indent=2))
+    return 0 if result["found"] or result.get("candidates") else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+from ..event_log import append_event, compress_sealed
+from ..generation_client import generate_image_to_file
+from ..rate_limit import generation_limiter
+from ..store_utils import atomic_write_json, store_lock, utc_now
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate the first base Spritelet image and attach it to spritelet.json")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--identity-prompt", required=True, help="Identity prompt for the first base image")
+    parser.add_argument("--output-path", default="assets/base.png", help="Relative output path for the base image")
+    parser.add_argument("--model", default="models/gemini-3-pro-image-preview")
+    parser.add_argument("--endpoint", default="https://generativelanguage.googleapis.com/v1beta/{model}:generateContent")
+    parser.add_argument("--api-key-env", default="SPRITELET_GOOGLE_API_KEY")
+    parser.add_argument("--aspect-ratio", default="1:1", help="Output image aspect ratio (default: 1:1)")
+    parser.add_argument("--image-size", default="1K", help="Output image size tier (default: 1K)")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    spritelet_path = root / "spritelet.json"
+    if not spritelet_path.exists():
+        raise SystemExit("Missing spritelet.json; run init_spritelet_store.py first")
+
+    spritelet = json.loads(spritelet_path.read_text(encoding="utf-8"))
+    style = spritelet.get("prompt_style", "")
+    prompt = f"Create a mascot base avatar. Identity brief: {args.identity_prompt}. Style: {style}."
+
+    request_payload = {
+        "model": args.model,
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generation_config": {
+            "response_modalities": ["IMAGE"],
+            "image_config": {
+                "aspect_ratio": args.aspect_ratio,
+                "image_size": args.image_size,
+            },
+        },
+    }
+
+    api_key = os.environ.get(args.api_key_env, "")
+    if not api_key:
+        raise SystemExit(f"Missing API key env var: {args.api_key_env}")
+
+    out_rel = args.output_path
+    out_abs = (root / out_rel).resolve()
+    limiter = generation_limiter(root, spritelet, api_key)
+    if limiter:
+        limiter.acquire()
+    generate_image_to_file(
+        args.model, api_key, args.endpoint, request_payload, out_abs, limiter and (lambda: limiter.acquire(retry=True))
+    )
+    if limiter:
+        limiter.record_image()
+
+    now = utc_now()
+    with store_lock(root):
+        spritelet = json.loads(spritelet_path.read_text(encoding="utf-8"))
+        spritelet["base_image_path"] = out_rel
+        atomic_write_json(spritelet_path, spritelet)
+        append_event(
+            root,
+            {
+                "type": "base_image_initialized",
+                "spritelet_path": out_rel,
+                "updated_at": now,
+            },
+        )
+    compress_sealed(root)
+
+    print(
+        json.dumps(
+            {
+                "initialized": True,
+                "base_image_path": out_rel,
+                "updated_at": now,
+            },
+            indent=2,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,28 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+from ..publish_spritelet_state import DEFAULT_API_KEY_ENV, load_profile
+from ..rate_limit import GenerationLimiter, rate_limit_settings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Show generation rate limit and daily image budget usage for a Spritelet root")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--days", type=int, default=7, help="Days of history to include (default: 7)")
+    parser.add_argument("--api-key-env", default=DEFAULT_API_KEY_ENV, help="Key whose bucket to show when rate_limit.scope is api_key")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    profile, _ = load_profile(root)
+    api_key = os.environ.get(args.api_key_env, "")
+    settings = rate_limit_settings(profile)
+    if settings["scope"] == "api_key" and not api_key:
+        raise SystemExit(f"Missing API key env var: {args.api_key_env}")
+    print(json.dumps(GenerationLimiter(root, settings, api_key).usage(args.days), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
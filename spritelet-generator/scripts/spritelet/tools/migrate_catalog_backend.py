@@ -0,0 +1,63 @@
+import argparse
+import json
+from pathlib import Path
+
+from ..catalog_backend import (
+    CATALOG_BACKENDS,
+    SqliteCatalog,
+    detect_catalog_backend,
+    export_catalog_json,
+    json_catalog_path,
+    open_catalog,
+    remove_sqlite_catalog,
+    write_sqlite_marker,
+)
+from ..store_utils import store_lock
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Switch a Spritelet catalog between json and sqlite storage, or export catalog.json")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--to", choices=CATALOG_BACKENDS, help="Backend to migrate the catalog to")
+    parser.add_argument(
+        "--export",
+        metavar="PATH",
+        help="Write the catalog in catalog.json format to PATH without changing backends",
+    )
+    args = parser.parse_args()
+    if not args.to and not args.export:
+        raise SystemExit("Pass --to and/or --export")
+
+    root = Path(args.root)
+    result = {}
+    with store_lock(root):
+        current = detect_catalog_backend(root)
+        if current is None:
+            raise SystemExit(f"No catalog under {root / 'states'}; run init_spritelet_store.py first")
+        exports_over_marker = args.export and Path(args.export).resolve() == json_catalog_path(root).resolve()
+        if exports_over_marker and (args.to or current) == "sqlite":
+            raise SystemExit("With sqlite, states/catalog.json is a marker that commits never refresh; export elsewhere")
+
+        with open_catalog(root) as catalog:
+            entries = catalog.all()
+            if args.export:
+                result["exported"] = str(export_catalog_json(root, catalog, Path(args.export)))
+
+        if args.to and args.to != current:
+            if args.to == "sqlite":
+                with SqliteCatalog(root) as target:
+                    target.upsert(list(entries.values()))
+                write_sqlite_marker(root)
+            else:
+                # Keep the final export as the live catalog, then drop the database.
+                with open_catalog(root, backend="sqlite") as source:
+                    export_catalog_json(root, source)
+                remove_sqlite_catalog(root)
+        result.update({"from": current, "to": args.to or current, "states": len(entries)})
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
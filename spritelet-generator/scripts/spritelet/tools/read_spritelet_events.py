@@ -0,0 +1,72 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from ..event_log import EventLog
+from ..signal_watch import SignalWatcher
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Read Spritelet events from a cursor or timestamp without scanning the whole log")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--after-seq", type=int, help="Only events with seq greater than this")
+    parser.add_argument("--since", help="Only events with updated_at at or after this UTC timestamp, for example 2026-02-06T09:30:04Z")
+    parser.add_argument(
+        "--cursor-file",
+        help="Resume after the seq stored in this file and store the last delivered seq back into it",
+    )
+    parser.add_argument("--limit", type=int, help="Stop after this many events")
+    parser.add_argument("--follow", action="store_true", help="Keep waiting for new events")
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=0.5,
+        help="Seconds between checks with --follow where inotify is unavailable (default: 0.5)",
+    )
+    parser.add_argument("--compress-sealed", action="store_true", help="Gzip every sealed segment and exit")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    log = EventLog(root)
+
+    if args.compress_sealed:
+        compressed = [str(path.relative_to(root)) for path in log.compress_sealed_segments()]
+        print(json.dumps({"compressed": compressed}, indent=2))
+        return 0
+
+    after_seq = args.after_seq
+    cursor_path = Path(args.cursor_file) if args.cursor_file else None
+    if cursor_path and after_seq is None and cursor_path.exists():
+        after_seq = int(cursor_path.read_text(encoding="utf-8").strip() or -1)
+
+    delivered = 0
+    since = args.since
+    watcher = SignalWatcher(root, args.poll_interval) if args.follow else None
+    try:
+        while True:
+            for event in log.read(after_seq=after_seq, since=since):
+                sys.stdout.write(json.dumps(event) + "\n")
+                after_seq = event["seq"]
+                delivered += 1
+                if args.limit is not None and delivered >= args.limit:
+                    return 0
+            sys.stdout.flush()
+            if not args.follow:
+                return 0
+            # Once anything was delivered the seq cursor is exact; the timestamp filter only seeds it.
+            if after_seq is not None:
+                since = None
+            watcher.wait()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if watcher:
+            watcher.close()
+        sys.stdout.flush()
+        if cursor_path and after_seq is not None:
+            cursor_path.write_text(f"{after_seq}\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
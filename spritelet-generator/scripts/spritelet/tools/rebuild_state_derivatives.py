@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from ..catalog_backend import open_catalog
+from ..event_log import EventLog
+from ..image_derivatives import UnsupportedImage, build_derivatives, derivative_settings, describe_variants, variants_current
+from ..metrics import count, operation
+from ..signal_watch import SignalWatcher
+from ..store_utils import JsonCache, load_json, resolve_store_path, store_lock
+
+REBUILD_EVENTS = ("state_published", "state_catalog_upserted")
+
+
+def rebuild_one(root: str, spritelet_path: str, simple_names: list[str], settings: dict) -> dict:
+    # Runs in a worker process: decoding and resizing are pure Python, so threads would share one core.
+    started = time.monotonic()
+    result = {"spritelet_path": spritelet_path, "simple_names": simple_names}
+    try:
+        result["variants"] = len(build_derivatives(Path(root), spritelet_path, settings))
+    except UnsupportedImage as e:
+        result["unsupported"] = str(e)
+    except (SystemExit, Exception) as e:
+        result["error"] = str(e.code) if isinstance(e, SystemExit) else f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def rebuild_derivatives(
+    root: Path,
+    names: list[str],
+    force: bool,
+    workers: int,
+    cache: JsonCache,
+    list_only: bool = False,
+    missing_ok: bool = False,
+) -> dict:
+    started = time.monotonic()
+    settings = derivative_settings(load_json(root / "spritelet.json", {}, cache))
+    catalog = open_catalog(root, cache)
+
+    with operation(root, "rebuild_derivatives"), catalog:
+        states = catalog.all()
+        if names:
+            missing = sorted(set(names) - set(states))
+            if missing and not missing_ok:
+                raise SystemExit(f"Not in catalog: {', '.join(missing)}")
+            states = {key: states[key] for key in names if key in states}
+        # One job per image; states registered under several names share their variants.
+        queue: dict[str, list[str]] = {}
+        for key, state in sorted(states.items()):
+            path = state["spritelet_path"]
+            if path in queue:
+                queue[path].append(key)
+            elif resolve_store_path(root, path).exists() and (force or not variants_current(root, path, settings)):
+                queue[path] = [key]
+        if list_only:
+            names = sorted(key for keys in queue.values() for key in keys)
+            return {"states": len(names), "simple_names": names}
+
+        results = []
+        if queue:
+            with ProcessPoolExecutor(max_workers=min(workers, len(queue))) as pool:
+                futures = [pool.submit(rebuild_one, str(root), path, keys, settings) for path, keys in queue.items()]
+                results = [future.result() for future in futures]
+
+        # Record the variants under the store lock, re-reading each entry so a publish that landed
+        # meanwhile keeps its fields; describe_variants drops files older than a regenerated image.
+        rows = []
+        with store_lock(root):
+            for result in results:
+                if "error" in result:
+                    continue
+                count("spritelet_derivatives_total", "unsupported" if "unsupported" in result else "built")
+                variants = describe_variants(root, result["spritelet_path"])
+                for key in result["simple_names"]:
+                    entry = catalog.get(key)
+                    if entry is None or entry["spritelet_path"] != result["spritelet_path"]:
+                        continue
+                    entry = {name: value for name, value in entry.items() if name != "variants"}
+                    if variants:
+                        entry["variants"] = variants
+                    rows.append(entry)
+            if rows:
+                catalog.upsert(rows)
+
+    return {
+        "checked": len(states),
+        "rebuilt": sum(1 for result in results if "variants" in result),
+        "unsupported": sum(1 for result in results if "unsupported" in result),
+        "failed": sum(1 for result in results if "error" in result),
+        "sizes": settings["sizes"],
+        "formats": settings["formats"],
+        "seconds": round(time.monotonic() - started, 3),
+        "results": results,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Build or refresh the resized variants of catalog states per spritelet.json derivatives"
+    )
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--state", action="append", default=[], help="Only this simple_name (repeatable)")
+    parser.add_argument("--force", action="store_true", help="Rebuild variants that are already up to date")
+    parser.add_argument("--list", action="store_true", help="Only print the states whose variants need rebuilding")
+    parser.add_argument(
+        "--follow", action="store_true", help="Keep running and build variants for states published or registered later"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: one per CPU)"
+    )
+    args = parser.parse_args()
+    if args.workers < 1:
+        raise SystemExit("--workers must be at least 1")
+    if args.follow and (args.list or args.state):
+        raise SystemExit("--follow cannot be combined with --list or --state")
+
+    root = Path(args.root)
+    cache = JsonCache()
+    if not args.follow:
+        result = rebuild_derivatives(root, args.state, args.force, args.workers, cache, args.list)
+        print(json.dumps(result, indent=2))
+        return 0 if not result.get("failed") else 1
+
+    log = EventLog(root)
+    with SignalWatcher(root) as watcher:
+        try:
+            after_seq = log.last_seq()
+            print(json.dumps(rebuild_derivatives(root, [], args.force, args.workers, cache)), flush=True)
+            while True:
+                # Reused publishes leave the image as it was; only the states named by other writes are checked.
+                names = set()
+                while not names:
+                    watcher.wait()
+                    for event in log.read(after_seq=after_seq):
+                        after_seq = event["seq"]
+                        if event.get("type") in REBUILD_EVENTS and not event.get("reused"):
+                            names.add(event["simple_name"])
+                result = rebuild_derivatives(root, sorted(names), False, args.workers, cache, missing_ok=True)
+                print(json.dumps(result), flush=True)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
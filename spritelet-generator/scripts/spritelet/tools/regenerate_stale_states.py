@@ -0,0 +1,254 @@
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ..catalog_backend import open_catalog
+from ..event_log import EventLog
+from ..metrics import operation
+from ..publish_spritelet_state import (
+    DEFAULT_API_KEY_ENV,
+    DEFAULT_ENDPOINT,
+    DEFAULT_MODEL,
+    describe_images,
+    generate_state_image,
+    load_profile,
+    plan_state,
+    resolve_api_key,
+    resolve_catalog_state,
+)
+from ..rate_limit import RateLimited
+from ..store_utils import JsonCache, atomic_write_json, content_hash, inflight_lock, load_json, utc_now
+from .batch_publish_states import commit_batch
+
+DEFAULT_HALF_LIFE_EVENTS = 200
+
+
+def checkpoint_path(root: Path) -> Path:
+    return root / ".cache" / "regenerate-stale.json"
+
+
+def usage_scores(log: EventLog, half_life: float) -> dict[str, dict]:
+    # Publishes per state, each weighted by 0.5 ** (events since it / half_life), so frequent and
+    # recent states both rank high.
+    publishes: dict[str, list[int]] = {}
+    last_updated: dict[str, str] = {}
+    latest_seq = -1
+    for event in log.read():
+        latest_seq = event["seq"]
+        if event.get("type") == "state_published":
+            publishes.setdefault(event["simple_name"], []).append(event["seq"])
+            last_updated[event["simple_name"]] = event.get("updated_at", "")
+    return {
+        name: {
+            "score": round(sum(0.5 ** ((latest_seq - seq) / half_life) for seq in seqs), 4),
+            "publishes": len(seqs),
+            "last_published_at": last_updated[name],
+        }
+        for name, seqs in publishes.items()
+    }
+
+
+def list_stale(root: Path, catalog, base_image: Path, base_image_sha256: str, usage: dict[str, dict]) -> list[dict]:
+    stale = []
+    for key, state in catalog.all().items():
+        try:
+            if plan_state(root, base_image, state, False, base_image_sha256):
+                continue
+        except SystemExit:
+            # The catalog points at a missing file; regenerating restores it.
+            pass
+        stats = usage.get(key, {"score": 0.0, "publishes": 0, "last_published_at": None})
+        stale.append({"simple_name": key, **stats})
+    stale.sort(key=lambda item: (-item["score"], -item["publishes"], item["simple_name"]))
+    return stale
+
+
+class IntervalLimiter:
+    # Spaces request starts evenly across threads; a rate of 0 disables the limit.
+    def __init__(self, per_minute: float) -> None:
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            start_at = max(self.next_at, now)
+            self.next_at = start_at + self.interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Regenerate stale catalog states after a base image change, most used first, resuming after interruptions"
+    )
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--list", action="store_true", help="Only print the stale states in regeneration order")
+    parser.add_argument("--workers", type=int, default=2, help="Concurrent generation requests (default: 2)")
+    parser.add_argument(
+        "--rate-per-minute",
+        type=float,
+        default=10.0,
+        help="Most generation requests this run starts per minute, 0 for no limit; the shared "
+        "spritelet.json rate_limit still applies (default: 10)",
+    )
+    parser.add_argument("--limit", type=int, help="Regenerate at most this many states in this run")
+    parser.add_argument(
+        "--half-life",
+        type=float,
+        default=DEFAULT_HALF_LIFE_EVENTS,
+        help=f"Events after which a past publish counts half toward priority (default: {DEFAULT_HALF_LIFE_EVENTS})",
+    )
+    parser.add_argument("--restart", action="store_true", help="Ignore a saved checkpoint and recompute the order")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT)
+    parser.add_argument("--api-key-env", default=DEFAULT_API_KEY_ENV)
+    parser.add_argument("--aspect-ratio", default="1:1", help="Output image aspect ratio (default: 1:1)")
+    parser.add_argument("--image-size", default="1K", help="Output image size tier (default: 1K)")
+    args = parser.parse_args()
+    if args.workers < 1:
+        raise SystemExit("--workers must be at least 1")
+
+    started = time.monotonic()
+    root = Path(args.root)
+    cache = JsonCache()
+    profile, base_image = load_profile(root, cache)
+    base_image_sha256 = content_hash(root, base_image)
+    catalog = open_catalog(root, cache, required=False)
+
+    with operation(root, "regenerate_stale"), catalog:
+        stale = list_stale(root, catalog, base_image, base_image_sha256, usage_scores(EventLog(root), args.half_life))
+        if args.list:
+            print(json.dumps({"stale": len(stale), "states": stale}, indent=2))
+            return 0
+
+        # The checkpoint keeps the original priority order and failures across runs for one base image.
+        checkpoint = load_json(checkpoint_path(root), {})
+        if args.restart or checkpoint.get("base_image_sha256") != base_image_sha256:
+            checkpoint = {
+                "base_image_sha256": base_image_sha256,
+                "started_at": utc_now(),
+                "order": [item["simple_name"] for item in stale],
+                "done": [],
+                "failed": {},
+            }
+        still_stale = {item["simple_name"] for item in stale}
+        known = set(checkpoint["order"])
+        checkpoint["order"] += [item["simple_name"] for item in stale if item["simple_name"] not in known]
+        queue = [name for name in checkpoint["order"] if name in still_stale]
+        if args.limit is not None:
+            queue = queue[: args.limit]
+        checkpoint_lock = threading.Lock()
+
+        def save_checkpoint() -> None:
+            with checkpoint_lock:
+                atomic_write_json(checkpoint_path(root), checkpoint)
+
+        save_checkpoint()
+        api_key = resolve_api_key(None, args.api_key_env) if queue else None
+        limiter = IntervalLimiter(args.rate_per_minute)
+        stop = threading.Event()
+        results = []
+
+        def regenerate(name: str) -> None:
+            if stop.is_set():
+                return
+            item_started = time.monotonic()
+            result = {"simple_name": name}
+            try:
+                with inflight_lock(root, name, base_image_sha256) as waited:
+                    _, state = resolve_catalog_state(catalog, name)
+                    if waited and plan_state(root, base_image, state, False, base_image_sha256):
+                        result.update(coalesced=True, spritelet_path=state["spritelet_path"])
+                    else:
+                        limiter.wait()
+                        if stop.is_set():
+                            # Stopped while waiting for the rate limiter: not attempted, left queued.
+                            result["skipped"] = True
+                            return
+                        # generate_state_image writes a temp file and renames it over the old image.
+                        spritelet_path = generate_state_image(
+                            root,
+                            profile,
+                            base_image,
+                            name,
+                            state["description"],
+                            state,
+                            api_key,
+                            model=args.model,
+                            endpoint=args.endpoint,
+                            aspect_ratio=args.aspect_ratio,
+                            image_size=args.image_size,
+                        )
+                        result["spritelet_path"] = spritelet_path
+                        commit_batch(
+                            root,
+                            catalog,
+                            [{**result, "description": state["description"], "reused": False}],
+                            utc_now(),
+                            False,
+                            base_image_sha256,
+                        )
+                if not result.get("coalesced"):
+                    describe_images(root, profile, catalog, [result])
+                with checkpoint_lock:
+                    checkpoint["done"].append(name)
+                    checkpoint["failed"].pop(name, None)
+            except RateLimited as e:
+                # The shared budget ran out past max_wait_seconds; leave the rest queued for the next run.
+                result["error"] = str(e.code)
+                stop.set()
+            except (SystemExit, Exception) as e:
+                result["error"] = str(e.code) if isinstance(e, SystemExit) else f"{type(e).__name__}: {e}"
+                with checkpoint_lock:
+                    checkpoint["failed"][name] = result["error"]
+            finally:
+                result["seconds"] = round(time.monotonic() - item_started, 3)
+                results.append(result)
+            save_checkpoint()
+
+        pool = ThreadPoolExecutor(max_workers=args.workers)
+        interrupted = False
+        try:
+            for future in [pool.submit(regenerate, name) for name in queue]:
+                future.result()
+        except KeyboardInterrupt:
+            # Requests already in flight finish and are checkpointed; queued ones are left for the next run.
+            interrupted = True
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+        finally:
+            pool.shutdown(wait=True)
+
+    # Success is what reached the checkpoint; skipped and failed items stay queued for the next run.
+    done = set(checkpoint["done"])
+    succeeded = [result for result in results if result["simple_name"] in done]
+    failed = [result for result in results if "error" in result]
+    remaining = len(still_stale - done)
+    if remaining == 0:
+        checkpoint_path(root).unlink(missing_ok=True)
+    print(
+        json.dumps(
+            {
+                "stale": len(still_stale),
+                "regenerated": sum(1 for result in succeeded if not result.get("coalesced")),
+                "coalesced": sum(1 for result in succeeded if result.get("coalesced")),
+                "failed": len(failed),
+                "skipped": sum(1 for result in results if result.get("skipped")),
+                "remaining": remaining,
+                "interrupted": interrupted,
+                "seconds": round(time.monotonic() - started, 3),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+    return 0 if not failed and not interrupted else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,127 @@
+import argparse
+import json
+from pathlib import Path
+
+from ..catalog_backend import open_catalog
+from ..daemon_client import daemon_request
+from ..event_log import EventLog, append_event
+from ..image_derivatives import describe_variants
+from ..image_store import image_metadata, image_store_settings, ingest_image
+from ..metrics import count, operation, span, timed_operation
+from ..publish_spritelet_state import describe_images_flow
+from ..store_flow import Call, LockStore, run_async, run_sync
+from ..store_utils import (
+    JsonCache,
+    content_hash,
+    load_json,
+    normalize_simple_name,
+    resolve_store_path,
+    utc_now,
+)
+
+
+def register_flow(
+    root: Path,
+    simple_name: str,
+    spritelet_path: str,
+    description: str,
+    cache: JsonCache | None = None,
+):
+    spritelet_abs = resolve_store_path(root, spritelet_path)
+    if not spritelet_abs.exists():
+        raise SystemExit(f"spritelet_path does not exist: {spritelet_path}")
+
+    profile = load_json(root / "spritelet.json", {}, cache)
+    base_image_rel = profile.get("base_image_path", "")
+    base_image_abs = Path(base_image_rel)
+    if base_image_rel and not base_image_abs.is_absolute():
+        base_image_abs = root / base_image_abs
+    base_image_sha256 = content_hash(root, base_image_abs) if base_image_rel and base_image_abs.exists() else None
+    # Ingesting swaps the alias in by rename, so like a generation it needs no store lock.
+    if image_store_settings(profile)["layout"] == "content":
+        _, existed = yield Call(ingest_image, root, spritelet_path)
+        count("spritelet_image_objects_total", "deduplicated" if existed else "stored")
+
+    with open_catalog(root, cache) as catalog, span("commit"), (yield LockStore(root)):
+        key = normalize_simple_name(simple_name)
+        now = utc_now()
+
+        existing = catalog.get(key) or {}
+        created_at = existing.get("created_at", now)
+
+        entry = {
+            "simple_name": key,
+            "spritelet_path": spritelet_path,
+            "created_at": created_at,
+            "description": description,
+        }
+        # A newly registered image counts as made for the current base image; re-registering the
+        # same image keeps whatever base image hash it was recorded against.
+        if existing.get("spritelet_path") == spritelet_path and existing.get("base_image_sha256"):
+            entry["base_image_sha256"] = existing["base_image_sha256"]
+        elif base_image_sha256:
+            entry["base_image_sha256"] = base_image_sha256
+        entry.update(image_metadata(root, spritelet_path, existing))
+        variants = describe_variants(root, spritelet_path)
+        if variants:
+            entry["variants"] = variants
+        catalog.upsert([entry])
+
+        append_event(
+            root,
+            {
+                "type": "state_catalog_upserted",
+                "simple_name": key,
+                "spritelet_path": spritelet_path,
+                "updated_at": now,
+            },
+        )
+    log = EventLog(root, profile)
+    if log.compress_sealed:
+        yield Call(log.compress_sealed_segments)
+
+    # Like a publish, a new image is decoded for variants and a perceptual hash once the lock is released.
+    if entry.get("sha256") != existing.get("sha256"):
+        with open_catalog(root, cache) as catalog:
+            yield from describe_images_flow(root, profile, catalog, [entry])
+            entry = catalog.get(key) or entry
+    return entry
+
+
+@timed_operation("register")
+def register_state(root: Path, *args, **kwargs) -> dict:
+    return run_sync(register_flow(root, *args, **kwargs))
+
+
+async def register_state_async(root: Path, *args, **kwargs) -> dict:
+    with operation(root, "register"):
+        return await run_async(register_flow(root, *args, **kwargs))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Register or update a state image in Spritelet catalog")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--simple-name", required=True, help="Simple state name, for example 'focused coding'")
+    parser.add_argument("--spritelet-path", required=True, help="Path to state image, for example states/focused-coding.png")
+    parser.add_argument("--description", required=True, help="Short description of the state")
+    parser.add_argument("--no-daemon", action="store_true", help="Write the catalog in this process even if a daemon is running")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    params = {
+        "simple_name": args.simple_name,
+        "spritelet_path": args.spritelet_path,
+        "description": args.description,
+    }
+    result = None
+    if not args.no_daemon:
+        result = daemon_request(root, "register", params)
+    if result is None:
+        result = register_state(root, **params)
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
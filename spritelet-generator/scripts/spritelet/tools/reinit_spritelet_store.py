@@ -0,0 +1,110 @@
+import argparse
+import json
+from pathlib import Path
+
+from ..catalog_backend import CATALOG_BACKENDS, create_empty_catalog, detect_catalog_backend
+from ..event_log import EventLog
+from ..signal_writer import write_current
+from ..store_utils import atomic_write_json, store_lock, utc_now
+
+
+def remove_tree_contents(root: Path, relative_dir: str) -> tuple[int, int]:
+    target = root / relative_dir
+    target.mkdir(parents=True, exist_ok=True)
+
+    files_removed = 0
+    dirs_removed = 0
+
+    for path in sorted(target.rglob("*"), key=lambda p: len(p.parts), reverse=True):
+        if path.is_file() or path.is_symlink():
+            path.unlink()
+            files_removed += 1
+        elif path.is_dir():
+            try:
+                path.rmdir()
+                dirs_removed += 1
+            except OSError:
+                # Non-empty directories are left in place.
+                pass
+
+    return files_removed, dirs_removed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reset a Spritelet identity store to clean starting conditions")
+    parser.add_argument("--root", required=True, help="Spritelet identity root directory")
+    parser.add_argument("--base-image", default="assets/base.png", help="Default base image path for reset profile")
+    parser.add_argument(
+        "--prompt-style",
+        default="cute animal mascot, clean lines, expressive face",
+        help="Default prompt style for reset profile",
+    )
+    parser.add_argument(
+        "--catalog-backend",
+        choices=CATALOG_BACKENDS,
+        help="Catalog storage after reset (default: keep the store's current backend)",
+    )
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    (root / "assets").mkdir(parents=True, exist_ok=True)
+    (root / "states").mkdir(parents=True, exist_ok=True)
+    (root / "signals").mkdir(parents=True, exist_ok=True)
+
+    now = utc_now()
+    with store_lock(root):
+        catalog_backend = args.catalog_backend or detect_catalog_backend(root) or "json"
+        assets_files_removed, assets_dirs_removed = remove_tree_contents(root, "assets")
+        states_files_removed, states_dirs_removed = remove_tree_contents(root, "states")
+
+        profile = {
+            "base_image_path": args.base_image,
+            "prompt_style": args.prompt_style,
+            "created_at": now,
+        }
+        atomic_write_json(root / "spritelet.json", profile)
+        write_current(root, {"spritelet_path": "", "updated_at": now})
+        create_empty_catalog(root, catalog_backend)
+
+        EventLog(root, profile).reset(
+            [
+                {
+                    "type": "state_initialized",
+                    "spritelet_path": "",
+                    "updated_at": now,
+                }
+            ]
+        )
+
+    print(
+        json.dumps(
+            {
+                "reinitialized": True,
+                "root": str(root),
+                "files_removed": {
+                    "assets": assets_files_removed,
+                    "states": states_files_removed,
+                    "total": assets_files_removed + states_files_removed,
+                },
+                "dirs_removed": {
+                    "assets": assets_dirs_removed,
+                    "states": states_dirs_removed,
+                    "total": assets_dirs_removed + states_dirs_removed,
+                },
+                "reset_files": [
+                    "spritelet.json",
+                    "signals/current.json",
+                    "signals/events.jsonl",
+                    "states/catalog.json",
+                ],
+                "catalog_backend": catalog_backend,
+                "updated_at": now,
+            },
+            indent=2,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,128 @@
+import argparse
+import json
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ..event_log import EventLog
+from ..metrics import metrics_text
+from ..signal_watch import SignalWatcher, current_changes, latest_seq, wait_for_changes
+from ..store_snapshot import read_store_snapshot
+from ..store_utils import load_json
+
+MAX_LONG_POLL_SECONDS = 60.0
+SSE_HEARTBEAT_SECONDS = 15.0
+
+
+class SignalRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "SpriteletSignals/1"
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _after_seq(self, query: dict) -> int:
+        value = query.get("after", [None])[0] or self.headers.get("Last-Event-ID")
+        return latest_seq(self.server.root) if value in (None, "") else int(value)
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            if url.path == "/current":
+                current = load_json(self.server.root / "signals" / "current.json", {})
+                self._send_json(200, {**current, "seq": latest_seq(self.server.root)})
+            elif url.path == "/changes":
+                self._long_poll(query)
+            elif url.path == "/events":
+                self._stream(query)
+            elif url.path == "/snapshot":
+                self._send_json(200, read_store_snapshot(self.server.root))
+            elif url.path == "/metrics":
+                self._send_metrics()
+            else:
+                self._send_json(404, {"error": f"Unknown path: {url.path}"})
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+
+    def _send_metrics(self) -> None:
+        # Totals merged by every script run with SPRITELET_METRICS=file, in Prometheus text format.
+        body = metrics_text(self.server.root).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _long_poll(self, query: dict) -> None:
+        after_seq = self._after_seq(query)
+        timeout = min(float(query.get("timeout", ["30"])[0]), MAX_LONG_POLL_SECONDS)
+        changes = wait_for_changes(self.server.root, after_seq, timeout)
+        cursor = changes[-1]["seq"] if changes else after_seq
+        self._send_json(200, {"changes": changes, "cursor": cursor})
+
+    def _stream(self, query: dict) -> None:
+        # Server-sent events; browsers resend the last id as Last-Event-ID when they reconnect.
+        after_seq = self._after_seq(query)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        log = EventLog(self.server.root)
+        with SignalWatcher(self.server.root) as watcher:
+            try:
+                while True:
+                    for change in current_changes(log, after_seq):
+                        after_seq = change["seq"]
+                        self.wfile.write(f"id: {after_seq}\nevent: current\ndata: {json.dumps(change)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if not watcher.wait(SSE_HEARTBEAT_SECONDS):
+                        self.wfile.write(b": keep-alive\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve Spritelet current-state changes over local long-poll and SSE HTTP endpoints")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8787, help="Port (default: 8787)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    if not (root / "signals").is_dir():
+        raise SystemExit(f"Missing {root / 'signals'}; run init_spritelet_store.py first")
+
+    server = ThreadingHTTPServer((args.host, args.port), SignalRequestHandler)
+    server.daemon_threads = True
+    server.root = root
+    server.verbose = args.verbose
+    with SignalWatcher(root) as probe:
+        mode = probe.mode
+    print(json.dumps({"serving": True, "url": f"http://{args.host}:{server.server_port}", "watch_mode": mode}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+import argparse
+import json
+from pathlib import Path
+
+from ..daemon_client import daemon_request
+from ..event_log import EventLog
+from ..metrics import operation, span, timed_operation
+from ..signal_writer import commit_signal, signal_settings
+from ..store_flow import Call, LockStore, run_async, run_sync
+from ..store_utils import (
+    load_json,
+    resolve_store_path,
+    utc_now,
+)
+
+
+def set_signal_flow(root: Path, spritelet_path: str):
+    current_path = root / "signals" / "current.json"
+    if not current_path.exists():
+        raise SystemExit(f"Missing {current_path}; run init_spritelet_store.py first")
+    spritelet_abs = resolve_store_path(root, spritelet_path)
+    if not spritelet_abs.exists():
+        raise SystemExit(f"spritelet_path does not exist: {spritelet_path}")
+
+    durable = signal_settings(load_json(root / "spritelet.json", {}))["durability"] != "none"
+    updated_at = utc_now()
+    current = {"spritelet_path": spritelet_path, "updated_at": updated_at}
+    with span("commit"), (yield LockStore(root)):
+        commit_signal(
+            root,
+            current,
+            [
+                {
+                    "type": "current_spritelet_updated",
+                    "spritelet_path": spritelet_path,
+                    "updated_at": updated_at,
+                }
+            ],
+            durable,
+        )
+    log = EventLog(root)
+    if log.compress_sealed:
+        yield Call(log.compress_sealed_segments)
+
+    return current
+
+
+@timed_operation("set_signal")
+def set_signal(root: Path, spritelet_path: str) -> dict:
+    return run_sync(set_signal_flow(root, spritelet_path))
+
+
+async def set_signal_async(root: Path, spritelet_path: str) -> dict:
+    with operation(root, "set_signal"):
+        return await run_async(set_signal_flow(root, spritelet_path))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Update current published Spritelet image")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--spritelet-path", required=True, help="Path to the image currently shown to users")
+    parser.add_argument("--no-daemon", action="store_true", help="Write the signal in this process even if a daemon is running")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    result = None
+    if not args.no_daemon:
+        result = daemon_request(root, "set-signal", {"spritelet_path": args.spritelet_path})
+    if result is None:
+        result = set_signal(root, args.spritelet_path)
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+from pathlib import Path
+
+from ..daemon_client import daemon_request, daemon_socket_path
+from ..publish_spritelet_state import publish_state
+from ..signal_writer import SignalWriter
+from ..store_snapshot import read_store_snapshot
+from ..store_utils import JsonCache
+from .find_state_in_catalog import find_state
+from .register_state_in_catalog import register_state
+
+
+class SpriteletDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, root: Path, socket_path: Path) -> None:
+        self.root = root
+        self.cache = JsonCache()
+        # set-signal goes through one writer so bursts from flapping agents are debounced and
+        # group-committed (spritelet.json "signals"); it also clears temp files left by a crash.
+        self.signal_writer = SignalWriter(root)
+        self.commands = {
+            "ping": lambda params: {"pong": True, "root": str(self.root), "pid": os.getpid()},
+            "publish": lambda params: publish_state(self.root, cache=self.cache, **params),
+            "find": lambda params: find_state(self.root, cache=self.cache, **params),
+            "register": lambda params: register_state(self.root, cache=self.cache, **params),
+            "set-signal": self._set_signal,
+            "snapshot": lambda params: read_store_snapshot(self.root, self.cache),
+            "shutdown": self._request_shutdown,
+        }
+        super().__init__(str(socket_path), DaemonRequestHandler)
+
+    def _set_signal(self, params: dict) -> dict:
+        # Without a debounce window, answer once the signal is committed (and fsynced if configured),
+        # as set_spritelet_signal.py would; with one, answer right away and let the window coalesce.
+        debounced = self.signal_writer.debounce > 0
+        result = self.signal_writer.set_signal(params["spritelet_path"], wait=not debounced)
+        return {**result, "queued": True} if debounced else result
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.signal_writer.close()
+
+    def _request_shutdown(self, params: dict) -> dict:
+        # shutdown() blocks until serve_forever returns, so it must not run on a handler thread.
+        threading.Thread(target=self.shutdown, daemon=True).start()
+        return {"stopping": True}
+
+    def dispatch(self, request: dict) -> dict:
+        if request.get("root") and Path(request["root"]).resolve() != self.root:
+            return {"ok": False, "error": f"Daemon serves {self.root}, not {request['root']}"}
+        handler = self.commands.get(request.get("command", ""))
+        if handler is None:
+            return {"ok": False, "error": f"Unknown daemon command: {request.get('command')}"}
+        try:
+            return {"ok": True, "result": handler(request.get("params") or {})}
+        except SystemExit as e:
+            return {"ok": False, "error": str(e.code)}
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = {"ok": False, "error": f"Invalid request JSON: {e}"}
+            else:
+                response = self.server.dispatch(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def serve(root: Path) -> None:
+    socket_path = daemon_socket_path(root)
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.exists():
+        if daemon_request(root, "ping", {}, timeout=2) is not None:
+            raise SystemExit(f"Spritelet daemon already running at {socket_path}")
+        # Left behind by a daemon that did not exit cleanly.
+        socket_path.unlink()
+
+    old_umask = os.umask(0o077)
+    try:
+        server = SpriteletDaemon(root, socket_path)
+    finally:
+        os.umask(old_umask)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    status = {"serving": True, "root": str(root), "socket": str(socket_path), "pid": os.getpid()}
+    if server.signal_writer.removed_tmp_files:
+        status["removed_tmp_files"] = server.signal_writer.removed_tmp_files
+    print(json.dumps(status), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve publish/find/register/set-signal for one Spritelet root over a Unix socket")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--stop", action="store_true", help="Ask a running daemon for this root to exit")
+    parser.add_argument("--status", action="store_true", help="Report whether a daemon is serving this root")
+    args = parser.parse_args()
+
+    root = Path(args.root).resolve()
+    if args.stop or args.status:
+        result = daemon_request(root, "shutdown" if args.stop else "ping", {}, timeout=5)
+        print(json.dumps(result or {"running": False}, indent=2))
+        return 0 if result is not None else 1
+
+    serve(root)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
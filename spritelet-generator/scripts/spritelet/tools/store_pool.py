@@ -0,0 +1,214 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from ..catalog_backend import CatalogCache, open_catalog
+from ..publish_spritelet_state import load_profile, publish_state
+from ..similarity_index import forget_similarity_index
+from ..store_snapshot import read_store_snapshot
+from ..store_utils import content_hash
+from .find_state_in_catalog import find_state
+from .regenerate_stale_states import list_stale
+from .register_state_in_catalog import register_state
+from .set_spritelet_signal import set_signal
+
+DEFAULT_MAX_STORES = 128
+DEFAULT_MAX_OPEN_FILES = 512
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class PooledStore:
+    __slots__ = ("root", "identity", "cache", "users", "retired")
+
+    def __init__(self, root: Path, identity: tuple[int, int]) -> None:
+        self.root = root
+        self.identity = identity
+        self.cache = CatalogCache()
+        self.users = 0
+        self.retired = False
+
+    def close(self) -> None:
+        self.cache.close()
+        forget_similarity_index(self.root)
+
+
+class StorePool:
+    # Serves many identity roots from one process. Each root gets a CatalogCache (parsed profile and
+    # catalog JSON keyed by inode/size/mtime, open SQLite connections); the least recently used roots
+    # are retired once the pool exceeds its store, open-file or approximate memory limits, and closed
+    # when their last in-flight operation finishes.
+    def __init__(
+        self,
+        max_stores: int = DEFAULT_MAX_STORES,
+        max_open_files: int = DEFAULT_MAX_OPEN_FILES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.max_stores = max_stores
+        self.max_open_files = max_open_files
+        self.max_bytes = max_bytes
+        self._stores: OrderedDict[Path, PooledStore] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _retire(self, store: PooledStore) -> PooledStore | None:
+        # Called with self._lock held; returns the store if nobody is using it and it can close now.
+        store.retired = True
+        return store if store.users == 0 else None
+
+    @contextmanager
+    def lease(self, root: Path):
+        root = root.resolve()
+        try:
+            # A reinitialized or replaced store gets a new spritelet.json inode, so its cache is dropped.
+            st = (root / "spritelet.json").stat()
+        except FileNotFoundError:
+            raise SystemExit(f"Missing {root / 'spritelet.json'}; run init_spritelet_store.py first") from None
+        identity = (st.st_ino, st.st_dev)
+        closable = []
+        with self._lock:
+            store = self._stores.get(root)
+            if store and store.identity == identity:
+                self._stores.move_to_end(root)
+                self.hits += 1
+            else:
+                if store:
+                    closable.append(self._retire(self._stores.pop(root)))
+                self.misses += 1
+                store = self._stores[root] = PooledStore(root, identity)
+            store.users += 1
+        try:
+            yield store.cache
+        finally:
+            with self._lock:
+                store.users -= 1
+                if store.retired and store.users == 0:
+                    closable.append(store)
+                closable.extend(self._evict_over_limits())
+            for stale in closable:
+                if stale:
+                    stale.close()
+
+    def cache_for(self, root: Path) -> CatalogCache:
+        # Cache without a lease, for single-threaded callers; another thread's eviction may close it.
+        with self.lease(root) as cache:
+            return cache
+
+    def _usage(self) -> tuple[int, int]:
+        stores = list(self._stores.values())
+        return (
+            sum(store.cache.open_files() for store in stores),
+            sum(store.cache.approximate_bytes() for store in stores),
+        )
+
+    def _evict_over_limits(self) -> list[PooledStore | None]:
+        # Called with self._lock held; the most recently used root is never evicted.
+        closable = []
+        while len(self._stores) > 1:
+            open_files, used_bytes = self._usage()
+            if (
+                len(self._stores) <= self.max_stores
+                and open_files <= self.max_open_files
+                and used_bytes <= self.max_bytes
+            ):
+                break
+            _, store = self._stores.popitem(last=False)
+            self.evictions += 1
+            closable.append(self._retire(store))
+        return closable
+
+    def evict(self, root: Path) -> None:
+        with self._lock:
+            store = self._stores.pop(root.resolve(), None)
+            store = store and self._retire(store)
+        if store:
+            store.close()
+
+    def close(self) -> None:
+        with self._lock:
+            stores, self._stores = self._stores, OrderedDict()
+            closable = [self._retire(store) for store in stores.values()]
+        for store in closable:
+            if store:
+                store.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            open_files, used_bytes = self._usage()
+            return {
+                "stores": len(self._stores),
+                "open_files": open_files,
+                "approximate_bytes": used_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def publish(self, root: Path, simple_name: str, description: str, **params) -> dict:
+        with self.lease(root) as cache:
+            return publish_state(root, simple_name, description, cache=cache, **params)
+
+    def find(self, root: Path, simple_name: str, **params) -> dict:
+        with self.lease(root) as cache:
+            return find_state(root, simple_name, cache=cache, **params)
+
+    def register(self, root: Path, simple_name: str, spritelet_path: str, description: str) -> dict:
+        with self.lease(root) as cache:
+            return register_state(root, simple_name, spritelet_path, description, cache)
+
+    def set_signal(self, root: Path, spritelet_path: str) -> dict:
+        # Signal writes read nothing cacheable; the pool only forwards them.
+        return set_signal(root, spritelet_path)
+
+    def snapshot(self, root: Path) -> dict:
+        with self.lease(root) as cache:
+            return read_store_snapshot(root, cache)
+
+    def stale_states(self, root: Path) -> list[str]:
+        # Catalog entries a publish would regenerate: made from another base image, or missing their file.
+        with self.lease(root) as cache:
+            _, base_image = load_profile(root, cache)
+            base_image_sha256 = content_hash(root, base_image)
+            with open_catalog(root, cache, required=False) as catalog:
+                stale = list_stale(root, catalog, base_image, base_image_sha256, {})
+        return [item["simple_name"] for item in stale]
+
+    def survey(self, roots: list[Path]) -> list[dict]:
+        # Bulk status across roots; a broken root reports its error instead of stopping the survey.
+        report = []
+        for root in roots:
+            item = {"root": str(root)}
+            try:
+                snapshot = self.snapshot(root)
+                stale = self.stale_states(root)
+                item.update(
+                    states=len(snapshot["catalog"]),
+                    stale=len(stale),
+                    stale_states=stale,
+                    current=snapshot["current"].get("spritelet_path"),
+                    updated_at=snapshot["current"].get("updated_at"),
+                )
+            except (SystemExit, Exception) as e:
+                item["error"] = str(e.code) if isinstance(e, SystemExit) else f"{type(e).__name__}: {e}"
+            report.append(item)
+        return report
+
+
+def discover_roots(parent: Path, depth: int = 2) -> list[Path]:
+    # Identity roots are directories holding spritelet.json, at most `depth` levels below parent.
+    roots = []
+    pending = [(parent, 0)]
+    while pending:
+        directory, level = pending.pop()
+        if (directory / "spritelet.json").is_file():
+            roots.append(directory)
+            continue
+        if level < depth:
+            try:
+                children = [child for child in directory.iterdir() if child.is_dir() and not child.name.startswith(".")]
+            except OSError:
+                continue
+            pending.extend((child, level + 1) for child in children)
+    return sorted(roots)
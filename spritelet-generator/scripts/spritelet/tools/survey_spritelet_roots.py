@@ -0,0 +1,34 @@
+import argparse
+import json
+from pathlib import Path
+
+from .store_pool import StorePool, discover_roots
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report catalog size, stale states and current signal across many Spritelet roots")
+    parser.add_argument("--root", action="append", default=[], help="Spritelet identity root (repeatable)")
+    parser.add_argument("--roots-dir", action="append", default=[], help="Directory searched for identity roots (repeatable)")
+    parser.add_argument("--depth", type=int, default=2, help="Levels below --roots-dir to search (default: 2)")
+    parser.add_argument("--only-stale", action="store_true", help="List only roots with stale states or errors")
+    args = parser.parse_args()
+
+    roots = [Path(root) for root in args.root]
+    for roots_dir in args.roots_dir:
+        roots.extend(discover_roots(Path(roots_dir), args.depth))
+    if not roots:
+        raise SystemExit("Pass --root or --roots-dir")
+
+    pool = StorePool()
+    try:
+        report = pool.survey(roots)
+    finally:
+        pool.close()
+    if args.only_stale:
+        report = [item for item in report if item.get("stale") or "error" in item]
+    print(json.dumps({"roots": report, "stale_roots": sum(1 for item in report if item.get("stale"))}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,268 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+from ..catalog_backend import open_catalog
+from ..event_log import EventLog
+from ..metrics import timed_operation
+from ..publish_spritelet_state import (
+    DEFAULT_API_KEY_ENV,
+    DEFAULT_ENDPOINT,
+    DEFAULT_MODEL,
+    describe_images,
+    generate_state_image,
+    load_profile,
+    plan_state,
+    resolve_api_key,
+    resolve_catalog_state,
+)
+from ..rate_limit import RateLimited
+from ..signal_watch import SignalWatcher
+from ..store_utils import JsonCache, content_hash, inflight_lock, normalize_simple_name, utc_now
+from .batch_publish_states import commit_batch
+
+
+class EventFold:
+    # State built from the event log. update() reads only the events after the last one it saw, so
+    # --follow passes never rescan the whole log; a log reset since (reinit) starts it over.
+    def __init__(self) -> None:
+        self.after_seq: int | None = None
+        self.reset()
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+    def observe(self, event: dict) -> None:
+        raise NotImplementedError
+
+    def update(self, log: EventLog) -> "EventFold":
+        last = log.last_seq()
+        if self.after_seq is not None and (last is None or last < self.after_seq):
+            self.after_seq = None
+            self.reset()
+        for event in log.read(after_seq=self.after_seq):
+            self.observe(event)
+            self.after_seq = event["seq"]
+        return self
+
+
+class TransitionModel(EventFold):
+    # First-order Markov chain over the simple_names an agent asked for, in publish order.
+    def reset(self) -> None:
+        self.counts: dict[str, dict[str, int]] = {}
+        self.descriptions: dict[str, str] = {}
+        self.current: str | None = None
+
+    def observe(self, event: dict) -> None:
+        if event.get("type") != "state_published":
+            return
+        name = event.get("requested_simple_name") or event["simple_name"]
+        if event.get("description") and not event.get("requested_simple_name"):
+            self.descriptions[name] = event["description"]
+        if self.current is not None and self.current != name:
+            row = self.counts.setdefault(self.current, {})
+            row[name] = row.get(name, 0) + 1
+        self.current = name
+
+    def predict(self, name: str, top: int) -> list[tuple[str, float, int]]:
+        row = self.counts.get(name, {})
+        total = sum(row.values())
+        ranked = sorted(row.items(), key=lambda item: -item[1])[:top]
+        return [(next_name, count / total, count) for next_name, count in ranked]
+
+
+def seconds_since_last_event(root: Path) -> float:
+    try:
+        return time.time() - (root / "signals" / "events.head.json").stat().st_mtime
+    except FileNotFoundError:
+        return float("inf")
+
+
+class HitReport(EventFold):
+    # A hit is a publish that reused a state whose latest catalog write was a prewarm;
+    # hit_rate is the share of publishes since the first prewarm that were served that way.
+    def reset(self) -> None:
+        self.warm: set[str] = set()
+        self.prewarmed = self.hits = self.publishes = 0
+
+    def observe(self, event: dict) -> None:
+        event_type = event.get("type")
+        name = event.get("simple_name")
+        if event_type == "state_catalog_upserted":
+            if event.get("prewarmed"):
+                self.warm.add(name)
+                self.prewarmed += 1
+            else:
+                self.warm.discard(name)
+        elif event_type == "state_published" and self.prewarmed:
+            self.publishes += 1
+            if name in self.warm and event.get("reused"):
+                self.hits += 1
+            self.warm.discard(name)
+        elif event_type == "state_initialized":
+            self.warm.clear()
+
+    def report(self) -> dict:
+        return {
+            "prewarmed": self.prewarmed,
+            "publishes_since_first_prewarm": self.publishes,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.publishes, 4) if self.publishes else None,
+            "prewarm_precision": round(self.hits / self.prewarmed, 4) if self.prewarmed else None,
+            "waiting": sorted(self.warm),
+        }
+
+
+@timed_operation("warm")
+def warm_once(root: Path, args: argparse.Namespace, cache: JsonCache, model: TransitionModel) -> dict:
+    model.update(EventLog(root))
+    if model.current is None:
+        return {"current": None, "candidates": [], "generated": [], "failed": []}
+
+    profile, base_image = load_profile(root, cache)
+    base_image_sha256 = content_hash(root, base_image)
+    candidates = []
+    generated = []
+    failed = []
+    api_key = None
+    with open_catalog(root, cache, required=False) as catalog:
+        for name, probability, count in model.predict(model.current, args.top):
+            key, state = resolve_catalog_state(catalog, name)
+            candidate = {"simple_name": key, "probability": round(probability, 4), "transitions": count}
+            candidates.append(candidate)
+            if probability < args.min_probability or count < args.min_transitions:
+                candidate["action"] = "below_threshold"
+                continue
+            try:
+                if plan_state(root, base_image, state, False, base_image_sha256):
+                    candidate["action"] = "already_warm"
+                    continue
+            except SystemExit:
+                # Catalog points at a missing file; regenerate into the same path.
+                pass
+            description = (state or {}).get("description") or model.descriptions.get(name)
+            if not description:
+                candidate["action"] = "no_description"
+                continue
+            if len(generated) >= args.budget:
+                candidate["action"] = "over_budget"
+                continue
+
+            started = time.monotonic()
+            with inflight_lock(root, key, base_image_sha256) as waited:
+                if waited:
+                    _, state = resolve_catalog_state(catalog, key)
+                    if plan_state(root, base_image, state, False, base_image_sha256):
+                        candidate["action"] = "coalesced"
+                        continue
+                api_key = api_key or resolve_api_key(None, args.api_key_env)
+                try:
+                    # Prewarming never queues for the shared limiter; the slots belong to real publishes.
+                    spritelet_path = generate_state_image(
+                        root,
+                        profile,
+                        base_image,
+                        key,
+                        description,
+                        state,
+                        api_key,
+                        model=args.model,
+                        endpoint=args.endpoint,
+                        aspect_ratio=args.aspect_ratio,
+                        image_size=args.image_size,
+                        on_limit="fail",
+                    )
+                except RateLimited as e:
+                    candidate["action"] = "rate_limited"
+                    candidate["error"] = str(e.code)
+                    break
+                except (SystemExit, Exception) as e:
+                    # One failed generation (API error after retries, network failure) is recorded
+                    # for its state; the other candidates and later passes still run.
+                    candidate["action"] = "failed"
+                    candidate["error"] = str(e.code) if isinstance(e, SystemExit) else f"{type(e).__name__}: {e}"
+                    failed.append(key)
+                    continue
+                result = {
+                    "simple_name": key,
+                    "spritelet_path": spritelet_path,
+                    "description": description,
+                    "reused": False,
+                    "prewarmed": True,
+                }
+                commit_batch(root, catalog, [result], utc_now(), False, base_image_sha256)
+            describe_images(root, profile, catalog, [result])
+            candidate["action"] = "generated"
+            candidate["seconds"] = round(time.monotonic() - started, 3)
+            generated.append(key)
+    return {
+        "current": normalize_simple_name(model.current),
+        "candidates": candidates,
+        "generated": generated,
+        "failed": failed,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate the states most likely to be published next, from event-log transitions")
+    parser.add_argument("--root", required=True, help="Spritelet identity root")
+    parser.add_argument("--budget", type=int, default=1, help="Most generations per warm pass (default: 1)")
+    parser.add_argument("--top", type=int, default=3, help="Next-state candidates considered per pass (default: 3)")
+    parser.add_argument(
+        "--min-probability",
+        type=float,
+        default=0.2,
+        help="Skip candidates the model gives less than this transition probability (default: 0.2)",
+    )
+    parser.add_argument(
+        "--min-transitions",
+        type=int,
+        default=2,
+        help="Skip candidates seen following the current state fewer times than this (default: 2)",
+    )
+    parser.add_argument(
+        "--idle-seconds",
+        type=float,
+        default=30.0,
+        help="Only warm after this long without new events (default: 30)",
+    )
+    parser.add_argument("--follow", action="store_true", help="Keep running and warm after every idle period")
+    parser.add_argument("--report", action="store_true", help="Print prewarm hit statistics and exit")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT)
+    parser.add_argument("--api-key-env", default=DEFAULT_API_KEY_ENV)
+    parser.add_argument("--aspect-ratio", default="1:1", help="Output image aspect ratio (default: 1:1)")
+    parser.add_argument("--image-size", default="1K", help="Output image size tier (default: 1K)")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    log = EventLog(root)
+    hits = HitReport()
+    if args.report:
+        print(json.dumps(hits.update(log).report(), indent=2))
+        return 0
+
+    cache = JsonCache()
+    model = TransitionModel()
+    with SignalWatcher(root) as watcher:
+        try:
+            while True:
+                # Wait out activity so generation never competes with a publish the user is waiting on.
+                while (idle := seconds_since_last_event(root)) < args.idle_seconds:
+                    watcher.wait(args.idle_seconds - idle)
+                result = warm_once(root, args, cache, model)
+                report = hits.update(log).report()
+                print(json.dumps({**result, "report": report}, indent=None if args.follow else 2), flush=True)
+                if not args.follow:
+                    return 0 if not result["failed"] else 1
+                # The budget is per move: wait for the next publish, not for our own catalog commits.
+                after_seq = log.last_seq()
+                while not any(event.get("type") == "state_published" for event in log.read(after_seq=after_seq)):
+                    watcher.wait()
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())